@@ -0,0 +1,194 @@
+"""
+Streaming audio DSP for the Twilio <-> Gemini media bridge.
+
+Both directions run at fixed integer ratios, so each call owns one small
+stateful filter per direction instead of re-interpolating every chunk:
+  Uplink   8kHz → 16kHz  (×2, polyphase interpolator)
+  Downlink 24kHz → 8kHz  (÷3, anti-aliased FIR decimator)
+
+Filter history is carried across chunks so 20ms frame edges stay continuous,
+and all working buffers are allocated once per call and grown only when a
+chunk larger than any seen before arrives.
+
+UplinkConverter / DownlinkConverter fuse the μ-law LUT codec (mulaw.py) with
+the resamplers: samples are decoded straight into the filter input and the
+filter output is quantised and encoded in place, one pass per direction.
+"""
+
+import numpy as np
+
+from mulaw import DECODE_LUT_F32, ENCODE_LUT
+
+
+def design_lowpass(
+    num_taps: int, cutoff_hz: float, fs: float, beta: float = 6.0
+) -> np.ndarray:
+    """Kaiser-windowed sinc low-pass FIR with unity DC gain."""
+    n = np.arange(num_taps) - (num_taps - 1) / 2.0
+    h = np.sinc(2.0 * cutoff_hz / fs * n) * np.kaiser(num_taps, beta)
+    return (h / h.sum()).astype(np.float32)
+
+
+class _StreamingFIR:
+    """Shared history/buffer handling for the streaming resamplers."""
+
+    def __init__(self, num_taps: int):
+        self._hist = num_taps - 1
+        self._buf = np.zeros(self._hist + 512, dtype=np.float32)
+        self._out = np.zeros(1024, dtype=np.float32)
+
+    def input_slot(self, n: int) -> np.ndarray:
+        """Writable view for the next n input samples, right after the history.
+
+        Callers may decode straight into it and then call run(n), which saves
+        a copy compared to process().
+        """
+        need = self._hist + n
+        if need > len(self._buf):
+            grown = np.zeros(max(need, 2 * len(self._buf)), dtype=np.float32)
+            grown[: self._hist] = self._buf[: self._hist]
+            self._buf = grown
+        return self._buf[self._hist : need]
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Resample one chunk. The returned array is reused on the next call."""
+        np.copyto(self.input_slot(len(samples)), samples, casting="unsafe")
+        return self.run(len(samples))
+
+    def _carry(self, n: int):
+        """Keep the last (num_taps - 1) input samples for the next chunk."""
+        self._buf[: self._hist] = self._buf[n : n + self._hist]
+
+    def _output(self, n: int) -> np.ndarray:
+        if n > len(self._out):
+            self._out = np.zeros(max(n, 2 * len(self._out)), dtype=np.float32)
+        return self._out[:n]
+
+    def reset(self):
+        """Drop filter history (e.g. after the outbound audio is flushed)."""
+        self._buf[: self._hist] = 0.0
+
+
+class PolyphaseUpsampler(_StreamingFIR):
+    """Integer-factor interpolator (default 8kHz → 16kHz)."""
+
+    def __init__(
+        self, factor: int = 2, fs_in: float = 8000.0, taps_per_phase: int = 24
+    ):
+        num_taps = factor * taps_per_phase
+        super().__init__(taps_per_phase)
+        h = design_lowpass(num_taps, 0.46 * fs_in, fs_in * factor) * factor
+        # Sub-filter p produces output phase p (every factor-th output sample)
+        self._phases = [h[p::factor].copy() for p in range(factor)]
+        self._factor = factor
+
+    def run(self, n: int) -> np.ndarray:
+        """Filter the n samples already written to input_slot(n)."""
+        if n == 0:
+            return self._output(0)
+        live = self._buf[: self._hist + n]
+        out = self._output(n * self._factor)
+        for p, taps in enumerate(self._phases):
+            out[p :: self._factor] = np.convolve(live, taps, "valid")
+        self._carry(n)
+        return out
+
+
+class FIRDecimator(_StreamingFIR):
+    """Anti-aliased integer-factor decimator (default 24kHz → 8kHz).
+
+    Not a polyphase structure: it filters at the input rate and keeps every
+    `factor`-th output. The phase of the next kept sample is carried so chunk
+    sizes need not be multiples of `factor`. At 20ms chunk sizes one
+    np.convolve pass followed by a strided pick is cheaper than evaluating
+    only the kept outputs.
+    """
+
+    def __init__(self, factor: int = 3, fs_in: float = 24000.0, num_taps: int = 96):
+        super().__init__(num_taps)
+        fs_out = fs_in / factor
+        self._coeffs = design_lowpass(num_taps, 0.46 * fs_out, fs_in)
+        self._factor = factor
+        self._phase = 0
+
+    def run(self, n: int) -> np.ndarray:
+        """Filter the n samples already written to input_slot(n)."""
+        if n <= self._phase:
+            self._phase -= n
+            self._carry(n)
+            return self._output(0)
+        live = self._buf[: self._hist + n]
+        filtered = np.convolve(live, self._coeffs, "valid")[self._phase :: self._factor]
+        out = self._output(len(filtered))
+        out[:] = filtered
+        self._phase = (self._phase - n) % self._factor
+        self._carry(n)
+        return out
+
+    def reset(self):
+        super().reset()
+        self._phase = 0
+
+
+def _grow(buf: np.ndarray, n: int) -> np.ndarray:
+    return buf if n <= len(buf) else np.zeros(max(n, 2 * len(buf)), dtype=buf.dtype)
+
+
+def _quantise(y: np.ndarray, pcm: np.ndarray) -> np.ndarray:
+    """Round and saturate float samples into the int16 buffer, in place."""
+    np.rint(y, out=y)
+    np.clip(y, -32768.0, 32767.0, out=y)
+    np.copyto(pcm[: len(y)], y, casting="unsafe")
+    return pcm[: len(y)]
+
+
+class UplinkConverter:
+    """Twilio μ-law 8kHz → Gemini PCM 16-bit 16kHz, one per call."""
+
+    def __init__(self):
+        self.resampler = PolyphaseUpsampler()
+        self._pcm = np.zeros(1024, dtype=np.int16)
+
+    def process(self, chunk_ulaw) -> np.ndarray:
+        """Like convert(), but returns int16 samples in a buffer reused next call."""
+        n = len(chunk_ulaw)
+        codes = np.frombuffer(chunk_ulaw, dtype=np.uint8)
+        np.take(DECODE_LUT_F32, codes, out=self.resampler.input_slot(n))
+        y = self.resampler.run(n)
+        self._pcm = _grow(self._pcm, len(y))
+        return _quantise(y, self._pcm)
+
+    def convert(self, chunk_ulaw: bytes) -> bytes:
+        return self.process(chunk_ulaw).tobytes()
+
+    def reset(self):
+        self.resampler.reset()
+
+
+class DownlinkConverter:
+    """Gemini PCM 16-bit 24kHz → Twilio μ-law 8kHz, one per call."""
+
+    def __init__(self):
+        self.resampler = FIRDecimator()
+        self._pcm = np.zeros(512, dtype=np.int16)
+        self._ulaw = np.zeros(512, dtype=np.uint8)
+
+    def process(self, chunk_pcm) -> np.ndarray:
+        """Like convert(), but returns μ-law codes in a buffer reused next call."""
+        # Gemini chunks are whole samples; ignore a stray odd byte
+        n = len(chunk_pcm) // 2
+        samples = np.frombuffer(chunk_pcm, dtype=np.int16, count=n)
+        np.copyto(self.resampler.input_slot(n), samples, casting="unsafe")
+        y = self.resampler.run(n)
+        m = len(y)
+        self._pcm = _grow(self._pcm, m)
+        self._ulaw = _grow(self._ulaw, m)
+        pcm = _quantise(y, self._pcm)
+        np.take(ENCODE_LUT, pcm.view(np.uint16), out=self._ulaw[:m])
+        return self._ulaw[:m]
+
+    def convert(self, chunk_pcm: bytes) -> bytes:
+        return self.process(chunk_pcm).tobytes()
+
+    def reset(self):
+        self.resampler.reset()
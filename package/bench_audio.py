@@ -0,0 +1,230 @@
+"""
+Offline benchmark for the per-frame media bridge hot path.
+
+Measures what runs 50 times per second per call in each direction:
+  Uplink   mediacodec.decode_inbound → audio.UplinkConverter.convert
+  Downlink audio.DownlinkConverter.convert → 20ms frames → MediaEncoder.media
+
+Audio is synthetic (seeded speech-like tones + noise), so no Twilio account,
+Gemini key or network is needed.
+
+Usage:
+  python bench_audio.py                       # print results
+  python bench_audio.py --out bench.json      # also store as JSON
+  python bench_audio.py --compare old.json    # show change vs a stored run
+"""
+
+import argparse
+import base64
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from audio import DownlinkConverter, UplinkConverter
+from mediacodec import MediaEncoder, decode_inbound
+from mulaw import ENCODE_LUT
+from playout import FRAME_BYTES
+
+FRAME_MS = 20
+FRAMES_PER_SEC = 1000 // FRAME_MS
+STREAM_SID = "MZ00000000000000000000000000000000"
+
+
+# --- Synthetic fixtures ---
+def speech_like(seconds: float, rate: int, seed: int) -> np.ndarray:
+    """Syllable-rate modulated harmonics plus noise, as int16."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 4 * t)) ** 2
+    signal = 4000 * voice * envelope + rng.normal(0, 200, len(t))
+    return np.clip(signal, -32768, 32767).astype(np.int16)
+
+
+def twilio_media_messages(seconds: float = 10.0) -> list[str]:
+    """Inbound Twilio `media` events carrying 160-byte μ-law frames."""
+    ulaw = ENCODE_LUT[speech_like(seconds, 8000, seed=1).view(np.uint16)].tobytes()
+    return [
+        json.dumps(
+            {
+                "event": "media",
+                "sequenceNumber": str(i + 2),
+                "media": {
+                    "track": "inbound",
+                    "chunk": str(i + 1),
+                    "timestamp": str(i * FRAME_MS),
+                    "payload": base64.b64encode(ulaw[off : off + 160]).decode(),
+                },
+                "streamSid": STREAM_SID,
+            },
+            separators=(",", ":"),  # Twilio sends compact JSON
+        )
+        for i, off in enumerate(range(0, len(ulaw) - 159, 160))
+    ]
+
+
+def gemini_pcm_chunks(seconds: float = 10.0) -> list[bytes]:
+    """Variable-size 24kHz PCM chunks, 10–200ms each, like Gemini Live output."""
+    pcm = speech_like(seconds, 24000, seed=2).tobytes()
+    rng = np.random.default_rng(3)
+    chunks, off = [], 0
+    while off < len(pcm):
+        size = int(rng.integers(240, 4800)) * 2
+        chunks.append(pcm[off : off + size])
+        off += size
+    return chunks
+
+
+# --- Hot-path steps (mirror handle_twilio_to_gemini / handle_gemini_to_twilio) ---
+_encoder = MediaEncoder(STREAM_SID)
+
+
+def uplink_frame(message_str: str, converter: UplinkConverter) -> bytes:
+    _, chunk_ulaw = decode_inbound(message_str)
+    return converter.convert(chunk_ulaw)
+
+
+def downlink_chunk(chunk_pcm: bytes, converter: DownlinkConverter) -> list[str]:
+    mulaw_data = converter.convert(chunk_pcm)
+    return [
+        _encoder.media(mulaw_data[off : off + FRAME_BYTES])
+        for off in range(0, len(mulaw_data), FRAME_BYTES)
+    ]
+
+
+def _time_per_item(fn, items, arg, repeat: int) -> float:
+    """Best-of-`repeat` wall time for one pass over items, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for item in items:
+            fn(item, arg)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _allocations(fn, items, arg) -> dict:
+    """Peak transient and retained traced memory over one pass, per item."""
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for item in items:
+        fn(item, arg)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "peak_bytes": peak - base,
+        "retained_bytes_per_item": (current - base) / len(items),
+    }
+
+
+def run(seconds: float = 10.0, repeat: int = 5) -> dict:
+    messages = twilio_media_messages(seconds)
+    chunks = gemini_pcm_chunks(seconds)
+
+    # Warm up per-call buffers so growth is not counted as steady state
+    up, down = UplinkConverter(), DownlinkConverter()
+    for m in messages[:10]:
+        uplink_frame(m, up)
+    for c in chunks[:10]:
+        downlink_chunk(c, down)
+
+    up_s = _time_per_item(uplink_frame, messages, up, repeat)
+    down_s = _time_per_item(downlink_chunk, chunks, down, repeat)
+
+    up_us = up_s / len(messages) * 1e6
+    # Gemini chunks vary in size, so normalise to one 20ms frame of audio
+    down_us = down_s / seconds / FRAMES_PER_SEC * 1e6
+    cpu_us_per_call_second = (up_us + down_us) * FRAMES_PER_SEC
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "audio_seconds": seconds,
+        },
+        "uplink": {
+            "frames": len(messages),
+            "us_per_frame": round(up_us, 2),
+            **_allocations(uplink_frame, messages, up),
+        },
+        "downlink": {
+            "chunks": len(chunks),
+            "us_per_20ms": round(down_us, 2),
+            "us_per_chunk": round(down_s / len(chunks) * 1e6, 2),
+            **_allocations(downlink_chunk, chunks, down),
+        },
+        "cpu_us_per_call_second": round(cpu_us_per_call_second, 1),
+        "calls_per_core": int(1e6 / cpu_us_per_call_second),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _report(results: dict, baseline: dict | None = None):
+    def line(label, value, unit, old=None):
+        delta = ""
+        if old:
+            delta = f"  ({(value - old) / old * 100:+.1f}% vs {baseline['meta']['commit']})"
+        print(f"  {label:<28}{value:>10} {unit}{delta}")
+
+    b = baseline or {}
+    print(f"Media bridge hot path @ {results['meta']['commit']}")
+    line(
+        "uplink per frame",
+        results["uplink"]["us_per_frame"],
+        "µs",
+        b.get("uplink", {}).get("us_per_frame"),
+    )
+    line(
+        "downlink per 20ms",
+        results["downlink"]["us_per_20ms"],
+        "µs",
+        b.get("downlink", {}).get("us_per_20ms"),
+    )
+    line("uplink peak alloc", results["uplink"]["peak_bytes"], "B")
+    line("downlink peak alloc", results["downlink"]["peak_bytes"], "B")
+    line(
+        "concurrent calls per core",
+        results["calls_per_core"],
+        "",
+        b.get("calls_per_core"),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="write results JSON to this path")
+    parser.add_argument("--compare", help="results JSON from an earlier run")
+    args = parser.parse_args()
+
+    results = run(args.seconds, args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _report(results, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
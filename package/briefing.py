@@ -0,0 +1,70 @@
+"""
+Per-emergency cache of the rendered patient briefing.
+
+Every hospital in a batch hears the same briefing, so the first call that
+lets Gemini speak it through uninterrupted stores the audio (as ready-to-send
+8kHz μ-law) together with its transcript. Later calls for the same emergency
+play the cached audio straight into their pacer and only hand the transcript
+to their Live session as context, skipping generation entirely.
+
+Entries expire after `ttl` seconds and are evicted when the batch finalizes.
+"""
+
+import time
+from collections import OrderedDict
+
+from audio import DownlinkConverter
+from playout import FRAME_BYTES, ULAW_SILENCE
+
+
+class Briefing:
+    __slots__ = ("ulaw", "transcript", "created")
+
+    def __init__(self, ulaw: bytes, transcript: str):
+        self.ulaw = ulaw
+        self.transcript = transcript
+        self.created = time.monotonic()
+
+
+def encode_briefing(pcm_24k: bytes) -> bytes:
+    """Gemini PCM 24kHz → whole 20ms μ-law frames (tail padded with silence)."""
+    ulaw = DownlinkConverter().convert(pcm_24k)
+    tail = len(ulaw) % FRAME_BYTES
+    if tail:
+        ulaw += ULAW_SILENCE * (FRAME_BYTES - tail)
+    return ulaw
+
+
+class BriefingCache:
+    def __init__(self, ttl: float = 300.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Briefing] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, emergency_id: str) -> Briefing | None:
+        entry = self._entries.get(emergency_id)
+        if entry and time.monotonic() - entry.created > self.ttl:
+            del self._entries[emergency_id]
+            entry = None
+        if entry:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return entry
+
+    def put(self, emergency_id: str, pcm_24k: bytes, transcript: str) -> bool:
+        """Store the first complete briefing for an emergency. False if one exists."""
+        if emergency_id in self._entries:
+            return False
+        self._entries[emergency_id] = Briefing(encode_briefing(pcm_24k), transcript)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return True
+
+    def evict(self, emergency_id: str):
+        self._entries.pop(emergency_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,111 @@
+"""
+Bounded per-call queues for the media bridge.
+
+An unbounded asyncio.Queue lets audio pile up while Gemini (or Twilio)
+stalls; when the peer recovers it receives stale audio and every later
+response is delayed by the backlog. CallQueue caps the depth and applies an
+overflow policy instead:
+  DROP_OLDEST  live audio — discard the stalest item, never block the producer
+  BLOCK        control / must-deliver items — the producer waits for room
+A maxsize of 0 or less means no bound, as for asyncio.Queue.
+
+Only audio (bytes-like items) counts toward the bound and is ever dropped or
+drained. Anything else is a control item (CLOSE, STREAM_END, MARK): it is
+always accepted at once, keeps its place in line and is never discarded.
+"""
+
+import asyncio
+from collections import deque
+
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+
+_AUDIO = (bytes, bytearray, memoryview)
+
+
+class CallQueue(asyncio.Queue):
+    """asyncio.Queue with a bounded depth, an overflow policy and counters."""
+
+    def __init__(self, maxsize: int, policy: str = DROP_OLDEST):
+        if policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"unknown overflow policy: {policy}")
+        # Unbounded underneath, so a control item never waits or raises
+        super().__init__()
+        self.limit = maxsize
+        self.policy = policy
+        self.enqueued = 0
+        self.dropped = 0
+        self.high_water = 0
+        self._room = asyncio.Event()
+
+    # asyncio.Queue storage hooks, as in PriorityQueue/LifoQueue
+    def _init(self, maxsize):
+        self._queue = deque()
+        self.audio = 0
+
+    def _put(self, item):
+        self._queue.append(item)
+        if isinstance(item, _AUDIO):
+            self.audio += 1
+
+    def _get(self):
+        item = self._queue.popleft()
+        if isinstance(item, _AUDIO):
+            self.audio -= 1
+            self._room.set()
+        return item
+
+    async def put(self, item):
+        if self.policy == BLOCK and isinstance(item, _AUDIO):
+            while self._full():
+                self._room.clear()
+                await self._room.wait()
+        self.put_nowait(item)
+
+    def put_nowait(self, item):
+        if isinstance(item, _AUDIO) and self._full():
+            if self.policy == BLOCK:
+                raise asyncio.QueueFull
+            self._drop_oldest_audio()
+        super().put_nowait(item)
+        self.enqueued += 1
+        if self.qsize() > self.high_water:
+            self.high_water = self.qsize()
+
+    def _full(self) -> bool:
+        return 0 < self.limit <= self.audio
+
+    def _drop_oldest_audio(self):
+        for i, queued in enumerate(self._queue):
+            if isinstance(queued, _AUDIO):
+                del self._queue[i]
+                self.audio -= 1
+                self.task_done()
+                self.dropped += 1
+                return
+
+    def drain(self) -> list:
+        """Remove and return the queued audio, e.g. made stale by barge-in.
+
+        Control items stay queued, in order.
+        """
+        audio = [item for item in self._queue if isinstance(item, _AUDIO)]
+        if audio:
+            kept = [item for item in self._queue if not isinstance(item, _AUDIO)]
+            self._queue.clear()
+            self._queue.extend(kept)
+            self.audio = 0
+            for _ in audio:
+                self.task_done()
+            self._room.set()
+        return audio
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "maxsize": self.limit,
+            "depth": self.qsize(),
+            "high_water": self.high_water,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,132 @@
+"""
+Per-call state for one Twilio media stream bridged to a Gemini Live session.
+
+The bridge tasks wait on events instead of polling a shared dict:
+  started  set when Twilio sends `start` (stream/emergency/hospital known)
+  closed   set on `stop`, websocket teardown or any task giving up
+On close, the CLOSE sentinel is pushed through both audio queues so blocked
+consumers wake up and exit immediately rather than on their next timeout.
+STREAM_END travels the uplink queue in order with the audio when the
+voice-activity gate closes, so the sender can tell Gemini the speech ended.
+MARK travels the downlink queue the same way, so a Twilio mark follows the
+last audio of the AI's closing line.
+"""
+
+import asyncio
+import enum
+import time
+
+from callqueue import BLOCK, DROP_OLDEST, CallQueue
+from mediacodec import MediaEncoder
+from playout import FramePacer
+from uplink import UplinkCoalescer
+from vad import VoiceActivityDetector
+
+CLOSE = object()  # queue sentinel: the call is shutting down
+STREAM_END = object()  # uplink marker: the hospital stopped speaking
+MARK = object()  # downlink marker: the closing line's audio ends here
+
+
+class CallPhase(str, enum.Enum):
+    CONNECTING = "connecting"  # websocket up, waiting for Twilio start / Gemini
+    BRIEFING = "briefing"  # patient briefing sent, AI speaking
+    LISTENING = "listening"  # waiting for the hospital's answer
+    DECIDING = "deciding"  # update_hospital_decision tool call in flight
+    WRAPPING_UP = "wrapping_up"  # decision recorded, AI saying goodbye
+    CLOSING = "closing"
+
+
+class CallSession:
+    """Everything one media stream owns, from Twilio `start` to teardown."""
+
+    __slots__ = (
+        "phase",
+        "stream_sid",
+        "call_sid",
+        "emergency_id",
+        "hospital_id",
+        "started",
+        "closed",
+        "audio_in_q",
+        "audio_out_q",
+        "media",
+        "pacer",
+        "coalescer",
+        "vad",
+        "encoder",
+        "answered_at",
+        "first_audio_sent",
+        "decided_at",
+        "cached_until",
+    )
+
+    def __init__(
+        self,
+        in_frames: int,
+        playout_lead_ms: int,
+        uplink_block_ms: int,
+        vad: VoiceActivityDetector,
+    ):
+        self.phase = CallPhase.CONNECTING
+        self.stream_sid: str | None = None
+        self.call_sid: str | None = None
+        self.emergency_id: str | None = None
+        self.hospital_id: int = 0
+        self.started = asyncio.Event()
+        self.closed = asyncio.Event()
+        # Live uplink audio goes stale fast: drop the oldest frame rather than grow.
+        # Downlink chunks are never refused: the Gemini receiver has to keep reading
+        # to see `interrupted`, so the downlink loop paces on the pacer instead.
+        self.audio_in_q = CallQueue(in_frames, policy=DROP_OLDEST)
+        self.audio_out_q = CallQueue(0, policy=BLOCK)
+        # Per-call converters, inline or in a media worker (mediaworkers.py)
+        self.media = None
+        self.pacer = FramePacer(lead_ms=playout_lead_ms)
+        self.coalescer = UplinkCoalescer(block_ms=uplink_block_ms)
+        self.vad = vad
+        self.encoder: MediaEncoder | None = None
+        self.answered_at = 0.0  # time.monotonic() of Twilio `start`
+        self.first_audio_sent = False
+        self.decided_at = 0.0  # time.monotonic() of the decision tool call
+        # time.monotonic() when a replayed cached briefing ends; 0 if none is playing
+        self.cached_until = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self.started.is_set() and not self.closed.is_set()
+
+    def start(
+        self,
+        stream_sid: str,
+        call_sid: str | None,
+        emergency_id: str | None,
+        hospital_id: int,
+    ):
+        self.stream_sid = stream_sid
+        self.call_sid = call_sid
+        self.encoder = MediaEncoder(stream_sid)
+        self.emergency_id = emergency_id
+        self.hospital_id = hospital_id
+        self.answered_at = time.monotonic()
+        self.started.set()
+
+    def close(self):
+        """Idempotent shutdown: flag it and wake every queue consumer."""
+        if self.closed.is_set():
+            return
+        self.phase = CallPhase.CLOSING
+        self.closed.set()
+        if self.media:
+            self.media.close()
+        self.pacer.clear()  # also releases a downlink loop waiting for room
+        for q in (self.audio_in_q, self.audio_out_q):
+            q.put_nowait(CLOSE)  # control items always fit
+
+    def stats(self) -> dict:
+        return {
+            "phase": self.phase.value,
+            "hospital_id": self.hospital_id,
+            "emergency_id": self.emergency_id,
+            "queues": {"in": self.audio_in_q.stats(), "out": self.audio_out_q.stats()},
+            "playout_queued_ms": self.pacer.queued_ms,
+        }
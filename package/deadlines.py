@@ -0,0 +1,137 @@
+"""
+One hashed timer wheel for every deadline the server keeps.
+
+Ring timeouts, batch deadlines and warm-session reaping used to be a
+sleeping coroutine (or a loop.call_later handle) each. The wheel keeps them
+all in `slots` buckets, advanced by a single task every `resolution`
+seconds; the task parks itself while no deadline is pending.
+
+  schedule / call_later   O(1)
+  cancel                  O(1)  (the deadline is removed from its bucket)
+  per tick                O(deadlines in the current bucket)
+
+Deadlines fire within one `resolution` of their due time, which is plenty
+for timeouts measured in seconds to minutes. A callback may be a plain
+function or return an awaitable, which is run as a task.
+"""
+
+import asyncio
+import inspect
+import logging
+import math
+from typing import Callable, Hashable
+
+logger = logging.getLogger("emergency-ai.deadlines")
+
+
+class Deadline:
+    __slots__ = ("callback", "args", "key", "rounds", "bucket", "_wheel")
+
+    def __init__(self, wheel, callback: Callable, args: tuple, key: Hashable):
+        self._wheel = wheel
+        self.callback = callback
+        self.args = args
+        self.key = key
+        self.rounds = 0
+        self.bucket: dict | None = None
+
+    def cancel(self):
+        """No-op if it already fired or was cancelled."""
+        if self.bucket is not None:
+            del self.bucket[self]
+            self.bucket = None
+            self._wheel._pending -= 1
+        if self.key is not None and self._wheel._keyed.get(self.key) is self:
+            del self._wheel._keyed[self.key]
+
+
+class DeadlineScheduler:
+    def __init__(self, resolution: float = 0.5, slots: int = 512):
+        self.resolution = resolution
+        self._wheel: list[dict[Deadline, None]] = [{} for _ in range(slots)]
+        self._cursor = 0
+        self._pending = 0
+        self._keyed: dict[Hashable, Deadline] = {}
+        self._wake = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self.fired = 0
+
+    def call_later(self, delay: float, callback: Callable, *args) -> Deadline:
+        """Run `callback(*args)` after `delay` seconds. Returns a cancellable."""
+        return self._add(delay, callback, args, None)
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable, *args):
+        """Like call_later, but named: replaces any pending deadline for `key`."""
+        self.cancel(key)
+        self._keyed[key] = self._add(delay, callback, args, key)
+
+    def cancel(self, key: Hashable):
+        deadline = self._keyed.get(key)
+        if deadline:
+            deadline.cancel()
+
+    def _add(self, delay: float, callback, args, key) -> Deadline:
+        deadline = Deadline(self, callback, args, key)
+        ticks = max(1, math.ceil(delay / self.resolution))
+        deadline.rounds = (ticks - 1) // len(self._wheel)
+        bucket = self._wheel[(self._cursor + ticks) % len(self._wheel)]
+        bucket[deadline] = None
+        deadline.bucket = bucket
+        self._pending += 1
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+        self._wake.set()
+        return deadline
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wake.clear()
+                await self._wake.wait()
+            # Tick against the loop clock so slow ticks do not drift the wheel
+            next_tick = loop.time() + self.resolution
+            while self._pending:
+                await asyncio.sleep(max(0.0, next_tick - loop.time()))
+                next_tick += self.resolution
+                self._tick()
+
+    def _tick(self):
+        self._cursor = (self._cursor + 1) % len(self._wheel)
+        bucket = self._wheel[self._cursor]
+        due = []
+        for deadline in bucket:
+            if deadline.rounds:
+                deadline.rounds -= 1
+            else:
+                due.append(deadline)
+        for deadline in due:
+            deadline.cancel()
+            self.fired += 1
+            try:
+                result = deadline.callback(*deadline.args)
+                if inspect.isawaitable(result):
+                    task = asyncio.ensure_future(result)
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                    task.add_done_callback(
+                        lambda t, cb=deadline.callback: self._report(cb, t)
+                    )
+            except Exception as e:
+                logger.error(f"[Deadline] {deadline.callback!r} failed: {e}")
+
+    @staticmethod
+    def _report(callback: Callable, task: asyncio.Future):
+        if not task.cancelled() and (e := task.exception()) is not None:
+            logger.error(f"[Deadline] {callback!r} failed: {e}")
+
+    def __len__(self) -> int:
+        return self._pending
+
+    async def close(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+        for task in list(self._tasks):
+            task.cancel()
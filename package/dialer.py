@@ -0,0 +1,192 @@
+"""
+Non-blocking Twilio REST calls for placing and hanging up hospital calls.
+
+The twilio SDK is synchronous: calling it from an async endpoint blocks the
+event loop (and every live media stream) for one HTTPS round-trip per call.
+TwilioDialer runs each request on a dedicated thread pool and fans a batch
+out concurrently, so a whole broadcast costs roughly one round-trip.
+
+calls.create is also limited per account (calls per second, CPS). Every dial
+in the process goes through one priority queue drained by a token bucket at
+that rate, so a burst of broadcasts is placed as fast as the account allows
+instead of failing with 429s. Lower priority values go first; a 429 puts the
+dial back in its place and empties the bucket, so no call is dropped for
+rate reasons. A dial can carry a `cancelled` check, run when its turn comes:
+if it says the call is no longer wanted (its batch was decided while the
+dial waited), the dial fails with DialCancelled and takes no token.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+
+logger = logging.getLogger("emergency-ai.dialer")
+
+
+class DialCancelled(Exception):
+    """The dial's `cancelled` check said so before it was placed."""
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._stamp = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    async def take(self):
+        self._refill()
+        while self._tokens < 1.0:
+            await asyncio.sleep((1.0 - self._tokens) / self.rate)
+            self._refill()
+        self._tokens -= 1.0
+
+    def refund(self):
+        """Give back a token taken for nothing."""
+        self._tokens = min(self.burst, self._tokens + 1.0)
+
+    def empty(self):
+        """Start over from zero tokens, e.g. after the remote side said 429."""
+        self._refill()
+        self._tokens = min(self._tokens, 0.0)
+
+
+class TwilioDialer:
+    """Rate-limited calls.create and concurrent calls(sid).update on a thread pool."""
+
+    def __init__(
+        self,
+        client,
+        max_workers: int = 16,
+        calls_per_second: float = 1.0,
+        on_dialed: Callable[[float], None] | None = None,
+    ):
+        self.client = client
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="twilio"
+        )
+        # No burst: spaced evenly, a second never holds more than the limit
+        self._bucket = TokenBucket(calls_per_second)
+        # (priority, seq, future, create kwargs, enqueued at, cancelled check)
+        self._queue: list[tuple] = []
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+        # Called with each placed call's time in the queue
+        self.on_dialed = on_dialed
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    async def _run(self, fn, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, lambda: fn(**kwargs))
+
+    async def dial(
+        self,
+        priority: tuple = (),
+        cancelled: Callable[[], Awaitable[bool]] | None = None,
+        **create_kwargs,
+    ) -> str:
+        """Queue one call and wait until it is placed; returns its SID or raises.
+
+        `cancelled` is awaited just before the call would be placed; if it
+        returns True the call is skipped and DialCancelled is raised.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._push(
+            (
+                priority,
+                next(self._seq),
+                future,
+                create_kwargs,
+                time.monotonic(),
+                cancelled,
+            )
+        )
+        return await future
+
+    def _push(self, entry: tuple):
+        heapq.heappush(self._queue, entry)
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        """Start the most urgent queued dial each time the bucket has a token."""
+        try:
+            while self._queue:
+                await self._bucket.take()
+                entry = await self._next()
+                if entry:
+                    asyncio.create_task(self._place(entry))
+                else:
+                    self._bucket.refund()
+        finally:
+            self._dispatcher = None
+
+    async def _next(self) -> tuple | None:
+        """Pop the most urgent dial still wanted, or None if there is none."""
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            future, cancelled = entry[2], entry[5]
+            if future.done():
+                continue  # caller gave up
+            if cancelled:
+                try:
+                    skip = await cancelled()
+                except Exception as e:
+                    # When in doubt, place the call
+                    logger.warning(f"[Dialer] Cancel check failed: {e}")
+                    skip = False
+                if skip:
+                    if not future.done():
+                        future.set_exception(DialCancelled())
+                    continue
+            return entry
+        return None
+
+    async def _place(self, entry: tuple):
+        _, _, future, kwargs, enqueued_at, _ = entry
+        try:
+            call = await self._run(self.client.calls.create, **kwargs)
+        except Exception as e:
+            if getattr(e, "status", None) == 429 and not future.done():
+                # Over the account's limit after all: back in line, same place
+                self._bucket.empty()
+                self._push(entry)
+            elif not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(call.sid)
+        if self.on_dialed:
+            self.on_dialed(time.monotonic() - enqueued_at)
+
+    async def status(self, sid: str) -> str:
+        """Current Twilio status: queued, ringing, in-progress, completed, ..."""
+        call = await self._run(self.client.calls(sid).fetch)
+        return call.status
+
+    async def hangup(self, sid: str):
+        await self._run(self.client.calls(sid).update, status="completed")
+
+    async def hangup_many(self, sids: list[str]) -> dict[str, Exception | None]:
+        """Hang up all calls at once. Maps each SID to None or the error."""
+        outcomes = await asyncio.gather(
+            *(self.hangup(sid) for sid in sids), return_exceptions=True
+        )
+        return {
+            sid: (err if isinstance(err, Exception) else None)
+            for sid, err in zip(sids, outcomes)
+        }
@@ -0,0 +1,269 @@
+"""
+Write-ahead journal of emergency batch transitions, for crash recovery.
+
+Each transition is one JSON line:
+  {"t": "created",   "eid", "data", "hospital_ids", "created_at"}
+  {"t": "call",      "eid", "h", "sid"}          dialed, Twilio call SID known
+  {"t": "result",    "eid", "h", "result"}       decision / no_answer / failed dial
+  {"t": "finalized", "eid"}
+
+append() only buffers the line and folds it into an in-memory view of the
+open batches; a writer task hands whole batches of lines to a thread that
+writes and fsyncs them together, so the event loop never touches the disk.
+A crash loses at most the last `flush_interval` of transitions.
+
+The log is compacted (rewritten atomically with only the open batches)
+on open() and again every `compact_every` records, so replay time is bound
+by the number of in-flight emergencies rather than the server's uptime.
+A failed write keeps its lines buffered for the next flush.
+
+Every process writes its own file, so uvicorn workers never compact a log
+out from under each other. `path` is a prefix: a process claims the first
+slot `path.N` whose lock file `path.N.lock` no other process holds, and
+replays it — whoever held that slot before has died. It also adopts every
+other unlocked slot (and a pre-slot `path` file), folding their batches into
+its own log before deleting them, so batches survive a restart with fewer
+workers.
+"""
+
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger("emergency-ai.journal")
+
+
+class Journal:
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 0.05,
+        compact_every: int = 5000,
+        retry_delay: float = 1.0,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.compact_every = compact_every
+        # open_batches[eid] = {"data", "hospital_ids", "created_at",
+        #                      "results": {h: result}, "calls": {sid: h}}
+        self.open_batches: dict[str, dict] = {}
+        self._buffer: list[str] = []
+        self._since_compact = 0
+        self._wake = asyncio.Event()
+        self._file = None
+        self._slot: str | None = None  # path.N this process owns
+        self._lock_fd: int | None = None
+        self._writer: asyncio.Task | None = None
+        self._closing = False
+
+    # --- Folding ---
+    def _apply(self, rec: dict):
+        kind, eid = rec["t"], rec["eid"]
+        if kind == "created":
+            self.open_batches[eid] = {
+                "data": rec["data"],
+                "hospital_ids": rec["hospital_ids"],
+                "created_at": rec.get("created_at"),
+                "results": {},
+                "calls": {},
+            }
+            return
+        batch = self.open_batches.get(eid)
+        if batch is None:
+            return
+        if kind == "call":
+            batch["calls"][rec["sid"]] = rec["h"]
+        elif kind == "result":
+            batch["results"][rec["h"]] = rec["result"]
+        elif kind == "finalized":
+            del self.open_batches[eid]
+
+    def _snapshot(self) -> list[str]:
+        """Records that rebuild the current open batches, as JSON lines."""
+        lines = []
+        for eid, b in self.open_batches.items():
+            recs = [
+                {
+                    "t": "created",
+                    "eid": eid,
+                    "data": b["data"],
+                    "hospital_ids": b["hospital_ids"],
+                    "created_at": b["created_at"],
+                }
+            ]
+            recs += [
+                {"t": "call", "eid": eid, "h": h, "sid": sid}
+                for sid, h in b["calls"].items()
+            ]
+            recs += [
+                {"t": "result", "eid": eid, "h": h, "result": result}
+                for h, result in b["results"].items()
+            ]
+            lines += [json.dumps(r, ensure_ascii=False) + "\n" for r in recs]
+        return lines
+
+    # --- Disk (writer thread only) ---
+    @staticmethod
+    def _try_lock(lock_path: str) -> int | None:
+        """Exclusive lock on `lock_path`, or None if another process holds it."""
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Deleted by an adopter while we waited: a stale inode, not the slot
+            if os.fstat(fd).st_ino == os.stat(lock_path).st_ino:
+                return fd
+        except (BlockingIOError, FileNotFoundError):
+            pass
+        os.close(fd)
+        return None
+
+    def _claim(self) -> tuple[list[dict], list[tuple[str, int | None]]]:
+        """Take a slot; read it and every orphaned log. Returns (records, adopted)."""
+        n = 0
+        while (fd := self._try_lock(f"{self.path}.{n}.lock")) is None:
+            n += 1
+        self._slot, self._lock_fd = f"{self.path}.{n}", fd
+        records = self._read(self._slot)
+
+        adopted = []
+        slot_re = re.compile(re.escape(self.path) + r"\.\d+")
+        for other in sorted(glob.glob(glob.escape(self.path) + ".*")):
+            if other == self._slot or not slot_re.fullmatch(other):
+                continue
+            if (fd := self._try_lock(other + ".lock")) is not None:
+                records += self._read(other)
+                adopted.append((other, fd))
+        if os.path.exists(self.path):
+            # Written before logs had slots
+            records += self._read(self.path)
+            adopted.append((self.path, None))
+        return records, adopted
+
+    def _release(self, adopted: list[tuple[str, int | None]]):
+        """Delete adopted logs once their batches are in our own."""
+        for path, fd in adopted:
+            for name in (path, path + ".lock") if fd is not None else (path,):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+            if fd is not None:
+                os.close(fd)
+
+    def _read(self, path: str) -> list[dict]:
+        records = []
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Torn write at the tail from the crash: nothing after it
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+
+    def _write(self, lines: list[str]):
+        end = self._file.tell()
+        try:
+            self._file.writelines(lines)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError:
+            # Drop the partial write so replay does not stop at a torn line
+            # in the middle of the log; the lines are written again later
+            try:
+                self._file.truncate(end)
+            except OSError:
+                pass
+            raise
+
+    def _rewrite(self, lines: list[str]):
+        tmp = self._slot + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        if self._file is not None:
+            self._file.close()
+        os.replace(tmp, self._slot)
+        self._file = open(self._slot, "a", encoding="utf-8")
+
+    # --- Public API ---
+    async def open(self) -> dict[str, dict]:
+        """Replay and compact the log, then start writing. Returns open batches."""
+        records, adopted = await asyncio.to_thread(self._claim)
+        for rec in records:
+            self._apply(rec)
+        await asyncio.to_thread(self._rewrite, self._snapshot())
+        await asyncio.to_thread(self._release, adopted)
+        self._writer = asyncio.create_task(self._run())
+        logger.info(
+            f"[Journal] {self._slot}: replayed {len(records)} record(s) "
+            f"(adopted {len(adopted)} orphaned log(s)), "
+            f"{len(self.open_batches)} open emergency batch(es)"
+        )
+        return self.open_batches
+
+    def append(self, kind: str, emergency_id: str, **fields):
+        """Record a transition. Never blocks; durable within flush_interval."""
+        rec = {"t": kind, "eid": emergency_id, **fields}
+        self._apply(rec)
+        self._buffer.append(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._wake.set()
+
+    async def _run(self):
+        while not self._closing:
+            await self._wake.wait()
+            if not self._closing:
+                # Let transitions from the same burst share one fsync
+                await asyncio.sleep(self.flush_interval)
+            if not await self._flush() and not self._closing:
+                await asyncio.sleep(self.retry_delay)
+                self._wake.set()
+
+    async def _flush(self) -> bool:
+        """Write what is buffered. False if it failed and is still buffered."""
+        self._wake.clear()
+        lines, self._buffer = self._buffer, []
+        if not lines:
+            return True
+        compact = self._since_compact + len(lines) >= self.compact_every
+        try:
+            if compact:
+                # Already folded, so the snapshot includes this batch of lines
+                await asyncio.to_thread(self._rewrite, self._snapshot())
+            else:
+                await asyncio.to_thread(self._write, lines)
+        except OSError as e:
+            # Keep them, ahead of anything appended meanwhile, for the next flush
+            self._buffer[:0] = lines
+            logger.error(
+                f"[Journal] Write failed ({len(lines)} record(s)), retrying: {e}"
+            )
+            return False
+        self._since_compact = 0 if compact else self._since_compact + len(lines)
+        return True
+
+    async def close(self):
+        """Flush what is buffered, then stop the writer."""
+        if self._writer is not None:
+            self._closing = True
+            self._wake.set()
+            await self._writer
+            self._writer = None
+            # The writer can stop before its first flush, or while waiting
+            # to retry a failed one
+            await self._flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
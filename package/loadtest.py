@@ -0,0 +1,622 @@
+"""
+Offline load test for the whole call bridge (main.py), on one machine.
+
+The real FastAPI app runs under uvicorn in a child process, with the
+clients it talks to replaced by scripted stand-ins:
+  Twilio REST   calls.create / update / fetch; each dialed call is reported
+                to the driver process, which "answers" it after a short ring
+  Gemini Live   replaces gemini_client.aio.live: speaks a 24kHz PCM briefing
+                faster than real time, waits for the hospital to speak and
+                fall silent, then calls update_hospital_decision and speaks a
+                closing line
+  NestJS        the batch-result callback is answered inside the child
+The driver process plays the hospitals: one Twilio Media Streams websocket
+client per call that sends 20ms μ-law frames in real time, plays received
+audio against a 20ms clock, replies once the briefing has finished and
+hangs up after the closing line.
+
+For each concurrency level it reports p50/p99 of answer→first audio,
+end of speech→reply and decision→callback, the share of downlink frames
+that missed their playout deadline (arrived after the previous audio had
+finished playing) and the server's CPU per call-second (media workers
+included). The highest
+level whose miss rate stays under --max-miss is reported as the capacity of
+this machine. Linux only (server CPU is read from /proc).
+
+Usage:
+  python loadtest.py                        # ramp 10, 25, 50, 100 calls
+  python loadtest.py --calls 20,40 --hospitals 4
+  python loadtest.py --out load.json
+  python loadtest.py --media-workers 4      # conversion in 4 processes
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+# main.py reads its configuration at import time. The scratch directory is
+# made once and removed at exit; processes started from here inherit the
+# variable and share it instead of making their own.
+if "LOADTEST_WORKDIR" not in os.environ:
+    os.environ["LOADTEST_WORKDIR"] = tempfile.mkdtemp(prefix="emergency-loadtest-")
+    atexit.register(shutil.rmtree, os.environ["LOADTEST_WORKDIR"], True)
+_workdir = os.environ["LOADTEST_WORKDIR"]
+os.environ.update(
+    GOOGLE_API_KEY="offline",
+    TWILIO_ACCOUNT_SID="ACoffline",
+    TWILIO_AUTH_TOKEN="offline",
+    TWILIO_NUMBER="+10000000000",
+    BASE_URL="loadtest.invalid",
+    CALLBACK_SPOOL_DIR=os.path.join(_workdir, "callback_spool"),
+    JOURNAL_PATH=os.path.join(_workdir, "journal.log"),
+    # The fake account has no dial limit; the ramp measures media, not CPS
+    TWILIO_CPS="1000",
+)
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import platform
+import random
+import socket
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+import numpy as np
+import uvicorn
+import websockets
+from google.genai import types
+
+import main
+from bench_audio import speech_like
+from mediacodec import MediaEncoder, decode_inbound
+from mediaworkers import make_media
+from mulaw import ENCODE_LUT
+from playout import FRAME_BYTES, FRAME_SEC
+
+GAP_SEC = 0.3  # silence longer than this ends an utterance (not a miss)
+PCM_CHUNK_BYTES = 4800  # 100ms of 24kHz PCM per Gemini message
+SPEECH_RMS = 500.0
+END_SILENCE_SEC = 0.5  # like LIVE_CONFIG's silence_duration_ms
+
+
+# --- Scripted Gemini Live ---
+def _audio_messages(seconds: float, seed: int) -> list[types.LiveServerMessage]:
+    pcm = speech_like(seconds, 24000, seed).tobytes()
+    return [
+        types.LiveServerMessage(
+            server_content=types.LiveServerContent(
+                model_turn=types.Content(
+                    role="model",
+                    parts=[
+                        types.Part(
+                            inline_data=types.Blob(
+                                data=pcm[off : off + PCM_CHUNK_BYTES],
+                                mime_type="audio/pcm;rate=24000",
+                            )
+                        )
+                    ],
+                )
+            )
+        )
+        for off in range(0, len(pcm), PCM_CHUNK_BYTES)
+    ]
+
+
+class ScriptedGemini:
+    """Stand-in for gemini_client.aio.live with one script for every call."""
+
+    def __init__(self, briefing_s: float, closing_s: float, listen_s: float):
+        self.briefing = _audio_messages(briefing_s, seed=2)
+        self.closing = _audio_messages(closing_s, seed=4)
+        self.listen_s = listen_s
+        self.aio = SimpleNamespace(live=self)
+
+    def connect(self, model: str, config):
+        return _LiveConnection(self)
+
+
+class _LiveConnection:
+    def __init__(self, script: ScriptedGemini):
+        self.session = ScriptedSession(script)
+
+    async def __aenter__(self):
+        return self.session
+
+    async def __aexit__(self, *exc):
+        self.session.close()
+
+
+class ScriptedSession:
+    def __init__(self, script: ScriptedGemini):
+        self.script = script
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        self._tasks: set[asyncio.Task] = set()
+        self._listening = False
+        self._voiced_sec = 0.0
+        self._silent_sec = 0.0
+        self._decided = False
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _speak(self, messages: list, then_listen: bool):
+        # Gemini streams audio roughly 2.5x faster than it plays
+        for msg in messages:
+            await self._outbox.put(msg)
+            await asyncio.sleep(0.04)
+        await self._outbox.put(
+            types.LiveServerMessage(
+                server_content=types.LiveServerContent(
+                    output_transcription=types.Transcription(text="브리핑"),
+                    turn_complete=True,
+                )
+            )
+        )
+        self._listening = then_listen
+
+    async def send_client_content(self, turns=None, turn_complete: bool = True):
+        if turn_complete:
+            self._spawn(self._speak(self.script.briefing, then_listen=True))
+        else:
+            # Cached briefing is being played by the server itself
+            self._listening = True
+
+    async def send_realtime_input(
+        self, audio: types.Blob | None = None, audio_stream_end: bool = False
+    ):
+        if not self._listening or self._decided:
+            return
+        if audio:
+            samples = np.frombuffer(audio.data, dtype=np.int16).astype(np.float32)
+            if np.sqrt(np.mean(samples * samples)) > SPEECH_RMS:
+                self._voiced_sec += len(samples) / 16000
+                self._silent_sec = 0.0
+            else:
+                self._silent_sec += len(samples) / 16000
+        end_of_turn = audio_stream_end or self._silent_sec >= END_SILENCE_SEC
+        if end_of_turn and self._voiced_sec >= self.script.listen_s:
+            # The hospital has answered and fallen silent: decide
+            self._decided = True
+            call = types.FunctionCall(
+                id="1",
+                name="update_hospital_decision",
+                args={"status": "rejected", "reason": "부하시험"},
+            )
+            await self._outbox.put(
+                types.LiveServerMessage(
+                    tool_call=types.LiveServerToolCall(function_calls=[call])
+                )
+            )
+
+    async def send_tool_response(self, function_responses):
+        self._spawn(self._speak(self.script.closing, then_listen=False))
+
+    async def receive(self):
+        # Like the SDK: one model turn per receive()
+        while True:
+            msg = await self._outbox.get()
+            yield msg
+            if msg.server_content and msg.server_content.turn_complete:
+                return
+
+    def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+
+# --- Fake Twilio REST (server process) ---
+class FakeTwilio:
+    """Synchronous like the SDK; called from TwilioDialer's thread pool."""
+
+    def __init__(self, events: multiprocessing.Queue):
+        self._events = events
+        self._sids = itertools.count(1)
+        self.calls = self
+
+    def create(self, to: str, from_: str, url: str, method: str, **status_callback):
+        sid = f"CA{next(self._sids):032d}"
+        query = parse_qs(urlparse(url).query)
+        eid, hospital_id = query["emergency_id"][0], int(query["hospital_id"][0])
+        self._events.put(("dial", sid, eid, hospital_id))
+        return SimpleNamespace(sid=sid)
+
+    def __call__(self, sid: str):
+        return SimpleNamespace(
+            update=lambda status: self._events.put(("hangup", sid)),
+            # Ring timeouts never fire within a level
+            fetch=lambda: SimpleNamespace(status="in-progress"),
+        )
+
+
+def serve(port: int, events: multiprocessing.Queue, args):
+    """Server process: main.app with every external service scripted."""
+    if not args.verbose:
+        for name in ("emergency-ai", "httpx"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    update_hospital_decision = main.update_hospital_decision
+    decided_at: dict[str, float] = {}
+
+    async def timed_decision(emergency_id: str, *args, **kwargs):
+        decided_at[emergency_id] = time.monotonic()
+        return await update_hospital_decision(emergency_id, *args, **kwargs)
+
+    def nestjs(request: httpx.Request) -> httpx.Response:
+        if request.url.path == main.PROGRESS_EVENTS_PATH:
+            return httpx.Response(200)
+        # Batch results are keyed by emergency_id; the last decision completed it
+        started = decided_at.pop(request.headers["Idempotency-Key"], None)
+        if started is not None:
+            events.put(("callback", time.monotonic() - started))
+        return httpx.Response(200)
+
+    main.update_hospital_decision = timed_decision
+    main.gemini_client = ScriptedGemini(args.briefing, args.closing, args.speak * 0.8)
+    main.dialer.client = FakeTwilio(events)
+    main.media = make_media(args.media_workers)
+    main.outbox._client = httpx.AsyncClient(transport=httpx.MockTransport(nestjs))
+    main.progress._client = main.outbox._client
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning")
+    uvicorn.Server(config).run()
+
+
+# --- Fake hospital (Twilio Media Streams client, driver process) ---
+class HospitalCall:
+    def __init__(self, run, sid: str, emergency_id: str, hospital_id: int):
+        self.run = run
+        self.sid = sid
+        self.emergency_id = emergency_id
+        self.hospital_id = hospital_id
+        self.hung_up = asyncio.Event()
+        self.speaking = False
+        self.spoke = False
+        self.speech_end = 0.0
+        self.answered = 0.0
+        self.utterances = 0
+        self.frames = 0
+        self.misses = 0
+        self._play_end = 0.0
+
+    async def run_call(self, url: str):
+        await asyncio.sleep(random.uniform(0.3, 1.5))  # ringing
+        started = time.monotonic()
+        try:
+            async with websockets.connect(url, max_queue=None) as ws:
+                await ws.send(json.dumps({"event": "connected"}))
+                await ws.send(
+                    json.dumps(
+                        {
+                            "event": "start",
+                            "start": {
+                                "streamSid": "MZ" + self.sid[2:],
+                                "callSid": self.sid,
+                                "customParameters": {
+                                    "emergency_id": self.emergency_id,
+                                    "hospital_id": str(self.hospital_id),
+                                },
+                            },
+                        }
+                    )
+                )
+                self.answered = time.monotonic()
+                tasks = [
+                    asyncio.create_task(self._send_audio(ws)),
+                    asyncio.create_task(self._receive_audio(ws)),
+                    asyncio.create_task(self.hung_up.wait()),
+                ]
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await ws.send(json.dumps({"event": "stop"}))
+        except (OSError, websockets.ConnectionClosed):
+            pass
+        finally:
+            self.run.call_seconds += time.monotonic() - started
+            self.run.finished(self)
+
+    async def _send_audio(self, ws):
+        """One inbound frame every 20ms, on an absolute clock."""
+        speech = self.run.speech_frames
+        silence = self.run.silence_frame
+        i = 0
+        next_at = time.monotonic()
+        while True:
+            if self.speaking:
+                await ws.send(speech[i % len(speech)])
+                i += 1
+                if i * FRAME_SEC >= self.run.speak_s:
+                    self.speaking, self.spoke = False, True
+                    self.speech_end = time.monotonic()
+            else:
+                await ws.send(silence)
+            next_at += FRAME_SEC
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+    async def _echo_mark(self, ws, message: str):
+        """Like Twilio: echo a mark once the audio sent before it has played."""
+        await asyncio.sleep(max(0.0, self._play_end - time.monotonic()))
+        try:
+            await ws.send(message)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _receive_audio(self, ws):
+        """Play received frames against a 20ms clock and note late ones."""
+        while True:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=GAP_SEC)
+            except asyncio.TimeoutError:
+                if self.utterances and time.monotonic() > self._play_end + GAP_SEC:
+                    if self.spoke and self.utterances > 1:
+                        return  # closing line finished: hang up
+                    if not self.speaking and self.utterances == 1:
+                        self.speaking = True  # briefing finished: answer
+                continue
+            event, body = decode_inbound(message)
+            if event == "mark":
+                asyncio.create_task(self._echo_mark(ws, message))
+            if event != "media":
+                continue
+            now = time.monotonic()
+            if now > self._play_end + GAP_SEC or not self.utterances:
+                # A new utterance starts
+                self.utterances += 1
+                if self.utterances == 1:
+                    self.run.first_audio.append(now - self.answered)
+                elif self.spoke:
+                    self.run.reply.append(now - self.speech_end)
+            elif now > self._play_end:
+                self.misses += 1
+            self.frames += 1
+            self._play_end = max(self._play_end, now) + len(body) / 8000
+
+
+# --- One concurrency level (driver process) ---
+class LoadRun:
+    def __init__(self, base: str, args):
+        self.base = base
+        self.speak_s = args.speak
+        self.calls: dict[str, HospitalCall] = {}
+        self.done = asyncio.Event()
+        self.first_audio: list[float] = []
+        self.reply: list[float] = []
+        self.callback: list[float] = []
+        self.call_seconds = 0.0
+        self.expected = 0
+        self.ended = 0
+        self.peak = 0
+        self.live = 0
+        encoder = MediaEncoder("MZloadtest")
+        ulaw = ENCODE_LUT[speech_like(4.0, 8000, seed=1).view(np.uint16)].tobytes()
+        self.speech_frames = [
+            encoder.media(ulaw[off : off + FRAME_BYTES])
+            for off in range(0, len(ulaw) - FRAME_BYTES + 1, FRAME_BYTES)
+        ]
+        self.silence_frame = encoder.media(b"\xff" * FRAME_BYTES)
+
+    def on_event(self, kind: str, *fields):
+        if kind == "dial":
+            self.answer(*fields)
+        elif kind == "hangup":
+            if call := self.calls.get(fields[0]):
+                call.hung_up.set()
+        elif kind == "callback":
+            self.callback.append(fields[0])
+
+    def answer(self, sid: str, emergency_id: str, hospital_id: int):
+        call = HospitalCall(self, sid, emergency_id, hospital_id)
+        self.calls[sid] = call
+        self.live += 1
+        self.peak = max(self.peak, self.live)
+        url = "ws" + self.base[len("http") :] + "/media-stream"
+        asyncio.create_task(call.run_call(url))
+
+    def finished(self, call: HospitalCall):
+        self.live -= 1
+        self.ended += 1
+        if self.ended >= self.expected:
+            self.done.set()
+
+    async def broadcast(self, client: httpx.AsyncClient, hospitals: int, n: int):
+        body = {
+            "hospitals": [
+                {"hospitalId": n * 100 + h, "phone": f"+1555{n:04d}{h:03d}"}
+                for h in range(hospitals)
+            ],
+            "patientId": n,
+            "age": "60대",
+            "sex": "male",
+            "category": "흉통",
+            "symptom": "급성 흉통",
+            "remarks": "부하시험",
+            "grade": 2,
+            "callback_url": "http://nestjs.invalid/callback",
+        }
+        await client.post(self.base + "/broadcast", json=body)
+
+
+def _pct(values: list[float], q: float) -> float | None:
+    return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+
+def _cpu_seconds(pid: int) -> float:
+    """utime + stime of a process and its live descendants, from /proc."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    total = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        for child in f.read().split():
+            try:
+                total += _cpu_seconds(int(child))
+            except FileNotFoundError:
+                pass  # exited meanwhile
+    return total
+
+
+async def run_level(run: LoadRun, n_calls: int, args, server_pid: int) -> dict:
+    broadcasts = math.ceil(n_calls / args.hospitals)
+    run.expected = broadcasts * args.hospitals
+    cpu0, driver0 = _cpu_seconds(server_pid), time.process_time()
+    wall0 = time.monotonic()
+    async with httpx.AsyncClient(timeout=30) as client:
+        await asyncio.gather(
+            *(run.broadcast(client, args.hospitals, n) for n in range(broadcasts))
+        )
+    try:
+        await asyncio.wait_for(run.done.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        logging.warning(f"[Load] {run.expected - run.ended} call(s) still open")
+    wall = time.monotonic() - wall0
+    cpu = _cpu_seconds(server_pid) - cpu0
+    # Above ~90% the fake hospitals themselves start delivering late
+    driver_load = (time.process_time() - driver0) / wall
+
+    frames = sum(c.frames for c in run.calls.values())
+    misses = sum(c.misses for c in run.calls.values())
+    return {
+        "calls": run.expected,
+        "peak_concurrent": run.peak,
+        "wall_s": round(wall, 1),
+        "answer_to_first_audio_ms": {
+            "p50": _pct(run.first_audio, 50),
+            "p99": _pct(run.first_audio, 99),
+        },
+        "speech_end_to_reply_ms": {
+            "p50": _pct(run.reply, 50),
+            "p99": _pct(run.reply, 99),
+        },
+        "decision_to_callback_ms": {
+            "p50": _pct(run.callback, 50),
+            "p99": _pct(run.callback, 99),
+        },
+        "downlink_frames": frames,
+        "missed_frame_ratio": round(misses / frames, 5) if frames else None,
+        "server_cpu_ms_per_call_second": (
+            round(cpu / run.call_seconds * 1000, 2) if run.call_seconds else None
+        ),
+        "driver_cpu_load": round(driver_load, 2),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_all(args) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    events = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(port, events, args))
+    server.start()
+
+    loop = asyncio.get_running_loop()
+    current: list[LoadRun] = []
+
+    async def pump():
+        while (event := await loop.run_in_executor(None, events.get)) != ("stop",):
+            if current:
+                current[-1].on_event(*event)
+
+    pumping = asyncio.create_task(pump())
+    levels = []
+    try:
+        async with httpx.AsyncClient() as client:
+            for _ in range(200):
+                try:
+                    await client.get(base + "/streams")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.05)
+        for n_calls in args.calls:
+            run = LoadRun(base, args)
+            current.append(run)
+            levels.append(await run_level(run, n_calls, args, server.pid))
+            _report_level(levels[-1])
+            await asyncio.sleep(1.0)
+    finally:
+        events.put(("stop",))
+        await pumping
+        server.terminate()
+        server.join()
+
+    within = [
+        lv["peak_concurrent"]
+        for lv in levels
+        if lv["missed_frame_ratio"] is not None
+        and lv["missed_frame_ratio"] <= args.max_miss
+    ]
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "hospitals_per_broadcast": args.hospitals,
+            "media_workers": args.media_workers,
+        },
+        "levels": levels,
+        "max_concurrent_within_deadline": max(within, default=0),
+    }
+
+
+def _report_level(lv: dict):
+    def pair(key):
+        return f"{lv[key]['p50']}/{lv[key]['p99']}"
+
+    print(
+        f"  {lv['calls']:>5} calls  peak {lv['peak_concurrent']:>5}  "
+        f"first audio {pair('answer_to_first_audio_ms'):>13} ms  "
+        f"reply {pair('speech_end_to_reply_ms'):>13} ms  "
+        f"callback {pair('decision_to_callback_ms'):>11} ms  "
+        f"missed {lv['missed_frame_ratio']}  "
+        f"server cpu {lv['server_cpu_ms_per_call_second']} ms/call-s  "
+        f"driver load {lv['driver_cpu_load']}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--calls",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=[10, 25, 50, 100],
+        help="comma-separated concurrency levels (simultaneous calls)",
+    )
+    parser.add_argument("--hospitals", type=int, default=5, help="per broadcast")
+    parser.add_argument("--briefing", type=float, default=4.0, help="seconds")
+    parser.add_argument("--closing", type=float, default=1.0, help="seconds")
+    parser.add_argument("--speak", type=float, default=1.5, help="hospital reply s")
+    parser.add_argument("--max-miss", type=float, default=0.005)
+    parser.add_argument(
+        "--media-workers", type=int, default=0, help="MEDIA_WORKERS for the server"
+    )
+    parser.add_argument("--timeout", type=float, default=60.0, help="per level")
+    parser.add_argument("--out", help="write results JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="keep server logs")
+    args = parser.parse_args()
+    if not args.verbose:
+        for name in ("emergency-ai", "httpx"):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+    print("p50/p99 per level")
+    results = asyncio.run(run_all(args))
+    print(
+        f"Max concurrent calls within {args.max_miss:.1%} missed frames: "
+        f"{results['max_concurrent_within_deadline']}"
+    )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,60 @@
+"""
+Logging off the event loop.
+
+A StreamHandler formats each record and writes it to stderr on the thread
+that logged it, which in this server is the event loop: a slow stderr (a
+pipe into a busy log shipper, a paused terminal, a full disk behind a
+redirect) stalls every call's 20ms frames for as long as the write blocks.
+
+offload_logging() replaces the handlers of the root logger (and of any
+named logger that has its own, such as uvicorn's) with a QueueHandler. The
+loop only enqueues the record; a QueueListener thread per logger formats it
+and hands it to the original handlers. Records are queued unformatted (no
+QueueHandler.prepare), so message %-args and tracebacks are also rendered on
+that thread. The queue is bounded: if the writer falls behind, new records
+are dropped and counted rather than blocking the loop.
+"""
+
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks and never formats on the caller's thread."""
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def offload_logging(
+    *names: str, max_queued: int = 10000
+) -> list[DroppingQueueHandler]:
+    """Move the root logger's and `names`' handlers onto background threads.
+
+    Loggers without handlers of their own are left alone; they propagate to
+    the root's queue. Pending records are written at interpreter exit.
+    """
+    installed = []
+    for log in [logging.getLogger(), *map(logging.getLogger, names)]:
+        if not log.handlers:
+            continue
+        q: queue.Queue = queue.Queue(max_queued)
+        listener = QueueListener(q, *log.handlers, respect_handler_level=True)
+        handler = DroppingQueueHandler(q)
+        log.handlers = [handler]
+        listener.start()
+        atexit.register(listener.stop)
+        installed.append(handler)
+    return installed
@@ -7,41 +7,85 @@ Architecture:
   Gemini AI briefs the hospital, confirms accept/reject via Function Calling
   Results are sent back to NestJS via POST callback
 
-Audio pipeline:
-  Twilio (mulaw 8kHz) → decode → resample 16kHz → Gemini Live (PCM 16kHz)
-  Gemini Live (PCM 24kHz) → resample 8kHz → encode mulaw → Twilio
+Audio pipeline (per-call streaming filters, see audio.py):
+  Twilio (mulaw 8kHz) → voice-activity gate (vad.py) → decode
+    → ×2 polyphase 16kHz → Gemini Live (PCM 16kHz)
+  Gemini Live (PCM 24kHz) → ÷3 low-pass decimate 8kHz → encode mulaw
+    → 20ms frames paced at real time (playout.py) → Twilio
+  With MEDIA_WORKERS > 0 both conversions run in worker processes, fed
+  through shared-memory rings (mediaworkers.py).
 """
 
 import asyncio
-import audioop
-import base64
-import json
 import logging
 import os
+import time
 import uuid
+from contextlib import asynccontextmanager
 
-import httpx
-import numpy as np
-## samplerate removed — numpy interp used instead (no C compiler needed)
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI, Response, WebSocket
+from fastapi import FastAPI, Form, Response, WebSocket, WebSocketDisconnect
+from fastapi.websockets import WebSocketState
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from twilio.rest import Client as TwilioClient
 from twilio.twiml.voice_response import VoiceResponse
 from google import genai
 from google.genai import types
 
+from briefing import BriefingCache
+from callsession import CLOSE, MARK, STREAM_END, CallPhase, CallSession
+from deadlines import DeadlineScheduler
+from dialer import DialCancelled, TwilioDialer
+from journal import Journal
+from logqueue import offload_logging
+from mediacodec import decode_inbound
+from mediaworkers import make_media
+from metrics import CODEC_US_BUCKETS, Registry, watch_loop_lag
+from outbox import CallbackOutbox
+from prewarm import LiveSessionPool
+from progress import ProgressStream
+from statestore import PENDING, make_state_store
+from transcripts import CallTranscript, TranscriptSink
+from vad import VoiceActivityDetector
+
 load_dotenv()
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
+# Formatting and writing happen on a thread, not the event loop
+log_queues = offload_logging("uvicorn", "uvicorn.access")
 logger = logging.getLogger("emergency-ai")
 logging.getLogger("websockets").setLevel(logging.WARNING)
 
-app = FastAPI(title="Emergency AI Call Server")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await media.start()
+    await outbox.replay()
+    for emergency_id, entry in (await journal.open()).items():
+        asyncio.create_task(recover_batch(emergency_id, entry))
+    lag_watcher = asyncio.create_task(watch_loop_lag(m_loop_lag))
+    if transcripts:
+        transcripts.start()
+    yield
+    lag_watcher.cancel()
+    for task in dial_tasks:
+        task.cancel()
+    if transcripts:
+        await transcripts.close()
+    await deadlines.close()
+    await journal.close()
+    await outbox.close()
+    await progress.close()
+    await state.close()
+    await media.close()
+
+
+app = FastAPI(title="Emergency AI Call Server", lifespan=lifespan)
 
 # --- Configuration ---
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
@@ -50,15 +94,68 @@ TWILIO_NUMBER = os.getenv("TWILIO_NUMBER")
 BASE_URL = os.getenv("BASE_URL")  # e.g. your-server.com (no https://)
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 MODEL_ID = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-native-audio-latest")
+# How far ahead of real-time playback we keep Twilio's buffer filled
+PLAYOUT_LEAD_MS = int(os.getenv("PLAYOUT_LEAD_MS", "80"))
+# Uplink PCM is batched into blocks of this size before send_realtime_input (20 = off)
+UPLINK_BLOCK_MS = int(os.getenv("UPLINK_BLOCK_MS", "60"))
+# Threads for blocking Twilio REST calls (dial / hang up run concurrently)
+TWILIO_MAX_WORKERS = int(os.getenv("TWILIO_MAX_WORKERS", "16"))
+# Account calls-per-second limit; dials beyond it queue, most urgent KTAS first
+TWILIO_CPS = float(os.getenv("TWILIO_CPS", "1"))
+# Per-call uplink queue bound, in 20ms frames
+AUDIO_IN_QUEUE_FRAMES = int(os.getenv("AUDIO_IN_QUEUE_FRAMES", "25"))
+# Undelivered NestJS callbacks are kept here and re-sent on restart
+CALLBACK_SPOOL_DIR = os.getenv("CALLBACK_SPOOL_DIR", "callback_spool")
+# Open Live sessions while the phone rings; unanswered ones close after the TTL
+PREWARM_LIVE_SESSIONS = os.getenv("PREWARM_LIVE_SESSIONS", "1") == "1"
+PREWARM_TTL_S = float(os.getenv("PREWARM_TTL_S", "75"))
+# First complete briefing audio per emergency is replayed to the other hospitals
+BRIEFING_CACHE_TTL_S = float(os.getenv("BRIEFING_CACHE_TTL_S", "300"))
+# Batch/call state: memory:// (single process) or redis://host:6379/0 (shared)
+STATE_STORE_URL = os.getenv("STATE_STORE_URL", "memory://")
+# Write-ahead log of batch transitions, one file per process (JOURNAL_PATH.N);
+# open batches are finalized after a restart
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", "emergency_journal.log")
+# A call whose media stream has not connected by then is hung up as no_answer
+RING_TIMEOUT_S = float(os.getenv("RING_TIMEOUT_S", "40"))
+# Batches still undecided after this are finalized and their calls hung up
+BATCH_DEADLINE_S = float(os.getenv("BATCH_DEADLINE_S", "180"))
+# Processes for audio conversion; 0 converts on the event loop
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "0"))
+# Uplink voice-activity gate: silence is not sent, the end of speech is signalled
+UPLINK_VAD = os.getenv("UPLINK_VAD", "1") == "1"
+VAD_THRESHOLD_DBFS = float(os.getenv("VAD_THRESHOLD_DBFS", "-40"))
+VAD_MAX_ZCR = float(os.getenv("VAD_MAX_ZCR", "0.3"))  # zero crossings per sample
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "400"))
+# Decided calls hang up once the closing line has played, or after this at most
+HANGUP_AFTER_DECISION_S = float(os.getenv("HANGUP_AFTER_DECISION_S", "15"))
+CLOSING_MARK = "closing"
+# Live progress is streamed to this path on the callback_url's host ("" = off)
+PROGRESS_EVENTS_PATH = os.getenv("PROGRESS_EVENTS_PATH", "/emergency/events")
+# What both sides said on every call, for QA: rotated JSONL files ("" = off)
+TRANSCRIPT_PATH = os.getenv("TRANSCRIPT_PATH", "")
 
 twilio_client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+dialer = TwilioDialer(
+    twilio_client, max_workers=TWILIO_MAX_WORKERS, calls_per_second=TWILIO_CPS
+)
+outbox = CallbackOutbox(CALLBACK_SPOOL_DIR)
+progress = ProgressStream(PROGRESS_EVENTS_PATH)
+transcripts = TranscriptSink(TRANSCRIPT_PATH) if TRANSCRIPT_PATH else None
+briefing_cache = BriefingCache(ttl=BRIEFING_CACHE_TTL_S)
 gemini_client = genai.Client(api_key=GOOGLE_API_KEY)
-
-# --- In-memory state ---
-# emergency_batches[emergency_id] = { "data": req_data, "results": {hospital_id: status}, "is_finalized": bool }
-emergency_batches: dict = {}
-# active_calls[call_sid] = { "hospital_id": int, "emergency_id": str }
-active_calls: dict = {}
+# Ring timeouts, batch deadlines and warm-session TTLs share one timer wheel
+deadlines = DeadlineScheduler()
+media = make_media(MEDIA_WORKERS)
+
+# --- State ---
+# Emergency batches and outbound calls, shared across workers (see statestore.py)
+state = make_state_store(STATE_STORE_URL)
+journal = Journal(JOURNAL_PATH)
+# live_streams[stream_sid] = CallSession of each connected media stream
+live_streams: dict = {}
+# Batches still being dialed in the background (see dial_batch)
+dial_tasks: set[asyncio.Task] = set()
 
 # --- System prompt for the AI agent ---
 SYSTEM_PROMPT = """당신은 응급 의료 상황실의 AI 전화 요원입니다. 병원에 전화를 걸어 응급 환자의 수용 여부를 확인하는 역할입니다.
@@ -77,6 +174,10 @@ SYSTEM_PROMPT = """당신은 응급 의료 상황실의 AI 전화 요원입니
 - 불필요한 잡담은 하지 않습니다.
 """
 
+# Stands in for a cached briefing whose transcript was not captured: model
+# context, and a transcript line marked as a placeholder
+BRIEFING_FALLBACK_TEXT = "환자 상태를 브리핑했습니다. 수용 가능 여부를 여쭤봤습니다."
+
 # --- Function declaration for Gemini Live ---
 DECISION_TOOL = types.Tool(
     function_declarations=[
@@ -103,6 +204,143 @@ DECISION_TOOL = types.Tool(
 )
 
 
+# --- Live session config (static, so sessions can be pre-warmed) ---
+LIVE_CONFIG = types.LiveConnectConfig(
+    response_modalities=["AUDIO"],
+    system_instruction=SYSTEM_PROMPT,
+    tools=[DECISION_TOOL],
+    # Transcript of the spoken briefing is needed to reuse it as context
+    output_audio_transcription=types.AudioTranscriptionConfig(),
+    # The hospital's side is only needed for the QA transcript
+    input_audio_transcription=(
+        types.AudioTranscriptionConfig() if TRANSCRIPT_PATH else None
+    ),
+    realtime_input_config=types.RealtimeInputConfig(
+        automatic_activity_detection=types.AutomaticActivityDetection(
+            disabled=False,
+            start_of_speech_sensitivity=types.StartSensitivity.START_SENSITIVITY_LOW,
+            end_of_speech_sensitivity=types.EndSensitivity.END_SENSITIVITY_LOW,
+            prefix_padding_ms=20,
+            silence_duration_ms=500,
+        )
+    ),
+)
+
+live_pool = LiveSessionPool(
+    lambda: gemini_client.aio.live.connect(model=MODEL_ID, config=LIVE_CONFIG),
+    deadlines,
+    ttl=PREWARM_TTL_S,
+)
+
+
+# --- Metrics (GET /metrics) ---
+metrics = Registry(prefix="emergency_ai_")
+m_broadcasts = metrics.counter("broadcasts_total", "Emergencies broadcast")
+m_dials = metrics.counter("dials_total", "Hospital calls placed", label="result")
+m_decisions = metrics.counter(
+    "decisions_total", "Hospital decisions recorded", label="status"
+)
+m_dial_seconds = metrics.histogram(
+    "broadcast_dial_seconds", "Time to place every call of a broadcast"
+)
+m_dial_wait = metrics.histogram(
+    "dial_queue_wait_seconds", "Dial queued to Twilio accepting the call"
+)
+dialer.on_dialed = m_dial_wait.observe
+m_first_audio = metrics.histogram(
+    "answer_to_first_audio_seconds",
+    "Twilio stream start to the first AI audio frame sent to the hospital",
+)
+m_reply = metrics.histogram(
+    "speech_end_to_reply_seconds",
+    "Hospital end of speech to the first audio of Gemini's reply",
+)
+m_callback = metrics.histogram(
+    "decision_to_callback_seconds",
+    "Deciding tool call to NestJS acknowledging the batch result",
+)
+m_decision_to_hangup = metrics.histogram(
+    "decision_to_hangup_seconds", "Deciding tool call to the bridge hanging up"
+)
+m_interrupt_to_silence = metrics.histogram(
+    "interrupt_to_silence_seconds",
+    "Hospital speech onset to the Twilio clear that stops the AI talking over it",
+)
+m_uplink_us = metrics.histogram(
+    "uplink_convert_us", "μ-law 8kHz → PCM 16kHz per 20ms frame", CODEC_US_BUCKETS
+)
+m_downlink_us = metrics.histogram(
+    "downlink_convert_us",
+    "PCM 24kHz → μ-law 8kHz per 20ms of audio",
+    CODEC_US_BUCKETS,
+)
+m_loop_lag = metrics.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop wakes a 500ms sleeper",
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+m_uplink_dropped = metrics.counter(
+    "uplink_frames_dropped_total", "Uplink frames dropped by ended calls' queues"
+)
+m_vad_frames = metrics.counter(
+    "uplink_vad_frames_total",
+    "Uplink frames of ended calls by voice-activity gate decision",
+    label="decision",
+)
+m_hangups = metrics.counter(
+    "decided_call_hangups_total", "Calls hung up after their decision", label="trigger"
+)
+m_barge_in_frames = metrics.counter(
+    "barge_in_flushed_frames_total",
+    "20ms frames of queued or buffered AI audio discarded on barge-in",
+)
+m_media_dropped = metrics.counter(
+    "media_worker_frames_dropped_total",
+    "Uplink frames dropped because a media worker fell behind",
+)
+metrics.gauge(
+    "media_streams", "Connected Twilio media streams", lambda: len(live_streams)
+)
+metrics.gauge("warm_live_sessions", "Pre-warmed Live sessions", lambda: len(live_pool))
+metrics.gauge("dials_queued", "Dials waiting for the CPS limit", lambda: dialer.queued)
+metrics.gauge(
+    "progress_events_queued",
+    "Progress events waiting for the NestJS stream",
+    lambda: progress.queued,
+)
+metrics.gauge(
+    "log_records_dropped",
+    "Log records dropped because the logging thread fell behind",
+    lambda: sum(h.dropped for h in log_queues),
+)
+metrics.gauge(
+    "transcript_lines_dropped",
+    "Transcript lines dropped because the disk fell behind",
+    lambda: transcripts.dropped if transcripts else 0,
+)
+metrics.gauge("pending_deadlines", "Scheduled deadlines", lambda: len(deadlines))
+metrics.gauge(
+    "media_workers_alive",
+    "Running media worker processes",
+    lambda: media.stats().get("alive", 0),
+)
+metrics.gauge(
+    "audio_in_queue_frames",
+    "Uplink frames queued, summed over connected streams",
+    lambda: sum(c.audio_in_q.qsize() for c in live_streams.values()),
+)
+metrics.gauge(
+    "audio_out_queue_chunks",
+    "Downlink chunks queued, summed over connected streams",
+    lambda: sum(c.audio_out_q.qsize() for c in live_streams.values()),
+)
+metrics.gauge(
+    "playout_queued_ms",
+    "Paced audio not yet sent, summed over connected streams",
+    lambda: sum(c.pacer.queued_ms for c in live_streams.values()),
+)
+
+
 # --- Pydantic models ---
 class Hospital(BaseModel):
     hospitalId: int
@@ -126,32 +364,59 @@ async def update_hospital_decision(
     emergency_id: str, hospital_id: int, status: str, reason: str = ""
 ):
     """Process hospital decision and trigger batch result if needed."""
-    batch = emergency_batches.get(emergency_id)
-    if not batch or batch["is_finalized"]:
-        return "already_processed"
-
-    batch["results"][hospital_id] = {"status": status, "reason": reason}
-    logger.info(f"[Decision] Hospital {hospital_id}: {status} (reason: {reason})")
+    decided_at = time.monotonic()
+    result = {"status": status, "reason": reason}
 
     if status == "accepted":
-        asyncio.create_task(send_batch_result(emergency_id))
-        asyncio.create_task(terminate_others(emergency_id))
-    elif status == "rejected":
-        all_responded = all(
-            isinstance(v, dict) for v in batch["results"].values()
+        # First acceptance wins, even when another worker is deciding concurrently
+        batch = await state.accept(emergency_id, hospital_id, result)
+        if batch is None:
+            return "already_processed"
+        journal.append("result", emergency_id, h=hospital_id, result=result)
+        m_decisions.inc(status)
+        logger.info(f"[Decision] Hospital {hospital_id}: {status} (reason: {reason})")
+        asyncio.create_task(send_batch_result(emergency_id, batch, decided_at))
+        asyncio.create_task(
+            terminate_others(emergency_id, keep_hospital_id=hospital_id)
+        )
+    else:
+        recorded, all_responded = await state.record_result(
+            emergency_id, hospital_id, result
         )
+        if not recorded:
+            return "already_processed"
+        journal.append("result", emergency_id, h=hospital_id, result=result)
+        m_decisions.inc(status)
+        logger.info(f"[Decision] Hospital {hospital_id}: {status} (reason: {reason})")
+        await report_progress(emergency_id, hospital_id, status)
         if all_responded:
-            asyncio.create_task(send_batch_result(emergency_id))
+            asyncio.create_task(
+                send_batch_result(emergency_id, decided_at=decided_at)
+            )
 
     return f"{status} recorded"
 
 
-async def send_batch_result(emergency_id: str):
-    """Send all hospital results to NestJS callback."""
-    batch = emergency_batches.get(emergency_id)
-    if not batch or batch["is_finalized"]:
-        return
-    batch["is_finalized"] = True
+async def send_batch_result(
+    emergency_id: str, batch: dict | None = None, decided_at: float | None = None
+):
+    """Send all hospital results to NestJS callback.
+
+    `batch` is passed by a caller that already finalized it (an acceptance);
+    otherwise the batch is finalized here, and only one caller gets to send.
+    `decided_at` (time.monotonic()) is when a tool call completed the batch.
+    """
+    if batch is None:
+        batch = await state.finalize(emergency_id)
+        if batch is None:
+            return
+    deadlines.cancel(("batch", emergency_id))
+    for h_id in batch["results"]:
+        deadlines.cancel(("ring", emergency_id, h_id))
+    # Calls still ringing will never be bridged now
+    live_pool.discard_where(lambda key: key[0] == emergency_id)
+    briefing_cache.evict(emergency_id)
+    progress.forget(emergency_id)
 
     payload = {
         "patientId": batch["data"]["patientId"],
@@ -163,29 +428,140 @@ async def send_batch_result(emergency_id: str):
         ],
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.post(
-                batch["data"]["callback_url"], json=payload, timeout=5.0
-            )
-            logger.info(
-                f"[Callback] Sent to NestJS: {resp.status_code} for {emergency_id}"
-            )
-        except Exception as e:
-            logger.error(f"[Callback] Failed: {e}")
+    # Retried with backoff and spooled to disk until NestJS acknowledges it
+    delivery = outbox.submit(batch["data"]["callback_url"], payload, key=emergency_id)
+    journal.append("finalized", emergency_id)
 
+    if decided_at is not None:
 
-async def terminate_others(emergency_id: str):
-    """Hang up all other calls in the same emergency batch."""
-    for sid in list(active_calls.keys()):
-        info = active_calls.get(sid)
-        if info and info["emergency_id"] == emergency_id:
-            try:
-                twilio_client.calls(sid).update(status="completed")
-                del active_calls[sid]
-                logger.info(f"[Terminate] Hung up call {sid}")
-            except Exception as e:
-                logger.warning(f"[Terminate] Failed for {sid}: {e}")
+        def observe(task: asyncio.Task):
+            if not task.cancelled() and task.result():
+                m_callback.observe(time.monotonic() - decided_at)
+
+        delivery.add_done_callback(observe)
+
+
+async def report_progress(emergency_id: str, hospital_id: int, status: str):
+    """Stream one hospital's step to NestJS ahead of the batch result."""
+    if not PROGRESS_EVENTS_PATH:
+        return
+    batch = await state.get_batch(emergency_id)
+    if not batch or batch["is_finalized"]:
+        return
+    progress.publish(
+        batch["data"]["callback_url"],
+        emergency_id,
+        batch["data"]["patientId"],
+        hospital_id,
+        status,
+    )
+
+
+async def record_no_answer(
+    emergency_id: str, hospital_id: int, call_sid: str, reason: str
+):
+    """The call ended or will be ended without being bridged: no answer."""
+    live_pool.discard((emergency_id, hospital_id))
+    await state.unregister_call(call_sid)
+
+    result = {"status": "no_answer", "reason": reason}
+    recorded, all_responded = await state.record_result(
+        emergency_id, hospital_id, result
+    )
+    if recorded:
+        journal.append("result", emergency_id, h=hospital_id, result=result)
+        logger.info(f"[NoAnswer] Hospital {hospital_id}: {reason}")
+        await report_progress(emergency_id, hospital_id, "no_answer")
+    if recorded and all_responded:
+        await send_batch_result(emergency_id)
+
+
+async def ring_timeout(emergency_id: str, hospital_id: int, call_sid: str):
+    """The call's media stream never connected: give up on this hospital."""
+    try:
+        status = await dialer.status(call_sid)
+    except Exception as e:
+        logger.warning(f"[Deadline] Status lookup failed for {call_sid}: {e}")
+        status = None
+    if status == "in-progress":
+        # Answered, with its media stream on another worker
+        return
+    logger.info(f"[Deadline] Hospital {hospital_id} did not pick up ({status})")
+    await dialer.hangup_many([call_sid])
+    await record_no_answer(emergency_id, hospital_id, call_sid, "ring_timeout")
+
+
+async def batch_deadline(emergency_id: str):
+    """Report whatever was decided and stop calling once the batch runs out."""
+    logger.info(f"[Deadline] Batch {emergency_id} reached its deadline")
+    await send_batch_result(emergency_id)
+    await terminate_others(emergency_id)
+
+
+async def recover_batch(emergency_id: str, entry: dict):
+    """Take over a batch that was still open when its process stopped.
+
+    With a shared store the batch lives on: calls bridged on other workers
+    carry on, but its ring timers and batch deadline died with that process,
+    so they are armed again here. Otherwise its media streams died too and no
+    call can be resumed: hang up whatever may still be ringing, mark
+    undecided hospitals and send the results decided before the restart.
+    """
+    batch = await state.get_batch(emergency_id)
+    if batch and batch["is_finalized"]:
+        journal.append("finalized", emergency_id)
+        return
+    if batch:
+        created_at = entry.get("created_at") or time.time()
+        remaining = BATCH_DEADLINE_S - (time.time() - created_at)
+        deadlines.schedule(
+            ("batch", emergency_id), max(0.0, remaining), batch_deadline, emergency_id
+        )
+        # When each call was placed is not journaled: give it a full ring
+        for sid, h_id in entry["calls"].items():
+            if batch["results"].get(h_id) == PENDING:
+                deadlines.schedule(
+                    ("ring", emergency_id, h_id),
+                    RING_TIMEOUT_S,
+                    ring_timeout,
+                    emergency_id,
+                    h_id,
+                    sid,
+                )
+        logger.info(
+            f"[Recover] Re-armed {emergency_id}: deadline in {max(0.0, remaining):.0f}s"
+        )
+        return
+    logger.info(f"[Recover] Finalizing {emergency_id} after restart")
+    await state.create_batch(emergency_id, entry["data"], entry["hospital_ids"])
+    for h_id, result in entry["results"].items():
+        await state.record_result(emergency_id, h_id, result)
+    await dialer.hangup_many(list(entry["calls"]))
+    for h_id in entry["hospital_ids"]:
+        await state.record_result(
+            emergency_id,
+            h_id,
+            {"status": "no_answer", "reason": "server_restarted"},
+        )
+    await send_batch_result(emergency_id)
+
+
+async def terminate_others(emergency_id: str, keep_hospital_id: int | None = None):
+    """Hang up all other calls in the same emergency batch, in parallel."""
+    sids = [
+        sid
+        for sid, info in (await state.calls_for(emergency_id)).items()
+        if info["hospital_id"] != keep_hospital_id
+    ]
+    live_pool.discard_where(
+        lambda key: key[0] == emergency_id and key[1] != keep_hospital_id
+    )
+    for sid, err in (await dialer.hangup_many(sids)).items():
+        if err:
+            logger.warning(f"[Terminate] Failed for {sid}: {err}")
+        else:
+            await state.unregister_call(sid)
+            logger.info(f"[Terminate] Hung up call {sid}")
 
 
 # --- Endpoints ---
@@ -193,46 +569,127 @@ async def terminate_others(emergency_id: str):
 async def start_broadcast(req: EmergencyRequest):
     """Start calling hospitals in parallel (called by NestJS)."""
     emergency_id = str(uuid.uuid4())
-    emergency_batches[emergency_id] = {
-        "data": req.dict(),
-        "results": {h.hospitalId: "calling" for h in req.hospitals},
-        "is_finalized": False,
-    }
+    hospital_ids = [h.hospitalId for h in req.hospitals]
+    await state.create_batch(emergency_id, req.dict(), hospital_ids)
+    journal.append(
+        "created",
+        emergency_id,
+        data=req.dict(),
+        hospital_ids=hospital_ids,
+        created_at=time.time(),
+    )
+    m_broadcasts.inc()
     logger.info(
         f"[Broadcast] ID: {emergency_id}, {len(req.hospitals)} hospitals"
     )
+    # Under a burst the dial queue can hold the calls longer than NestJS waits
+    # for this response: answer now, place the calls in the background
+    task = asyncio.create_task(dial_batch(emergency_id, req))
+    dial_tasks.add(task)
+    task.add_done_callback(dial_tasks.discard)
+    calls = [{"hospitalId": h.hospitalId, "status": "queued"} for h in req.hospitals]
+    return {"status": "processing", "emergency_id": emergency_id, "calls": calls}
+
+
+async def batch_closed(emergency_id: str) -> bool:
+    """True once the batch is decided: its queued dials are no longer wanted."""
+    batch = await state.get_batch(emergency_id)
+    return not batch or batch["is_finalized"]
+
+
+async def record_dial_failure(emergency_id: str, hospital_id: int, reason: str):
+    """The hospital could not be called: record it as failed."""
+    failed = {"status": "failed", "reason": reason}
+    recorded, all_responded = await state.record_result(
+        emergency_id, hospital_id, failed
+    )
+    if recorded:
+        journal.append("result", emergency_id, h=hospital_id, result=failed)
+    if recorded and all_responded:
+        # The last hospital to respond was a failed dial: finalize now
+        await send_batch_result(emergency_id)
+
+
+async def dial_batch(emergency_id: str, req: EmergencyRequest):
+    """Start a new batch's deadline, then place every one of its calls."""
+    # The deadline runs from the broadcast, however long the dials queue
+    deadlines.schedule(
+        ("batch", emergency_id), BATCH_DEADLINE_S, batch_deadline, emergency_id
+    )
 
-    for hospital in req.hospitals:
+    async def place(n: int, h_id: int, phone: str):
+        # Bookkeeping per call as soon as it is placed: under a burst the
+        # batch's later calls can sit in the dial queue for a while
+        sid = None
         try:
-            target_url = (
-                f"https://{BASE_URL}/voice-twiml"
-                f"?emergency_id={emergency_id}"
-                f"&hospital_id={hospital.hospitalId}"
-            )
-            call = twilio_client.calls.create(
-                to=hospital.phone,
+            sid = await dialer.dial(
+                (req.grade, n),
+                cancelled=lambda: batch_closed(emergency_id),
+                to=phone,
                 from_=TWILIO_NUMBER,
-                url=target_url,
+                url=(
+                    f"https://{BASE_URL}/voice-twiml"
+                    f"?emergency_id={emergency_id}"
+                    f"&hospital_id={h_id}"
+                ),
                 method="POST",
+                status_callback=(
+                    f"https://{BASE_URL}/call-status"
+                    f"?emergency_id={emergency_id}"
+                    f"&hospital_id={h_id}"
+                ),
+                status_callback_event=["ringing", "answered", "completed"],
+                status_callback_method="POST",
             )
-            active_calls[call.sid] = {
-                "hospital_id": hospital.hospitalId,
-                "emergency_id": emergency_id,
-            }
-            logger.info(f"[Call] {hospital.phone} -> SID: {call.sid}")
-        except Exception as e:
-            emergency_batches[emergency_id]["results"][hospital.hospitalId] = {
-                "status": "failed",
-                "reason": str(e),
-            }
-            logger.error(f"[Call] Failed {hospital.phone}: {e}")
-
-    return {"status": "processing", "emergency_id": emergency_id}
+            m_dials.inc("ok")
+            await state.register_call(sid, emergency_id, h_id)
+            journal.append("call", emergency_id, h=h_id, sid=sid)
+            if await batch_closed(emergency_id):
+                # Decided between the cancel check and the call being placed
+                await dialer.hangup_many([sid])
+                await state.unregister_call(sid)
+                logger.info(f"[Call] {phone} placed after the decision, hung up")
+                return
+            deadlines.schedule(
+                ("ring", emergency_id, h_id),
+                RING_TIMEOUT_S,
+                ring_timeout,
+                emergency_id,
+                h_id,
+                sid,
+            )
+            if PREWARM_LIVE_SESSIONS:
+                live_pool.prewarm((emergency_id, h_id))
+            logger.info(f"[Call] {phone} -> SID: {sid}")
+        except DialCancelled:
+            logger.info(f"[Call] {phone} not dialed: the batch was decided")
+        except Exception as err:
+            logger.error(f"[Call] Failed {phone}: {err}")
+            if sid is None:
+                m_dials.inc("failed")
+            else:
+                # Placed but not tracked: nobody could end it, so end it now
+                await dialer.hangup_many([sid])
+            try:
+                await record_dial_failure(emergency_id, h_id, str(err))
+            except Exception:
+                logger.exception(f"[Call] Could not record hospital {h_id} as failed")
+
+    # Queued at (grade, position in batch): KTAS 1 dials first, and batches
+    # of the same grade take turns so none waits for another to finish
+    dial_start = time.monotonic()
+    await asyncio.gather(
+        *(place(n, h.hospitalId, h.phone) for n, h in enumerate(req.hospitals))
+    )
+    m_dial_seconds.observe(time.monotonic() - dial_start)
 
 
 @app.post("/voice-twiml")
 async def voice_twiml(emergency_id: str, hospital_id: int):
     """Return TwiML that connects the call to our WebSocket for Media Streams."""
+    if PREWARM_LIVE_SESSIONS and await state.get_batch(emergency_id):
+        # No-op if /broadcast already pre-warmed this call
+        live_pool.prewarm((emergency_id, hospital_id))
     response = VoiceResponse()
     connect = response.connect()
     stream = connect.stream(url=f"wss://{BASE_URL}/media-stream")
@@ -241,73 +698,116 @@ async def voice_twiml(emergency_id: str, hospital_id: int):
     return Response(content=response.to_xml(), media_type="application/xml")
 
 
-# --- Audio conversion utilities ---
-def _resample_numpy(arr_float: np.ndarray, ratio: float) -> np.ndarray:
-    """Resample using numpy linear interpolation (no C library needed)."""
-    n_in = len(arr_float)
-    if n_in == 0:
-        return arr_float
-    n_out = int(n_in * ratio)
-    if n_out == 0:
-        return np.array([], dtype=np.float32)
-    x_old = np.linspace(0, 1, n_in)
-    x_new = np.linspace(0, 1, n_out)
-    return np.interp(x_new, x_old, arr_float).astype(np.float32)
-
-
-def mulaw_to_pcm_16k(chunk_ulaw: bytes) -> bytes:
-    """Convert mulaw 8kHz to PCM 16-bit 16kHz."""
-    # mulaw -> PCM 16-bit 8kHz
-    pcm_8k = audioop.ulaw2lin(chunk_ulaw, 2)
-    # Resample 8kHz -> 16kHz
-    arr_8k = np.frombuffer(pcm_8k, dtype=np.int16)
-    arr_float = arr_8k.astype(np.float32) / 32768.0
-    arr_16k = _resample_numpy(arr_float, ratio=2.0)
-    result = (arr_16k * 32767).astype(np.int16)
-    return result.tobytes()
-
-
-def pcm_24k_to_mulaw(chunk_pcm: bytes) -> bytes:
-    """Convert PCM 16-bit 24kHz to mulaw 8kHz."""
-    # Resample 24kHz -> 8kHz
-    arr_24k = np.frombuffer(chunk_pcm, dtype=np.int16)
-    arr_float = arr_24k.astype(np.float32) / 32768.0
-    arr_8k = _resample_numpy(arr_float, ratio=(8000.0 / 24000.0))
-    pcm_8k = (arr_8k * 32767).astype(np.int16).tobytes()
-    # PCM -> mulaw
-    return audioop.lin2ulaw(pcm_8k, 2)
+@app.post("/call-status")
+async def call_status(
+    emergency_id: str,
+    hospital_id: int,
+    CallSid: str = Form(...),
+    CallStatus: str = Form(...),
+):
+    """Twilio status callback: progress for NestJS; a dead call gives up early."""
+    if CallStatus in ("ringing", "in-progress"):
+        await report_progress(emergency_id, hospital_id, CallStatus)
+    elif CallStatus in ("busy", "no-answer", "failed", "canceled"):
+        # No need to wait out the ring timer for a call that is already over
+        deadlines.cancel(("ring", emergency_id, hospital_id))
+        await record_no_answer(
+            emergency_id, hospital_id, CallSid, CallStatus.replace("-", "_")
+        )
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Latency histograms, counters and live gauges in Prometheus text format."""
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/streams")
+async def list_streams():
+    """Per-call phase, queue depth and overflow counters for connected media streams."""
+    return {sid: call.stats() for sid, call in live_streams.items()}
+
+
+# --- Audio conversion ---
+def open_media(call: CallSession):
+    """Per-call converters: mulaw 8kHz ⇄ PCM 16kHz up / 24kHz down."""
+
+    def on_uplink(pcm_16k: memoryview, elapsed_us: float):
+        if not pcm_16k:
+            # The empty frame sent when the VAD gate closed, still in order
+            call.audio_in_q.put_nowait(STREAM_END)
+            return
+        m_uplink_us.observe(elapsed_us)
+        call.audio_in_q.put_nowait(bytes(pcm_16k))
+
+    def on_downlink(mulaw_data: memoryview, elapsed_us: float):
+        if mulaw_data:
+            # Normalised to 20ms of audio (160 bytes of mulaw)
+            m_downlink_us.observe(elapsed_us * 160 / len(mulaw_data))
+        if call.active:
+            call.pacer.feed(mulaw_data)
+
+    def on_mark():
+        if call.active:
+            call.pacer.mark(CLOSING_MARK)
+
+    return media.channel(on_uplink, on_downlink, on_mark)
 
 
 # --- WebSocket: 3-task architecture ---
-async def handle_twilio_to_gemini(
-    websocket: WebSocket,
-    audio_in_q: asyncio.Queue,
-    call_state: dict,
-):
+async def handle_twilio_to_gemini(websocket: WebSocket, call: CallSession):
     """Task 1: Receive Twilio audio, convert mulaw→PCM, push to queue."""
     async for message_str in websocket.iter_text():
         try:
-            msg = json.loads(message_str)
+            event, body = decode_inbound(message_str)
 
-            if msg["event"] == "start":
+            if event == "media":
+                if not call.active:
+                    continue
+                was_active = call.vad.active
+                frames, speech_ended = call.vad.push(body)
+                if (
+                    call.vad.active
+                    and not was_active
+                    and time.monotonic() < call.cached_until
+                ):
+                    # Gemini only interrupts audio it generated itself, so the
+                    # replayed briefing is stopped on the local speech onset
+                    asyncio.create_task(barge_in(websocket, call))
+                if speech_ended:
+                    frames.append(b"")
+                for frame in frames:
+                    if not call.media.uplink(frame):
+                        m_media_dropped.inc()
+
+            elif event == "start":
+                msg = body
                 params = msg["start"].get("customParameters", {})
-                call_state["stream_sid"] = msg["start"]["streamSid"]
-                call_state["emergency_id"] = params.get("emergency_id")
-                call_state["hospital_id"] = int(params.get("hospital_id", 0))
-                call_state["active"] = True
-                logger.info(
-                    f"[Stream] Started: hospital={call_state['hospital_id']}"
+                call.start(
+                    stream_sid=msg["start"]["streamSid"],
+                    call_sid=msg["start"].get("callSid"),
+                    emergency_id=params.get("emergency_id"),
+                    hospital_id=int(params.get("hospital_id", 0)),
                 )
+                live_streams[call.stream_sid] = call
+                deadlines.cancel(("ring", call.emergency_id, call.hospital_id))
+                asyncio.create_task(
+                    report_progress(call.emergency_id, call.hospital_id, "in-progress")
+                )
+                logger.info(f"[Stream] Started: hospital={call.hospital_id}")
 
-            elif msg["event"] == "media":
-                if not call_state.get("active"):
-                    continue
-                chunk_ulaw = base64.b64decode(msg["media"]["payload"])
-                pcm_16k = mulaw_to_pcm_16k(chunk_ulaw)
-                await audio_in_q.put(pcm_16k)
+            elif event == "mark":
+                if body.get("mark", {}).get("name") == CLOSING_MARK:
+                    logger.info(
+                        f"[Stream] Closing line played: hospital={call.hospital_id}"
+                    )
+                    asyncio.create_task(end_decided_call(call, "closing_played"))
 
-            elif msg["event"] == "stop":
-                call_state["active"] = False
+            elif event == "stop":
+                call.close()
                 logger.info("[Stream] Stopped")
                 break
 
@@ -316,48 +816,84 @@ async def handle_twilio_to_gemini(
             break
 
 
-async def handle_gemini_to_twilio(
-    websocket: WebSocket,
-    audio_out_q: asyncio.Queue,
-    call_state: dict,
-):
-    """Task 2: Receive Gemini audio from queue, convert PCM→mulaw, send to Twilio."""
-    while True:
+async def handle_gemini_to_twilio(websocket: WebSocket, call: CallSession):
+    """Task 2: Receive Gemini audio from queue, convert PCM→mulaw, pace 20ms frames to Twilio."""
+
+    async def send_frame(frame: bytes):
+        if call.encoder:
+            await websocket.send_text(call.encoder.media(frame))
+            if not call.first_audio_sent:
+                call.first_audio_sent = True
+                m_first_audio.observe(time.monotonic() - call.answered_at)
+
+    async def send_mark(name: str):
+        if call.encoder:
+            await websocket.send_text(call.encoder.mark(name))
+
+    pacer_task = asyncio.create_task(call.pacer.run(send_frame, send_mark))
+    try:
+        while True:
+            try:
+                # Take the next chunk only once the pacer has room for it
+                await call.pacer.wait_for_room()
+                chunk_pcm = await call.audio_out_q.get()
+                if chunk_pcm is CLOSE:
+                    break
+                if chunk_pcm is MARK:
+                    call.media.mark()
+                    continue
+                if chunk_pcm and call.active:
+                    await call.media.downlink(chunk_pcm)
+            except Exception as e:
+                logger.error(f"[Gemini→Twilio] Error: {e}")
+                continue
+    finally:
+        pacer_task.cancel()
+
+
+async def end_decided_call(call: CallSession, trigger: str):
+    """Hang up a call whose decision is recorded; frees the line and the session."""
+    if call.closed.is_set():
+        return
+    call.close()
+    m_hangups.inc(trigger)
+    m_decision_to_hangup.observe(time.monotonic() - call.decided_at)
+    if call.call_sid:
         try:
-            chunk_pcm = await asyncio.wait_for(audio_out_q.get(), timeout=1.0)
-            if chunk_pcm and call_state.get("active"):
-                mulaw_data = pcm_24k_to_mulaw(chunk_pcm)
-                payload = base64.b64encode(mulaw_data).decode("utf-8")
-                sid = call_state.get("stream_sid")
-                if sid:
-                    await websocket.send_json(
-                        {
-                            "event": "media",
-                            "streamSid": sid,
-                            "media": {"payload": payload},
-                        }
-                    )
-        except asyncio.TimeoutError:
-            if not call_state.get("active", True):
-                break
+            await dialer.hangup(call.call_sid)
         except Exception as e:
-            logger.error(f"[Gemini→Twilio] Error: {e}")
-            continue
+            logger.warning(f"[Hangup] {call.call_sid} failed: {e}")
 
 
-async def conversation_loop(
-    audio_in_q: asyncio.Queue,
-    audio_out_q: asyncio.Queue,
-    call_state: dict,
-):
+async def barge_in(websocket: WebSocket, call: CallSession):
+    """The hospital talked over the AI: silence it now, not when the queue runs dry."""
+    if not call.active or not call.encoder:
+        return
+    stale = call.audio_out_q.drain()
+    unplayed_ms = call.pacer.unplayed_ms
+    call.pacer.clear()
+    call.media.reset_downlink()
+    call.cached_until = 0.0
+    await websocket.send_text(call.encoder.clear())
+    if onset := call.vad.speech_started_at:
+        m_interrupt_to_silence.observe(time.monotonic() - onset)
+    # 24kHz PCM is 48 bytes per ms
+    flushed_ms = unplayed_ms + sum(len(c) for c in stale) / 48
+    m_barge_in_frames.inc(amount=round(flushed_ms / 20))
+    logger.info(
+        f"[Barge-in] Hospital {call.hospital_id}: "
+        f"dropped {flushed_ms:.0f}ms of AI audio"
+    )
+
+
+async def conversation_loop(websocket: WebSocket, call: CallSession):
     """Task 3: Manage Gemini Live session — send audio, receive audio + tool calls."""
     # Wait for Twilio stream to start
-    while not call_state.get("active"):
-        await asyncio.sleep(0.1)
+    await call.started.wait()
 
-    emergency_id = call_state["emergency_id"]
-    hospital_id = call_state["hospital_id"]
-    batch = emergency_batches.get(emergency_id)
+    emergency_id = call.emergency_id
+    hospital_id = call.hospital_id
+    batch = await state.get_batch(emergency_id)
 
     if not batch:
         logger.error(f"[Gemini] No batch found for {emergency_id}")
@@ -375,52 +911,93 @@ async def conversation_loop(
         f"수용 가능 여부를 확인해 주세요."
     )
 
-    config = types.LiveConnectConfig(
-        response_modalities=["AUDIO"],
-        system_instruction=SYSTEM_PROMPT,
-        tools=[DECISION_TOOL],
-        realtime_input_config=types.RealtimeInputConfig(
-            automatic_activity_detection=types.AutomaticActivityDetection(
-                disabled=False,
-                start_of_speech_sensitivity=types.StartSensitivity.START_SENSITIVITY_LOW,
-                end_of_speech_sensitivity=types.EndSensitivity.END_SENSITIVITY_LOW,
-                prefix_padding_ms=20,
-                silence_duration_ms=500,
-            )
-        ),
-    )
+    # Another hospital already heard this briefing: play it back instantly
+    cached = briefing_cache.get(emergency_id)
+    if cached:
+        call.pacer.feed(cached.ulaw)
+        call.cached_until = time.monotonic() + len(cached.ulaw) / 8000
+        call.phase = CallPhase.BRIEFING
+    briefing_pcm = bytearray()
+    briefing_text: list[str] = []
+    transcript = None
+    if transcripts:
+        transcript = CallTranscript(
+            transcripts, emergency_id, hospital_id, call.call_sid
+        )
+        if cached and cached.transcript:
+            transcript.note("ai", cached.transcript)
+        elif cached:
+            transcript.note("ai", BRIEFING_FALLBACK_TEXT, placeholder=True)
 
     try:
-        async with gemini_client.aio.live.connect(
-            model=MODEL_ID, config=config
-        ) as session:
+        # Claims the session pre-warmed while the phone rang, if there is one
+        async with live_pool.open((emergency_id, hospital_id)) as session:
             logger.info(
                 f"[Gemini] Connected for hospital {hospital_id}"
             )
 
-            # Send initial briefing — this triggers the AI to start speaking
-            await session.send_client_content(
-                turns=types.Content(
-                    role="user",
-                    parts=[types.Part(text=intro_text)],
-                ),
-                turn_complete=True,
-            )
-            logger.info(f"[Gemini] Briefing sent: {intro_text[:80]}...")
+            if cached:
+                # Briefing is already playing: give the model the exchange as
+                # context only, and let the hospital's reply start the next turn
+                await session.send_client_content(
+                    turns=[
+                        types.Content(role="user", parts=[types.Part(text=intro_text)]),
+                        types.Content(
+                            role="model",
+                            parts=[
+                                types.Part(
+                                    text=cached.transcript or BRIEFING_FALLBACK_TEXT
+                                )
+                            ],
+                        ),
+                    ],
+                    turn_complete=False,
+                )
+                call.phase = CallPhase.LISTENING
+                logger.info(f"[Gemini] Cached briefing played: hospital {hospital_id}")
+            else:
+                # Send initial briefing — this triggers the AI to start speaking
+                await session.send_client_content(
+                    turns=types.Content(
+                        role="user",
+                        parts=[types.Part(text=intro_text)],
+                    ),
+                    turn_complete=True,
+                )
+                call.phase = CallPhase.BRIEFING
+                logger.info(f"[Gemini] Briefing sent: {intro_text[:80]}...")
 
             # --- Sender: push audio from queue to Gemini ---
             async def sender():
-                while call_state.get("active"):
+                coalescer = call.coalescer
+
+                async def send_block(block: bytes):
+                    await session.send_realtime_input(
+                        audio=types.Blob(data=block, mime_type="audio/pcm;rate=16000")
+                    )
+
+                while True:
                     try:
-                        chunk = await asyncio.wait_for(
-                            audio_in_q.get(), timeout=0.5
-                        )
-                        await session.send_realtime_input(
-                            audio=types.Blob(
-                                data=chunk, mime_type="audio/pcm;rate=16000"
+                        if coalescer.pending:
+                            # Partial block held back: flush if the next frame is late
+                            chunk = await asyncio.wait_for(
+                                call.audio_in_q.get(), timeout=coalescer.flush_after
                             )
-                        )
+                        else:
+                            chunk = await call.audio_in_q.get()
+                        if chunk is CLOSE:
+                            break
+                        if chunk is STREAM_END:
+                            # Nothing more until the hospital speaks again
+                            if block := coalescer.flush():
+                                await send_block(block)
+                            await session.send_realtime_input(audio_stream_end=True)
+                            continue
+                        if block := coalescer.push(chunk):
+                            await send_block(block)
                     except asyncio.TimeoutError:
+                        if block := coalescer.flush():
+                            await send_block(block)
                         continue
                     except Exception as e:
                         logger.error(f"[Sender] Error: {e}")
@@ -428,75 +1005,134 @@ async def conversation_loop(
 
             # --- Receiver: get audio + tool calls from Gemini ---
             async def receiver():
-                async for response in session.receive():
-                    if not call_state.get("active"):
-                        break
-
-                    # Handle audio output
-                    if sc := response.server_content:
-                        if mt := sc.model_turn:
-                            for part in mt.parts:
-                                if id_data := part.inline_data:
-                                    if id_data.mime_type and id_data.mime_type.startswith("audio/"):
-                                        await audio_out_q.put(id_data.data)
-
-                    # Handle function calls
-                    if response.tool_call:
-                        fn_responses = []
-                        for fc in response.tool_call.function_calls:
-                            status = fc.args.get("status", "rejected")
-                            reason = fc.args.get("reason", "")
-                            logger.info(
-                                f"[Tool] Hospital {hospital_id}: {status} ({reason})"
-                            )
-                            result = await update_hospital_decision(
-                                emergency_id=emergency_id,
-                                hospital_id=hospital_id,
-                                status=status,
-                                reason=reason,
-                            )
-                            fn_responses.append(
-                                types.FunctionResponse(
-                                    name=fc.name,
-                                    id=fc.id,
-                                    response={"result": result},
+                closing_audio = False  # AI has spoken since the decision
+                # session.receive() stops after each complete model turn
+                while not call.closed.is_set():
+                    received = False
+                    async for response in session.receive():
+                        received = True
+                        if call.closed.is_set():
+                            break
+
+                        # Handle audio output
+                        if sc := response.server_content:
+                            briefing = call.phase is CallPhase.BRIEFING
+                            if mt := sc.model_turn:
+                                for part in mt.parts:
+                                    if id_data := part.inline_data:
+                                        if id_data.mime_type and id_data.mime_type.startswith("audio/"):
+                                            # Never wait on playout here, or a long
+                                            # turn would hide `interrupted` from us
+                                            call.audio_out_q.put_nowait(id_data.data)
+                                            if call.phase is CallPhase.WRAPPING_UP:
+                                                closing_audio = True
+                                            spoke = call.vad.speech_ended_at
+                                            if spoke and not briefing:
+                                                # First audio of the reply to that speech
+                                                call.vad.speech_ended_at = None
+                                                m_reply.observe(time.monotonic() - spoke)
+                                            if briefing:
+                                                briefing_pcm.extend(id_data.data)
+                            if briefing and sc.output_transcription:
+                                briefing_text.append(sc.output_transcription.text or "")
+                            if transcript:
+                                if sc.input_transcription:
+                                    transcript.heard(sc.input_transcription.text)
+                                if sc.output_transcription:
+                                    transcript.said(sc.output_transcription.text)
+                                if sc.turn_complete or sc.interrupted:
+                                    transcript.end_turn()
+                            if sc.interrupted:
+                                await barge_in(websocket, call)
+                            if briefing and sc.interrupted:
+                                # Talked over: not a clean take worth reusing, and
+                                # what the model says next is a reply, not the briefing
+                                briefing_pcm.clear()
+                                briefing_text.clear()
+                                call.phase = CallPhase.LISTENING
+                            if briefing and sc.turn_complete:
+                                call.phase = CallPhase.LISTENING
+                                if briefing_pcm and briefing_cache.put(
+                                    emergency_id,
+                                    bytes(briefing_pcm),
+                                    "".join(briefing_text).strip(),
+                                ):
+                                    logger.info(f"[Gemini] Briefing cached: {emergency_id}")
+                            if closing_audio and sc.turn_complete:
+                                # Hang up when Twilio has played the goodbye
+                                closing_audio = False
+                                call.audio_out_q.put_nowait(MARK)
+
+                        # Handle function calls
+                        if response.tool_call:
+                            call.phase = CallPhase.DECIDING
+                            fn_responses = []
+                            for fc in response.tool_call.function_calls:
+                                status = fc.args.get("status", "rejected")
+                                reason = fc.args.get("reason", "")
+                                logger.info(
+                                    f"[Tool] Hospital {hospital_id}: {status} ({reason})"
+                                )
+                                if transcript:
+                                    transcript.note("decision", f"{status}: {reason}")
+                                result = await update_hospital_decision(
+                                    emergency_id=emergency_id,
+                                    hospital_id=hospital_id,
+                                    status=status,
+                                    reason=reason,
                                 )
+                                fn_responses.append(
+                                    types.FunctionResponse(
+                                        name=fc.name,
+                                        id=fc.id,
+                                        response={"result": result},
+                                    )
+                                )
+                            await session.send_tool_response(
+                                function_responses=fn_responses
+                            )
+                            call.phase = CallPhase.WRAPPING_UP
+                            call.decided_at = time.monotonic()
+                            deadlines.schedule(
+                                ("wrapup", call.stream_sid),
+                                HANGUP_AFTER_DECISION_S,
+                                end_decided_call,
+                                call,
+                                "timeout",
                             )
-                        await session.send_tool_response(
-                            function_responses=fn_responses
-                        )
+                    if not received:
+                        break  # connection closed
 
             # Run sender and receiver concurrently
             sender_task = asyncio.create_task(sender())
             receiver_task = asyncio.create_task(receiver())
 
-            done, pending = await asyncio.wait(
-                [sender_task, receiver_task],
-                return_when=asyncio.FIRST_COMPLETED,
-            )
-            for t in pending:
-                t.cancel()
+            try:
+                await asyncio.wait(
+                    [sender_task, receiver_task],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                # Also when this task is cancelled by the websocket teardown
+                sender_task.cancel()
+                receiver_task.cancel()
 
     except asyncio.CancelledError:
         logger.info(f"[Gemini] Session cancelled for hospital {hospital_id}")
     except Exception as e:
         logger.error(f"[Gemini] Session error for hospital {hospital_id}: {e}")
+    if transcript:
+        transcript.end_turn()
 
     # If no decision was made (e.g. timeout), mark as no_answer
-    batch = emergency_batches.get(emergency_id)
-    if batch and not batch["is_finalized"]:
-        current = batch["results"].get(hospital_id)
-        if not isinstance(current, dict):
-            batch["results"][hospital_id] = {
-                "status": "no_answer",
-                "reason": "call_ended_without_decision",
-            }
-            # Check if all hospitals responded
-            all_responded = all(
-                isinstance(v, dict) for v in batch["results"].values()
-            )
-            if all_responded:
-                asyncio.create_task(send_batch_result(emergency_id))
+    no_answer = {"status": "no_answer", "reason": "call_ended_without_decision"}
+    recorded, all_responded = await state.record_result(
+        emergency_id, hospital_id, no_answer
+    )
+    if recorded:
+        journal.append("result", emergency_id, h=hospital_id, result=no_answer)
+    if recorded and all_responded:
+        asyncio.create_task(send_batch_result(emergency_id))
 
 
 # --- Main WebSocket endpoint ---
@@ -506,30 +1142,45 @@ async def websocket_media_stream(websocket: WebSocket):
     await websocket.accept()
     logger.info("[WS] Twilio WebSocket connected")
 
-    call_state = {"active": False, "stream_sid": None}
-    audio_in_q: asyncio.Queue = asyncio.Queue()
-    audio_out_q: asyncio.Queue = asyncio.Queue()
+    call = CallSession(
+        in_frames=AUDIO_IN_QUEUE_FRAMES,
+        playout_lead_ms=PLAYOUT_LEAD_MS,
+        uplink_block_ms=UPLINK_BLOCK_MS,
+        vad=VoiceActivityDetector(
+            threshold_dbfs=VAD_THRESHOLD_DBFS,
+            max_zcr=VAD_MAX_ZCR,
+            hangover_ms=VAD_HANGOVER_MS,
+            gate=UPLINK_VAD,
+        ),
+    )
+    call.media = open_media(call)
 
     tasks = [
-        asyncio.create_task(
-            handle_twilio_to_gemini(websocket, audio_in_q, call_state)
-        ),
-        asyncio.create_task(
-            handle_gemini_to_twilio(websocket, audio_out_q, call_state)
-        ),
-        asyncio.create_task(
-            conversation_loop(audio_in_q, audio_out_q, call_state)
-        ),
+        asyncio.create_task(handle_twilio_to_gemini(websocket, call)),
+        asyncio.create_task(handle_gemini_to_twilio(websocket, call)),
+        asyncio.create_task(conversation_loop(websocket, call)),
     ]
 
     try:
         await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
     finally:
-        call_state["active"] = False
+        call.close()
         for t in tasks:
             t.cancel()
-        logger.info("[WS] Cleanup complete")
+        live_streams.pop(call.stream_sid, None)
+        deadlines.cancel(("wrapup", call.stream_sid))
+        m_uplink_dropped.inc(amount=call.audio_in_q.dropped)
+        m_vad_frames.inc("sent", call.vad.frames_passed)
+        m_vad_frames.inc("suppressed", call.vad.frames_in - call.vad.frames_passed)
+        logger.info(f"[WS] Cleanup complete ({call.stats()['queues']})")
+        if websocket.client_state is WebSocketState.CONNECTED:
+            # We ended the call (decided, or Twilio sent stop): close cleanly
+            try:
+                await websocket.close()
+            except (RuntimeError, WebSocketDisconnect):
+                pass  # Twilio closed first
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # No log_config: uvicorn's loggers propagate to the root's queue
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None)
@@ -0,0 +1,65 @@
+"""
+Twilio Media Streams websocket message codec.
+
+`media` events are ~98% of the traffic on a call, so they get a fast path:
+  inbound   the base64 payload is sliced straight out of the raw text when
+            the message has Twilio's usual layout; anything else (start, stop,
+            mark, or an unexpected layout) goes through the full JSON parser
+  outbound  frames are written into a template with the streamSid already
+            filled in, instead of building a dict for send_json to serialise
+orjson is used for the full parse when installed; the stdlib otherwise.
+"""
+
+import binascii
+import json
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # optional speed-up
+    _loads = json.loads
+
+_MEDIA_PREFIX = '{"event":"media"'
+_PAYLOAD_KEY = '"payload":"'
+
+
+def decode_inbound(message: str) -> tuple[str, bytes | dict]:
+    """Returns ("media", μ-law bytes) or (event name, full message dict)."""
+    if message.startswith(_MEDIA_PREFIX):
+        start = message.find(_PAYLOAD_KEY)
+        if start != -1:
+            start += len(_PAYLOAD_KEY)
+            end = message.find('"', start)
+            if end != -1:
+                return "media", binascii.a2b_base64(message[start:end])
+    msg = _loads(message)
+    event = msg.get("event", "")
+    if event == "media":
+        return event, binascii.a2b_base64(msg["media"]["payload"])
+    return event, msg
+
+
+class MediaEncoder:
+    """Outbound messages for one stream, with the streamSid pre-rendered."""
+
+    __slots__ = ("stream_sid", "_media_head", "_mark_head", "_clear")
+
+    def __init__(self, stream_sid: str):
+        self.stream_sid = stream_sid
+        sid = json.dumps(stream_sid)
+        self._media_head = '{"event":"media","streamSid":' + sid + ',"media":{"payload":"'
+        self._mark_head = '{"event":"mark","streamSid":' + sid + ',"mark":{"name":'
+        self._clear = '{"event":"clear","streamSid":' + sid + "}"
+
+    def mark(self, name: str) -> str:
+        """Twilio echoes this back once the audio sent before it has played."""
+        return self._mark_head + json.dumps(name) + "}}"
+
+    def clear(self) -> str:
+        """Makes Twilio discard the audio it has buffered but not yet played."""
+        return self._clear
+
+    def media(self, ulaw_frame: bytes) -> str:
+        payload = binascii.b2a_base64(ulaw_frame, newline=False).decode("ascii")
+        return self._media_head + payload + '"}}'
@@ -0,0 +1,537 @@
+"""
+Per-call audio conversion, on the event loop or in worker processes.
+
+Resampling and μ-law coding are pure CPU work, and on the asyncio thread the
+GIL caps every call on the host at one core. MediaWorkerPool moves that work
+into N processes; the event loop keeps only websocket and Gemini I/O.
+
+Each worker owns two single-producer/single-consumer rings in shared memory
+  requests   event loop → worker   (μ-law frames up, Gemini PCM down)
+  responses  worker → event loop   (Gemini PCM up, μ-law frames down)
+and a pipe per direction as a doorbell. Payloads never go through pickle or
+the pipe: they are written once into the ring, converted straight out of a
+memoryview of it, and the result is written back the same way. A call's
+filter state lives in one worker for the call's lifetime, so each call is
+pinned to the live worker with the fewest calls when it connects.
+
+Workers run this file as a script (`python mediaworkers.py ...`), not through
+multiprocessing: spawn re-imports the parent's __main__ in every child, which
+for the server is main.py with its clients, journal and log threads. A worker
+that dies is started again after `restart_delay`; its calls drop audio until
+then and resume with fresh filter state. While no worker is running, new
+calls convert on the event loop.
+
+InlineMedia keeps the conversion on the event loop (MEDIA_WORKERS=0) behind
+the same channel interface.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import struct
+import subprocess
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Callable
+
+from audio import DownlinkConverter, UplinkConverter
+
+logger = logging.getLogger("emergency-ai.media")
+
+# Record kinds
+_WRAP = 0  # rest of the ring is padding; continue at offset 0
+UPLINK = 1  # μ-law 8kHz → PCM 16kHz
+DOWNLINK = 2  # PCM 24kHz → μ-law 8kHz
+CLOSE = 3  # drop the channel's filter state
+RESET = 4  # clear the downlink filter history (barge-in); echoed back
+MARK = 5  # echoed back in order with the downlink audio
+
+# length, kind, channel, arg (conversion µs on responses)
+_HEADER = struct.Struct("<IB3xII")
+_ALIGN = 16
+# Write and read indices on separate cache lines, then the data
+_WRITE, _READ, _DATA = 0, 8, 128
+# Longer Gemini chunks are split; the decimator carries state across pieces
+MAX_RECORD = 16 * 1024
+
+# Called with the converted audio (only valid during the call) and the µs spent
+Deliver = Callable[[memoryview, float], None]
+OnMark = Callable[[], None]
+
+
+class SharedRing:
+    """Single-producer single-consumer ring of framed records in shared memory.
+
+    Indices only ever grow; a record never straddles the end of the ring, so
+    every payload the consumer sees is one contiguous memoryview.
+    """
+
+    def __init__(self, capacity: int = 1 << 20, name: str | None = None):
+        if capacity & (capacity - 1) or capacity < _ALIGN:
+            raise ValueError("ring capacity must be a power of two")
+        self.capacity = capacity
+        self._mask = capacity - 1
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=_DATA + capacity)
+            self._owner = True
+        else:
+            self._shm = _attach(name)
+            self._owner = False
+        self._buf = self._shm.buf
+        self._idx = self._buf[:_DATA].cast("Q")
+        if self._owner:
+            self._idx[_WRITE // 8] = self._idx[_READ // 8] = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def put(self, kind: int, channel: int, arg: int, payload) -> bool:
+        """Append one record. False if the consumer is too far behind."""
+        data = memoryview(payload).cast("B")
+        n = len(data)
+        total = (_HEADER.size + n + _ALIGN - 1) & -_ALIGN
+        write = self._idx[_WRITE // 8]
+        pos = write & self._mask
+        tail = self.capacity - pos
+        pad = tail if tail < total else 0
+        if write + pad + total - self._idx[_READ // 8] > self.capacity:
+            return False
+        if pad:
+            if tail >= _HEADER.size:
+                _HEADER.pack_into(self._buf, _DATA + pos, 0, _WRAP, 0, 0)
+            write += pad
+            pos = 0
+        off = _DATA + pos
+        _HEADER.pack_into(self._buf, off, n, kind, channel, arg)
+        self._buf[off + _HEADER.size : off + _HEADER.size + n] = data
+        # Publish only once the record is complete
+        self._idx[_WRITE // 8] = write + total
+        return True
+
+    def drain(self):
+        """Yield (kind, channel, arg, payload) until the ring is empty.
+
+        The payload is a view into the ring and is released as soon as the
+        consumer asks for the next record.
+        """
+        read = self._idx[_READ // 8]
+        while read != self._idx[_WRITE // 8]:
+            pos = read & self._mask
+            tail = self.capacity - pos
+            if tail >= _HEADER.size:
+                n, kind, channel, arg = _HEADER.unpack_from(self._buf, _DATA + pos)
+            if tail < _HEADER.size or kind == _WRAP:
+                read += tail
+            else:
+                off = _DATA + pos + _HEADER.size
+                payload = self._buf[off : off + n]
+                yield kind, channel, arg, payload
+                payload.release()
+                read += (_HEADER.size + n + _ALIGN - 1) & -_ALIGN
+            self._idx[_READ // 8] = read
+
+    def close(self):
+        self._idx.release()
+        self._buf.release()
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Map an existing segment; only its creator ever unlinks it.
+
+    Before 3.13 attaching registers the segment with this process's resource
+    tracker, which unlinks it when the worker exits.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _ring_bell(fd: int):
+    try:
+        os.write(fd, b"\x01")
+    except BlockingIOError:
+        pass  # pipe full: the other side already has wake-ups pending
+
+
+def _serve(
+    requests: SharedRing, responses: SharedRing, wake_fd: int, notify_fd: int
+):
+    """Worker process: convert every request, forever, until the pipe closes."""
+    # Ctrl-C reaches the whole process group; the server shuts us down instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    uplinks: dict[int, UplinkConverter] = {}
+    downlinks: dict[int, DownlinkConverter] = {}
+    os.set_blocking(notify_fd, False)
+    _ring_bell(notify_fd)  # ready
+    while os.read(wake_fd, 4096):
+        for kind, channel, _, payload in requests.drain():
+            if kind == CLOSE:
+                uplinks.pop(channel, None)
+                downlinks.pop(channel, None)
+                continue
+            if kind in (RESET, MARK):
+                if kind == RESET and (converter := downlinks.get(channel)):
+                    converter.reset()
+                while not responses.put(kind, channel, 0, b""):
+                    _ring_bell(notify_fd)
+                    time.sleep(0.001)
+                continue
+            t0 = time.perf_counter()
+            if kind == UPLINK:
+                if (converter := uplinks.get(channel)) is None:
+                    converter = uplinks[channel] = UplinkConverter()
+            elif (converter := downlinks.get(channel)) is None:
+                converter = downlinks[channel] = DownlinkConverter()
+            out = converter.process(payload)
+            elapsed_us = int((time.perf_counter() - t0) * 1e6)
+            while not responses.put(kind, channel, elapsed_us, out):
+                # The event loop is behind: let it catch up
+                _ring_bell(notify_fd)
+                time.sleep(0.001)
+        _ring_bell(notify_fd)
+    requests.close()
+    responses.close()
+
+
+def _worker_main(argv: list[str]):
+    """Entry point of `python mediaworkers.py REQUESTS RESPONSES BYTES WAKE NOTIFY`."""
+    requests_name, responses_name, capacity, wake_fd, notify_fd = argv
+    _serve(
+        SharedRing(int(capacity), requests_name),
+        SharedRing(int(capacity), responses_name),
+        int(wake_fd),
+        int(notify_fd),
+    )
+
+
+class InlineChannel:
+    """Converts on the calling thread and delivers before returning."""
+
+    def __init__(self, on_uplink: Deliver, on_downlink: Deliver, on_mark: OnMark):
+        self._on_uplink = on_uplink
+        self._on_downlink = on_downlink
+        self._on_mark = on_mark
+        self._uplink = UplinkConverter()
+        self._downlink = DownlinkConverter()
+
+    def uplink(self, ulaw: bytes) -> bool:
+        t0 = time.perf_counter()
+        pcm = self._uplink.process(ulaw)
+        self._on_uplink(memoryview(pcm).cast("B"), (time.perf_counter() - t0) * 1e6)
+        return True
+
+    async def downlink(self, pcm: bytes):
+        t0 = time.perf_counter()
+        ulaw = self._downlink.process(pcm)
+        self._on_downlink(memoryview(ulaw), (time.perf_counter() - t0) * 1e6)
+
+    def reset_downlink(self):
+        self._downlink.reset()
+
+    def mark(self):
+        self._on_mark()
+
+    def close(self):
+        pass
+
+
+class InlineMedia:
+    """MEDIA_WORKERS=0: all conversion on the event loop."""
+
+    async def start(self):
+        pass
+
+    def channel(
+        self, on_uplink: Deliver, on_downlink: Deliver, on_mark: OnMark
+    ) -> InlineChannel:
+        return InlineChannel(on_uplink, on_downlink, on_mark)
+
+    def stats(self) -> dict:
+        return {"workers": 0}
+
+    async def close(self):
+        pass
+
+
+class _Worker:
+    """Event-loop side of one worker process."""
+
+    def __init__(
+        self, index: int, ring_bytes: int, on_exit: Callable[["_Worker"], None]
+    ):
+        self.index = index
+        self.ring_bytes = ring_bytes
+        self.channels: dict[int, WorkerChannel] = {}
+        self.alive = False
+        self.process: subprocess.Popen | None = None
+        self.ready = asyncio.Event()
+        self._on_exit = on_exit
+        self._drained = asyncio.Event()
+        # Control records that found the ring full; sent before anything else
+        self._unsent: list[tuple[int, int]] = []
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.requests = SharedRing(self.ring_bytes)
+        self.responses = SharedRing(self.ring_bytes)
+        wake_r, self._wake_w = os.pipe()
+        self._notify_r, notify_w = os.pipe()
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                self.requests.name,
+                self.responses.name,
+                str(self.ring_bytes),
+                str(wake_r),
+                str(notify_w),
+            ],
+            pass_fds=(wake_r, notify_w),
+        )
+        # Only the worker keeps these ends, so its exit reads as EOF here
+        os.close(wake_r)
+        os.close(notify_w)
+        os.set_blocking(self._wake_w, False)
+        os.set_blocking(self._notify_r, False)
+        loop.add_reader(self._notify_r, self._on_responses)
+        self.ready = asyncio.Event()
+        self._unsent.clear()
+        # Calls carried over from a dead process start again from scratch
+        for channel in self.channels.values():
+            channel._resets = 0
+        self.alive = True
+
+    @property
+    def running(self) -> bool:
+        return self.alive and self.process.poll() is None
+
+    def submit(self, kind: int, channel: int, payload) -> bool:
+        if not self.alive:
+            return False  # restarting: the caller drops or waits
+        if self._unsent and kind in (UPLINK, DOWNLINK):
+            return False  # keep audio behind the pending control records
+        if not self.requests.put(kind, channel, 0, payload):
+            return False
+        _ring_bell(self._wake_w)
+        return True
+
+    async def wait_drained(self):
+        self._drained.clear()
+        await self._drained.wait()
+
+    def _on_responses(self):
+        try:
+            if not os.read(self._notify_r, 4096):
+                self._exited()
+                return
+        except BlockingIOError:
+            pass
+        self.ready.set()
+        for kind, channel_id, elapsed_us, payload in self.responses.drain():
+            if channel := self.channels.get(channel_id):
+                channel.deliver(kind, payload, elapsed_us)
+        while self._unsent and self.submit(*self._unsent[0], b""):
+            self._unsent.pop(0)
+        self._drained.set()
+
+    def _exited(self):
+        asyncio.get_running_loop().remove_reader(self._notify_r)
+        if self.alive:
+            self.alive = False
+            logger.error(
+                f"[Media] Worker {self.index} exited; "
+                f"{len(self.channels)} call(s) lose audio until it restarts"
+            )
+            self._on_exit(self)
+        self.ready.set()
+        self._drained.set()
+
+    def submit_control(self, kind: int, channel_id: int):
+        if self.alive and not self.submit(kind, channel_id, b""):
+            self._unsent.append((kind, channel_id))
+
+    def close_channel(self, channel_id: int):
+        self.channels.pop(channel_id, None)
+        self.submit_control(CLOSE, channel_id)
+
+    async def stop(self):
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        if self.alive:
+            self.alive = False
+            asyncio.get_running_loop().remove_reader(self._notify_r)
+        # EOF on the doorbell ends the worker's loop
+        os.close(self._wake_w)
+        try:
+            await asyncio.to_thread(process.wait, 5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            await asyncio.to_thread(process.wait)
+        os.close(self._notify_r)
+        self.requests.close()
+        self.responses.close()
+
+
+class WorkerChannel:
+    """One call's converters, living in a worker process."""
+
+    __slots__ = (
+        "_worker",
+        "_id",
+        "_on_uplink",
+        "_on_downlink",
+        "_on_mark",
+        "_resets",
+        "dropped",
+    )
+
+    def __init__(
+        self,
+        worker: _Worker,
+        channel_id: int,
+        on_uplink: Deliver,
+        on_downlink: Deliver,
+        on_mark: OnMark,
+    ):
+        self._worker = worker
+        self._id = channel_id
+        self._on_uplink = on_uplink
+        self._on_downlink = on_downlink
+        self._on_mark = on_mark
+        self._resets = 0  # sent but not yet echoed back by the worker
+        self.dropped = 0
+
+    def uplink(self, ulaw: bytes) -> bool:
+        """Queue one frame. False (and dropped) if the worker has fallen behind."""
+        if self._worker.submit(UPLINK, self._id, ulaw):
+            return True
+        self.dropped += 1
+        return False
+
+    async def downlink(self, pcm: bytes):
+        """Queue one Gemini chunk, waiting for ring space rather than dropping."""
+        for off in range(0, len(pcm), MAX_RECORD):
+            piece = pcm[off : off + MAX_RECORD]
+            while not self._worker.submit(DOWNLINK, self._id, piece):
+                await self._worker.wait_drained()
+
+    def reset_downlink(self):
+        """Forget the downlink audio in flight and the filter's history.
+
+        Audio the worker converts before it sees the reset is discarded on
+        arrival; the reset's echo marks where fresh audio starts again.
+        """
+        self._resets += 1
+        self._worker.submit_control(RESET, self._id)
+
+    def mark(self):
+        """on_mark runs once the downlink audio submitted so far has been delivered."""
+        self._worker.submit_control(MARK, self._id)
+
+    def deliver(self, kind: int, payload: memoryview, elapsed_us: float):
+        if kind == UPLINK:
+            self._on_uplink(payload, elapsed_us)
+        elif kind == RESET:
+            self._resets -= 1
+        elif self._resets:
+            pass  # converted before a barge-in reset: stale
+        elif kind == MARK:
+            self._on_mark()
+        else:
+            self._on_downlink(payload, elapsed_us)
+
+    def close(self):
+        self._worker.close_channel(self._id)
+
+
+class MediaWorkerPool:
+    """N conversion processes; calls are pinned to the least-loaded live one."""
+
+    def __init__(
+        self, processes: int, ring_bytes: int = 1 << 20, restart_delay: float = 1.0
+    ):
+        self._workers = [
+            _Worker(i, ring_bytes, self._worker_exited) for i in range(processes)
+        ]
+        self.restart_delay = restart_delay
+        self.restarts = 0
+        self._next_id = 0
+        self._running = False
+        self._restarting: set[asyncio.Task] = set()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        for worker in self._workers:
+            worker.start(loop)
+        # Workers import numpy and build their tables before the first call
+        await asyncio.gather(*(w.ready.wait() for w in self._workers))
+        if not all(w.alive for w in self._workers):
+            await self.close()
+            raise RuntimeError("a media worker failed to start")
+        self._running = True
+        logger.info(f"[Media] {len(self._workers)} worker process(es) started")
+
+    def _worker_exited(self, worker: _Worker):
+        if self._running:
+            task = asyncio.create_task(self._restart(worker))
+            self._restarting.add(task)
+            task.add_done_callback(self._restarting.discard)
+
+    async def _restart(self, worker: _Worker):
+        await worker.stop()
+        await asyncio.sleep(self.restart_delay)
+        worker.start(asyncio.get_running_loop())
+        self.restarts += 1
+        logger.info(
+            f"[Media] Worker {worker.index} restarted "
+            f"with {len(worker.channels)} call(s)"
+        )
+
+    def channel(
+        self, on_uplink: Deliver, on_downlink: Deliver, on_mark: OnMark
+    ) -> WorkerChannel | InlineChannel:
+        live = [w for w in self._workers if w.running]
+        if not live:
+            logger.warning("[Media] No worker running; converting on the event loop")
+            return InlineChannel(on_uplink, on_downlink, on_mark)
+        worker = min(live, key=lambda w: len(w.channels))
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        channel = WorkerChannel(
+            worker, self._next_id, on_uplink, on_downlink, on_mark
+        )
+        worker.channels[self._next_id] = channel
+        return channel
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "calls": [len(w.channels) for w in self._workers],
+            "alive": sum(w.alive for w in self._workers),
+            "restarts": self.restarts,
+        }
+
+    async def close(self):
+        self._running = False
+        for task in self._restarting:
+            task.cancel()
+        await asyncio.gather(*(w.stop() for w in self._workers))
+
+
+def make_media(workers: int) -> InlineMedia | MediaWorkerPool:
+    """0 converts on the event loop; N > 0 starts N worker processes."""
+    return MediaWorkerPool(workers) if workers > 0 else InlineMedia()
+
+
+if __name__ == "__main__":
+    _worker_main(sys.argv[1:])
@@ -0,0 +1,123 @@
+"""
+Minimal in-process metrics in the Prometheus text exposition format.
+
+Recording is a few integer/float updates on preallocated state, cheap
+enough for the per-frame audio path:
+  Counter.inc       one dict update (the label's slot is created on first use)
+  Histogram.observe bisect into fixed bucket bounds + two adds
+Gauges are callables evaluated only when /metrics is scraped, so values
+like queue depths or session counts cost nothing between scrapes.
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Callable
+
+# Seconds, for latencies that a caller on the phone can notice
+LATENCY_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+# Microseconds, for per-frame codec work
+CODEC_US_BUCKETS = (5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000)
+
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    __slots__ = ("name", "help", "label", "_values")
+
+    def __init__(self, name: str, help: str, label: str | None = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values: dict[str, float] = {}
+
+    def inc(self, label_value: str = "", amount: float = 1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for value, total in self._values.items():
+            labels = f'{{{self.label}="{value}"}}' if self.label else ""
+            lines.append(f"{self.name}{labels} {_fmt(total)}")
+        return lines
+
+
+class Gauge:
+    __slots__ = ("name", "help", "read")
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_fmt(self.read())}",
+        ]
+
+
+class Histogram:
+    __slots__ = ("name", "help", "bounds", "counts", "sum", "count")
+
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, n in zip(self.bounds, self.counts):
+            cumulative += n
+            lines.append(f'{self.name}_bucket{{le="{_fmt(bound)}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {_fmt(self.sum)}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics: list = []
+
+    def counter(self, name: str, help: str, label: str | None = None) -> Counter:
+        return self._add(Counter(self.prefix + name, help, label))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self._add(Gauge(self.prefix + name, help, read))
+
+    def histogram(
+        self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+async def watch_loop_lag(histogram: Histogram, interval: float = 0.5):
+    """Record how late the event loop wakes a sleeper, forever."""
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, time.perf_counter() - t0 - interval))
@@ -0,0 +1,44 @@
+"""
+G.711 μ-law codec built on NumPy lookup tables.
+
+Bit-exact with audioop.ulaw2lin / audioop.lin2ulaw (width=2), which were
+removed from the standard library in Python 3.13.
+  DECODE_LUT   256 entries    μ-law byte → PCM 16-bit
+  ENCODE_LUT   65536 entries  PCM 16-bit (viewed as uint16) → μ-law byte
+"""
+
+import numpy as np
+
+_BIAS = 0x84
+_CLIP = 8159
+_SEG_END = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+
+
+def _build_decode_lut() -> np.ndarray:
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + _BIAS) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, _BIAS - t, t - _BIAS).astype(np.int16)
+
+
+def _build_encode_lut() -> np.ndarray:
+    pcm = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    mag = np.minimum(np.abs(pcm), _CLIP) + (_BIAS >> 2)
+    seg = np.searchsorted(_SEG_END, mag)
+    uval = (seg << 4) | ((mag >> (seg + 1)) & 0x0F)
+    return (np.where(seg >= 8, 0x7F, uval) ^ mask).astype(np.uint8)
+
+
+DECODE_LUT = _build_decode_lut()
+DECODE_LUT_F32 = DECODE_LUT.astype(np.float32)
+ENCODE_LUT = _build_encode_lut()
+
+
+def ulaw_decode(data: bytes) -> np.ndarray:
+    """μ-law bytes → int16 samples."""
+    return DECODE_LUT[np.frombuffer(data, dtype=np.uint8)]
+
+
+def ulaw_encode(samples: np.ndarray) -> bytes:
+    """int16 samples → μ-law bytes."""
+    return ENCODE_LUT[samples.astype(np.int16, copy=False).view(np.uint16)].tobytes()
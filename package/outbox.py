@@ -0,0 +1,219 @@
+"""
+Reliable delivery of result callbacks to the NestJS server.
+
+Every callback goes through one process-wide CallbackOutbox:
+  - one keep-alive httpx.AsyncClient (no TCP/TLS handshake per result)
+  - bounded concurrency across all emergencies
+  - exponential-backoff retries on network errors, 5xx, 408 and 429
+  - an Idempotency-Key header so a retried POST is recognisable
+  - an on-disk spool (one JSON file per key): a result is written before the
+    first attempt and removed once delivered, so anything still pending when
+    the process dies is re-sent by replay() on the next start
+
+Workers (and twiliospeach.py) share `spool_dir`, so each process spools into
+its own slot `spool_dir/N`, held with a lock on `spool_dir/N.lock` as the
+journal does: replay() in one worker never re-sends what another live worker
+is still retrying. replay() takes over the slots of processes that died (and
+entries spooled before there were slots), moving their files into its own.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import random
+import re
+import threading
+
+import httpx
+
+logger = logging.getLogger("emergency-ai.outbox")
+
+_RETRYABLE_STATUS = {408, 429}
+
+
+class CallbackOutbox:
+    def __init__(
+        self,
+        spool_dir: str,
+        max_concurrency: int = 8,
+        max_attempts: int = 6,
+        base_delay: float = 0.5,
+        timeout: float = 5.0,
+    ):
+        self.spool_dir = spool_dir
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.timeout = timeout
+        self._max_concurrency = max_concurrency
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._client: httpx.AsyncClient | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._dir: str | None = None  # spool_dir/N this process owns
+        self._lock_fd: int | None = None
+        self._claim_lock = threading.Lock()
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self._max_concurrency,
+                    max_keepalive_connections=self._max_concurrency,
+                ),
+            )
+        return self._client
+
+    # --- Disk (threads only) ---
+    @staticmethod
+    def _try_lock(lock_path: str) -> int | None:
+        """Exclusive lock on `lock_path`, or None if another process holds it."""
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Deleted by an adopter while we waited: a stale inode, not the slot
+            if os.fstat(fd).st_ino == os.stat(lock_path).st_ino:
+                return fd
+        except (BlockingIOError, FileNotFoundError):
+            pass
+        os.close(fd)
+        return None
+
+    def _claim(self) -> str:
+        """This process's slot directory, taking the first free one if need be."""
+        with self._claim_lock:
+            if self._dir is None:
+                n = 0
+                lock = os.path.join(self.spool_dir, "0.lock")
+                while (fd := self._try_lock(lock)) is None:
+                    n += 1
+                    lock = os.path.join(self.spool_dir, f"{n}.lock")
+                self._dir = os.path.join(self.spool_dir, str(n))
+                self._lock_fd = fd
+                os.makedirs(self._dir, exist_ok=True)
+            return self._dir
+
+    def _adopt(self) -> list[str]:
+        """Move orphaned entries into our slot. Returns every entry file in it."""
+        own = self._claim()
+        for name in sorted(os.listdir(self.spool_dir)):
+            path = os.path.join(self.spool_dir, name)
+            if name.endswith(".json"):
+                # Spooled before there were slots
+                os.replace(path, os.path.join(own, name))
+            elif name.isdigit() and path != own:
+                if (fd := self._try_lock(path + ".lock")) is None:
+                    continue  # a live process's slot
+                for entry in os.listdir(path):
+                    if entry.endswith(".json"):
+                        os.replace(os.path.join(path, entry), os.path.join(own, entry))
+                    else:
+                        os.remove(os.path.join(path, entry))  # half-written .tmp
+                os.rmdir(path)
+                os.remove(path + ".lock")
+                os.close(fd)
+        return sorted(name for name in os.listdir(own) if name.endswith(".json"))
+
+    def _spool_path(self, key: str) -> str:
+        return os.path.join(self._claim(), re.sub(r"[^\w.-]", "_", key) + ".json")
+
+    def _spool(self, entry: dict):
+        path = self._spool_path(entry["key"])
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    def _unspool(self, key: str):
+        try:
+            os.remove(self._spool_path(key))
+        except FileNotFoundError:
+            pass
+
+    def submit(self, url: str, payload: dict, key: str) -> asyncio.Task:
+        """Queue a callback for delivery. `key` must be unique per result."""
+        entry = {"url": url, "payload": payload, "key": key}
+        task = asyncio.create_task(self._deliver(entry, spool=True))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def replay(self) -> int:
+        """Re-send results spooled by dead processes. Returns how many."""
+        names = await asyncio.to_thread(self._adopt)
+        count = 0
+        for name in names:
+            try:
+                with open(os.path.join(self._dir, name)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"[Outbox] Unreadable spool file {name}: {e}")
+                continue
+            task = asyncio.create_task(self._deliver(entry, spool=False))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            count += 1
+        if count:
+            logger.info(f"[Outbox] Replaying {count} spooled callback(s)")
+        return count
+
+    async def _deliver(self, entry: dict, spool: bool) -> bool:
+        """True once NestJS has answered for good; False if left in the spool."""
+        key = entry["key"]
+        if spool:
+            await asyncio.to_thread(self._spool, entry)
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                async with self._sem:
+                    resp = await self._http().post(
+                        entry["url"],
+                        json=entry["payload"],
+                        headers={"Idempotency-Key": key},
+                    )
+                status = resp.status_code
+                if status < 500 and status not in _RETRYABLE_STATUS:
+                    if status < 400:
+                        logger.info(f"[Callback] Sent to NestJS: {status} for {key}")
+                    else:
+                        # A retry would be rejected the same way
+                        logger.error(f"[Callback] Rejected: {status} for {key}")
+                    await asyncio.to_thread(self._unspool, key)
+                    return True
+                error = f"HTTP {status}"
+            except httpx.HTTPError as e:
+                error = repr(e)
+            except Exception as e:
+                # Not a network error; still retried, and the entry stays spooled
+                logger.exception(f"[Callback] Unexpected error sending {key}")
+                error = repr(e)
+
+            if attempt == self.max_attempts:
+                break
+            delay = self.base_delay * 2 ** (attempt - 1)
+            logger.warning(
+                f"[Callback] Attempt {attempt} failed for {key}: {error}; "
+                f"retrying in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay * (1 + random.random() * 0.2))
+
+        logger.error(
+            f"[Callback] Giving up on {key} after {self.max_attempts} attempts; "
+            f"left in spool for replay"
+        )
+        return False
+
+    async def close(self):
+        """Stop in-flight retries (their spool files stay) and close the client."""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._lock_fd is not None:
+            # The slot's files stay for whichever process takes it next
+            os.close(self._lock_fd)
+            self._lock_fd = None
+            self._dir = None
@@ -0,0 +1,124 @@
+"""
+Real-time paced playout of Gemini audio to Twilio.
+
+Gemini delivers audio in bursts of arbitrary size. FramePacer re-slices the
+μ-law stream into exact 20ms frames and releases them at wall-clock pace,
+keeping only `lead_ms` of audio buffered ahead of playback on Twilio's side.
+Because we know what has been sent and when, we also know how much audio is
+still unplayed, so interruptions and hang-ups take effect immediately.
+Named marks can be queued behind the audio; each is sent right after the
+last frame queued before it, and Twilio echoes it once that audio has played.
+
+Gemini speaks faster than real time, so a long turn would pile up here.
+feed() never refuses audio, but the downlink loop awaits wait_for_room()
+before taking the next chunk: the pacer then holds at most `max_queued_ms`
+plus one chunk, and the backlog waits in audio_out_q, where barge-in drops it.
+"""
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable
+
+FRAME_BYTES = 160  # 20ms of 8kHz μ-law
+FRAME_SEC = 0.02
+ULAW_SILENCE = b"\xff"
+
+
+class FramePacer:
+    """Per-call outbound frame scheduler."""
+
+    def __init__(self, lead_ms: int = 80, max_queued_ms: int = 5000):
+        self.lead = lead_ms / 1000.0
+        self.max_queued_ms = max_queued_ms
+        self.frames_sent = 0
+        self._pending = bytearray()  # partial frame awaiting more audio
+        self._frames: deque[bytes] = deque()
+        self._marks: deque[tuple[int, str]] = deque()  # (after frame #, name)
+        self._ready = asyncio.Event()
+        self._room = asyncio.Event()
+        self._play_end = 0.0  # loop time at which the last sent frame finishes
+
+    def feed(self, ulaw: bytes):
+        """Queue μ-law audio; whole 20ms frames become eligible to send."""
+        self._pending += ulaw
+        n = len(self._pending) - len(self._pending) % FRAME_BYTES
+        for off in range(0, n, FRAME_BYTES):
+            self._frames.append(bytes(self._pending[off : off + FRAME_BYTES]))
+        del self._pending[:n]
+        if self._frames:
+            self._ready.set()
+
+    def mark(self, name: str):
+        """Queue a mark behind all audio fed so far (the partial tail is padded)."""
+        if self._pending:
+            self._pad_tail()
+        self._marks.append((self.frames_sent + len(self._frames), name))
+        self._ready.set()
+
+    def clear(self) -> int:
+        """Drop everything not yet sent, marks included. Returns frames dropped."""
+        dropped = len(self._frames) + (1 if self._pending else 0)
+        self._frames.clear()
+        self._pending.clear()
+        self._marks.clear()
+        self._play_end = 0.0
+        self._room.set()
+        return dropped
+
+    async def wait_for_room(self):
+        """Return once less than `max_queued_ms` of audio is waiting to be sent."""
+        while self.queued_ms >= self.max_queued_ms:
+            self._room.clear()
+            await self._room.wait()
+
+    @property
+    def queued_ms(self) -> float:
+        """Audio held here, not yet sent to Twilio."""
+        return (len(self._frames) * FRAME_BYTES + len(self._pending)) / 8.0
+
+    @property
+    def unplayed_ms(self) -> float:
+        """Audio not yet heard by the callee: queued here plus Twilio's lead."""
+        ahead = self._play_end - asyncio.get_running_loop().time()
+        return self.queued_ms + max(0.0, ahead) * 1000.0
+
+    def _pad_tail(self):
+        """Flush the last partial frame of an utterance, padded with silence."""
+        pad = FRAME_BYTES - len(self._pending)
+        self.feed(ULAW_SILENCE * pad)
+
+    async def run(
+        self,
+        send: Callable[[bytes], Awaitable[None]],
+        send_mark: Callable[[str], Awaitable[None]] | None = None,
+    ):
+        """Send frames forever, never more than `lead` ahead of playback."""
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._marks and self._marks[0][0] <= self.frames_sent:
+                name = self._marks.popleft()[1]
+                if send_mark:
+                    await send_mark(name)
+                continue
+            if not self._frames:
+                self._ready.clear()
+                if self._pending:
+                    # Tail of an utterance: give it one frame time to fill up
+                    try:
+                        await asyncio.wait_for(self._ready.wait(), timeout=FRAME_SEC)
+                    except asyncio.TimeoutError:
+                        self._pad_tail()
+                else:
+                    await self._ready.wait()
+                continue
+
+            ahead = self._play_end - loop.time()
+            if ahead >= self.lead:
+                await asyncio.sleep(ahead - self.lead)
+                continue  # re-check: clear() may have run while we slept
+
+            frame = self._frames.popleft()
+            self._room.set()
+            await send(frame)
+            self._play_end = max(self._play_end, loop.time()) + FRAME_SEC
+            self.frames_sent += 1
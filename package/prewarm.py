@@ -0,0 +1,121 @@
+"""
+Gemini Live sessions opened while the hospital's phone is still ringing.
+
+A Live session only needs the static config (system prompt, tool, VAD), so
+the websocket + setup handshake can happen as soon as a call is dialed.
+When Twilio's media stream connects, conversation_loop claims the warm
+session and sends the briefing immediately instead of waiting for connect.
+
+Each warm session is held open by a small task that owns the SDK's async
+context manager; it is closed when the call's owner releases it, when it
+is discarded (call terminated / batch finalized) or when its TTL expires
+without the call being answered (a deadline on the shared DeadlineScheduler).
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, Callable, Hashable
+
+from deadlines import Deadline, DeadlineScheduler
+
+logger = logging.getLogger("emergency-ai.prewarm")
+
+
+class _WarmSession:
+    __slots__ = ("ready", "release", "reaper")
+
+    def __init__(self):
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.release = asyncio.Event()
+        self.reaper: Deadline | None = None
+
+
+class LiveSessionPool:
+    """Pre-opened Live sessions keyed by (emergency_id, hospital_id)."""
+
+    def __init__(
+        self,
+        connect: Callable[[], AsyncContextManager],
+        deadlines: DeadlineScheduler,
+        ttl: float = 75.0,
+    ):
+        self._connect = connect
+        self._deadlines = deadlines
+        self.ttl = ttl
+        self._warm: dict[Hashable, _WarmSession] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def prewarm(self, key: Hashable):
+        """Start opening a session for `key` in the background (idempotent)."""
+        if key in self._warm:
+            return
+        warm = _WarmSession()
+        self._warm[key] = warm
+        warm.reaper = self._deadlines.call_later(self.ttl, self._reap, key, warm)
+        task = asyncio.create_task(self._hold(key, warm))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _hold(self, key: Hashable, warm: _WarmSession):
+        try:
+            async with self._connect() as session:
+                warm.ready.set_result(session)
+                await warm.release.wait()
+        except Exception as e:
+            logger.warning(f"[Prewarm] Session for {key} failed: {e}")
+            if not warm.ready.done():
+                warm.ready.set_result(None)
+        finally:
+            if self._warm.get(key) is warm:
+                del self._warm[key]
+
+    def _reap(self, key: Hashable, warm: _WarmSession):
+        if self._warm.get(key) is warm:
+            logger.info(f"[Prewarm] Reaping unanswered session {key}")
+            self._drop(key)
+
+    def _drop(self, key: Hashable):
+        warm = self._warm.pop(key, None)
+        if warm:
+            if warm.reaper:
+                warm.reaper.cancel()
+            warm.release.set()
+
+    def discard(self, key: Hashable):
+        """Close an unclaimed warm session (e.g. the call was hung up)."""
+        self._drop(key)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]):
+        """Close every unclaimed warm session whose key matches."""
+        for key in [k for k in self._warm if predicate(k)]:
+            self._drop(key)
+
+    @asynccontextmanager
+    async def open(self, key: Hashable):
+        """Yield the warm session for `key`, or a freshly connected one."""
+        warm = self._warm.pop(key, None)
+        session = None
+        if warm:
+            if warm.reaper:
+                warm.reaper.cancel()
+            try:
+                session = await asyncio.shield(warm.ready)
+            except BaseException:
+                warm.release.set()
+                raise
+        if session is None:
+            self.misses += 1
+            async with self._connect() as session:
+                yield session
+            return
+        self.hits += 1
+        try:
+            yield session
+        finally:
+            warm.release.set()
+
+    def __len__(self) -> int:
+        return len(self._warm)
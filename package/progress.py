@@ -0,0 +1,175 @@
+"""
+Live per-hospital progress events for the NestJS server.
+
+send_batch_result reports once, when a batch is finalized; until then medics
+see nothing. ProgressStream pushes each hospital's steps (ringing,
+in-progress, rejected, no_answer) as they happen, over one long-lived HTTP
+request per NestJS origin instead of one POST per event:
+  - a chunked POST of newline-delimited JSON, one event per line, shared by
+    every emergency going to that origin
+  - one FIFO per origin, so each emergency's events arrive in order; `seq`
+    increases across all events for a receiver that wants to drop stale ones
+  - a repeated status for the same hospital is sent once
+  - the request ends after `idle_close` seconds without events, and at the
+    latest after `max_age` (under Node's default 300s requestTimeout); the
+    next event opens a new one
+
+Progress is best-effort: while NestJS is unreachable up to `max_queued`
+events wait for the reconnect (oldest dropped first), and an event lost with
+a dropped connection is not re-sent. The final result still goes through
+CallbackOutbox.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger("emergency-ai.progress")
+
+
+class _Channel:
+    """One origin's event queue and the task that streams it."""
+
+    def __init__(self, stream: "ProgressStream", url: str):
+        self.stream = stream
+        self.url = url
+        self._queue: deque[bytes] = deque(maxlen=stream.max_queued)
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, line: bytes):
+        if len(self._queue) == self._queue.maxlen:
+            self.stream.dropped += 1
+        self._queue.append(line)
+        self._wake.set()
+
+    async def _body(self):
+        opened = time.monotonic()
+        while time.monotonic() - opened < self.stream.max_age:
+            while self._queue:
+                line = self._queue.popleft()
+                self.stream.sent += 1
+                yield line
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.stream.idle_close)
+            except asyncio.TimeoutError:
+                return
+
+    async def _run(self):
+        delay = self.stream.retry_delay
+        while True:
+            if not self._queue:
+                self._wake.clear()
+                await self._wake.wait()
+            try:
+                resp = await self.stream._http().post(
+                    self.url,
+                    content=self._body(),
+                    headers={"Content-Type": "application/x-ndjson"},
+                )
+                if resp.status_code < 400:
+                    delay = self.stream.retry_delay
+                    continue
+                error = f"HTTP {resp.status_code}"
+            except httpx.HTTPError as e:
+                error = repr(e)
+            except Exception as e:
+                # Not a network error; the stream must still recover from it
+                logger.exception(f"[Progress] Unexpected error streaming to {self.url}")
+                error = repr(e)
+            logger.warning(
+                f"[Progress] Stream to {self.url} failed: {error}; "
+                f"reconnecting in {delay:.0f}s"
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.stream.max_retry_delay)
+
+    def close(self):
+        self._task.cancel()
+
+
+class ProgressStream:
+    def __init__(
+        self,
+        path: str = "/emergency/events",
+        max_queued: int = 1000,
+        idle_close: float = 30.0,
+        max_age: float = 240.0,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 30.0,
+        timeout: float = 5.0,
+    ):
+        self.path = path
+        self.max_queued = max_queued
+        self.idle_close = idle_close
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.timeout = timeout
+        self.sent = 0
+        self.dropped = 0
+        self._client: httpx.AsyncClient | None = None
+        self._channels: dict[str, _Channel] = {}
+        self._seq = itertools.count(1)
+        # (emergency_id, hospital_id) -> last status published
+        self._last: dict[tuple, str] = {}
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    @property
+    def queued(self) -> int:
+        return sum(len(ch._queue) for ch in self._channels.values())
+
+    def publish(
+        self,
+        callback_url: str,
+        emergency_id: str,
+        patient_id: int,
+        hospital_id: int,
+        status: str,
+    ) -> bool:
+        """Queue one event for the NestJS server behind `callback_url`.
+
+        Returns False if that hospital's last event already had this status.
+        """
+        key = (emergency_id, hospital_id)
+        if self._last.get(key) == status:
+            return False
+        self._last[key] = status
+        origin = urlsplit(callback_url)
+        url = f"{origin.scheme}://{origin.netloc}{self.path}"
+        channel = self._channels.get(url)
+        if channel is None:
+            channel = self._channels[url] = _Channel(self, url)
+        event = {
+            "seq": next(self._seq),
+            "emergency_id": emergency_id,
+            "patientId": patient_id,
+            "hospitalId": hospital_id,
+            "status": status,
+        }
+        channel.put(json.dumps(event).encode() + b"\n")
+        return True
+
+    def forget(self, emergency_id: str):
+        """Drop the de-duplication state of a finalized batch."""
+        for key in [k for k in self._last if k[0] == emergency_id]:
+            del self._last[key]
+
+    async def close(self):
+        for channel in self._channels.values():
+            channel.close()
+        self._channels.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,325 @@
+"""
+Shared emergency/call state behind a small async interface.
+
+main.py used to keep `emergency_batches` and `active_calls` as module-level
+dicts, which pins the server to a single process: a /voice-twiml hit or a
+Twilio media websocket landing on another worker would find no batch.
+Every read and transition now goes through a StateStore:
+
+  MemoryStateStore  single process (the previous behaviour, still the default)
+  RedisStateStore   any Redis-protocol server, shared by all workers/nodes;
+                    requires the `redis` package
+
+Batches keep their original shape:
+  {"data": req_data, "results": {hospital_id: "calling" | {"status", "reason"}},
+   "is_finalized": bool}
+
+Decisions are compare-and-set so "first accept wins" holds across processes:
+a hospital's result is written at most once, and finalizing a batch (or
+accepting, which finalizes) succeeds for exactly one caller.
+"""
+
+import json
+from abc import ABC, abstractmethod
+
+PENDING = "calling"
+
+
+class StateStore(ABC):
+    """Interface shared by all backends; each one implements every method."""
+
+    @abstractmethod
+    async def create_batch(
+        self, emergency_id: str, data: dict, hospital_ids: list[int]
+    ):
+        ...
+
+    @abstractmethod
+    async def get_batch(self, emergency_id: str) -> dict | None:
+        """Snapshot of a batch (treat as read-only), or None if unknown."""
+
+    @abstractmethod
+    async def record_result(
+        self, emergency_id: str, hospital_id: int, result: dict
+    ) -> tuple[bool, bool]:
+        """Set the result of one of the batch's hospitals, if it has none yet
+        and the batch is open.
+
+        Returns (recorded, all_hospitals_responded).
+        """
+
+    @abstractmethod
+    async def accept(
+        self, emergency_id: str, hospital_id: int, result: dict
+    ) -> dict | None:
+        """Record an acceptance and finalize in one step. Only the first wins.
+
+        Returns the finalized batch for the winner, None for everyone else.
+        """
+
+    @abstractmethod
+    async def finalize(self, emergency_id: str) -> dict | None:
+        """Mark the batch finalized. Returns it to the one caller that did."""
+
+    @abstractmethod
+    async def register_call(
+        self, call_sid: str, emergency_id: str, hospital_id: int
+    ):
+        ...
+
+    @abstractmethod
+    async def calls_for(self, emergency_id: str) -> dict[str, dict]:
+        """{call_sid: {"hospital_id", "emergency_id"}} for one emergency."""
+
+    @abstractmethod
+    async def unregister_call(self, call_sid: str):
+        ...
+
+    async def close(self):
+        pass
+
+
+class _Batch:
+    __slots__ = ("data", "results", "pending", "finalized")
+
+    def __init__(self, data: dict, hospital_ids: list[int]):
+        self.data = data
+        # None until the hospital's result is recorded
+        self.results: dict[int, dict | None] = dict.fromkeys(hospital_ids)
+        self.pending = len(self.results)
+        self.finalized = False
+
+    def set_result(self, hospital_id: int, result: dict):
+        """`hospital_id` must be one of the batch's."""
+        if self.results[hospital_id] is None:
+            self.pending -= 1
+        self.results[hospital_id] = result
+
+    def snapshot(self) -> dict:
+        return {
+            "data": self.data,
+            "results": {
+                h_id: PENDING if res is None else res
+                for h_id, res in self.results.items()
+            },
+            "is_finalized": self.finalized,
+        }
+
+
+class _Call:
+    __slots__ = ("hospital_id", "emergency_id")
+
+    def __init__(self, hospital_id: int, emergency_id: str):
+        self.hospital_id = hospital_id
+        self.emergency_id = emergency_id
+
+
+class MemoryStateStore(StateStore):
+    """Process-local registry. Operations never await, so each one is atomic.
+
+    Completion is tracked with per-batch counters and calls are indexed by
+    emergency, so deciding and hanging up cost the same however many
+    emergencies are open.
+    """
+
+    def __init__(self):
+        self.batches: dict[str, _Batch] = {}
+        self.calls: dict[str, _Call] = {}
+        # emergency_id → call SIDs, secondary index over `calls`
+        self.calls_by_emergency: dict[str, set[str]] = {}
+
+    async def create_batch(self, emergency_id, data, hospital_ids):
+        self.batches[emergency_id] = _Batch(data, hospital_ids)
+
+    async def get_batch(self, emergency_id):
+        batch = self.batches.get(emergency_id)
+        return batch.snapshot() if batch else None
+
+    async def record_result(self, emergency_id, hospital_id, result):
+        batch = self.batches.get(emergency_id)
+        if not batch or batch.finalized:
+            return False, False
+        # Not one of the batch's hospitals, or already decided
+        if batch.results.get(hospital_id, False) is not None:
+            return False, False
+        batch.set_result(hospital_id, result)
+        return True, batch.pending == 0
+
+    async def accept(self, emergency_id, hospital_id, result):
+        batch = self.batches.get(emergency_id)
+        if not batch or batch.finalized or hospital_id not in batch.results:
+            return None
+        batch.set_result(hospital_id, result)
+        batch.finalized = True
+        return batch.snapshot()
+
+    async def finalize(self, emergency_id):
+        batch = self.batches.get(emergency_id)
+        if not batch or batch.finalized:
+            return None
+        batch.finalized = True
+        return batch.snapshot()
+
+    async def register_call(self, call_sid, emergency_id, hospital_id):
+        self.calls[call_sid] = _Call(hospital_id, emergency_id)
+        self.calls_by_emergency.setdefault(emergency_id, set()).add(call_sid)
+
+    async def calls_for(self, emergency_id):
+        return {
+            sid: {
+                "hospital_id": self.calls[sid].hospital_id,
+                "emergency_id": emergency_id,
+            }
+            for sid in self.calls_by_emergency.get(emergency_id, ())
+        }
+
+    async def unregister_call(self, call_sid):
+        call = self.calls.pop(call_sid, None)
+        if call is None:
+            return
+        sids = self.calls_by_emergency.get(call.emergency_id)
+        if sids is not None:
+            sids.discard(call_sid)
+            if not sids:
+                del self.calls_by_emergency[call.emergency_id]
+
+
+class RedisStateStore(StateStore):
+    """Redis-protocol backend built from single-command atomic operations.
+
+    Recording a result watches the finalize flag (WATCH/MULTI), so no result
+    lands after the batch was finalized.
+
+    Keys (all expire after `ttl` seconds):
+      {p}batch:{eid}            JSON {"data", "hospital_ids"}
+      {p}batch:{eid}:results    hash hospital_id → JSON result (HSETNX = CAS)
+      {p}batch:{eid}:final      finalize flag (SET NX = CAS)
+      {p}batch:{eid}:calls      set of call SIDs
+      {p}call:{sid}             JSON {"hospital_id", "emergency_id"}
+    """
+
+    def __init__(
+        self,
+        client=None,
+        url: str | None = None,
+        ttl: int = 86400,
+        prefix: str = "er:",
+    ):
+        if client is None:
+            import redis.asyncio as redis  # optional dependency
+
+            client = redis.from_url(url, decode_responses=True)
+        self.r = client
+        self.ttl = ttl
+        self.p = prefix
+
+    def _k(self, *parts) -> str:
+        return self.p + ":".join(str(p) for p in parts)
+
+    async def create_batch(self, emergency_id, data, hospital_ids):
+        await self.r.set(
+            self._k("batch", emergency_id),
+            json.dumps({"data": data, "hospital_ids": hospital_ids}),
+            ex=self.ttl,
+        )
+
+    async def get_batch(self, emergency_id):
+        raw = await self.r.get(self._k("batch", emergency_id))
+        if raw is None:
+            return None
+        meta = json.loads(raw)
+        decided = await self.r.hgetall(self._k("batch", emergency_id, "results"))
+        final = await self.r.exists(self._k("batch", emergency_id, "final"))
+        results = {}
+        for h_id in meta["hospital_ids"]:
+            raw_result = decided.get(str(h_id))
+            results[h_id] = json.loads(raw_result) if raw_result else PENDING
+        return {
+            "data": meta["data"],
+            "results": results,
+            "is_finalized": bool(final),
+        }
+
+    async def _hospital_ids(self, emergency_id, client=None) -> list[int] | None:
+        raw = await (client or self.r).get(self._k("batch", emergency_id))
+        return None if raw is None else json.loads(raw)["hospital_ids"]
+
+    async def record_result(self, emergency_id, hospital_id, result):
+        from redis.exceptions import WatchError
+
+        meta = self._k("batch", emergency_id)
+        final = self._k("batch", emergency_id, "final")
+        key = self._k("batch", emergency_id, "results")
+        async with self.r.pipeline() as pipe:
+            while True:
+                try:
+                    # A finalize between the check and the write aborts the write
+                    await pipe.watch(meta, final)
+                    hospital_ids = await self._hospital_ids(emergency_id, pipe)
+                    if hospital_id not in (hospital_ids or ()):
+                        return False, False
+                    if await pipe.exists(final):
+                        return False, False
+                    total = len(hospital_ids)
+                    pipe.multi()
+                    pipe.hsetnx(key, hospital_id, json.dumps(result))
+                    pipe.expire(key, self.ttl)
+                    pipe.hlen(key)
+                    recorded, _, decided = await pipe.execute()
+                    break
+                except WatchError:
+                    continue
+        return bool(recorded), bool(recorded) and decided >= total
+
+    async def accept(self, emergency_id, hospital_id, result):
+        if hospital_id not in (await self._hospital_ids(emergency_id) or ()):
+            return None
+        if not await self.r.set(
+            self._k("batch", emergency_id, "final"), hospital_id, nx=True, ex=self.ttl
+        ):
+            return None
+        key = self._k("batch", emergency_id, "results")
+        await self.r.hset(key, hospital_id, json.dumps(result))
+        await self.r.expire(key, self.ttl)
+        return await self.get_batch(emergency_id)
+
+    async def finalize(self, emergency_id):
+        if await self._hospital_ids(emergency_id) is None:
+            return None
+        if not await self.r.set(
+            self._k("batch", emergency_id, "final"), "1", nx=True, ex=self.ttl
+        ):
+            return None
+        return await self.get_batch(emergency_id)
+
+    async def register_call(self, call_sid, emergency_id, hospital_id):
+        info = {"hospital_id": hospital_id, "emergency_id": emergency_id}
+        await self.r.set(self._k("call", call_sid), json.dumps(info), ex=self.ttl)
+        calls = self._k("batch", emergency_id, "calls")
+        await self.r.sadd(calls, call_sid)
+        await self.r.expire(calls, self.ttl)
+
+    async def calls_for(self, emergency_id):
+        calls = {}
+        for sid in await self.r.smembers(self._k("batch", emergency_id, "calls")):
+            raw = await self.r.get(self._k("call", sid))
+            if raw is not None:
+                calls[sid] = json.loads(raw)
+        return calls
+
+    async def unregister_call(self, call_sid):
+        raw = await self.r.get(self._k("call", call_sid))
+        if raw is not None:
+            eid = json.loads(raw)["emergency_id"]
+            await self.r.srem(self._k("batch", eid, "calls"), call_sid)
+        await self.r.delete(self._k("call", call_sid))
+
+    async def close(self):
+        await self.r.aclose()
+
+
+def make_state_store(url: str) -> StateStore:
+    """memory:// (default) or redis://host:port/db"""
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateStore(url=url)
+    return MemoryStateStore()
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from audio import DownlinkConverter, UplinkConverter
+from mulaw import ulaw_decode, ulaw_encode
+
+
+def _tone(freq: float, rate: int, seconds: float, amplitude: float = 8000.0):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+
+
+def _peak_hz(samples: np.ndarray, rate: int) -> float:
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    return np.argmax(spectrum) * rate / len(samples)
+
+
+def test_uplink_doubles_rate_and_keeps_the_tone():
+    ulaw = ulaw_encode(_tone(1000, 8000, 1.0))
+    pcm = np.frombuffer(UplinkConverter().convert(ulaw), dtype=np.int16)
+    assert len(pcm) == 2 * len(ulaw)
+    assert _peak_hz(pcm[400:], 16000) == pytest.approx(1000, abs=2)
+
+
+def test_downlink_divides_rate_and_keeps_the_tone():
+    pcm = _tone(1000, 24000, 1.0).tobytes()
+    ulaw = DownlinkConverter().convert(pcm)
+    assert len(ulaw) == len(pcm) // 2 // 3
+    assert _peak_hz(ulaw_decode(ulaw)[200:].astype(float), 8000) == pytest.approx(
+        1000, abs=2
+    )
+
+
+def test_downlink_rejects_what_would_alias():
+    # 5kHz is above the 4kHz Nyquist limit of the 8kHz output
+    ulaw = DownlinkConverter().convert(_tone(5000, 24000, 1.0).tobytes())
+    out = ulaw_decode(ulaw)[200:].astype(float)
+    assert np.sqrt(np.mean(out**2)) < 8000 / np.sqrt(2) / 30  # > ~30dB down
+
+
+@pytest.mark.parametrize(
+    "make, chunk, whole",
+    [(UplinkConverter, 160, 8000), (DownlinkConverter, 960, 48000)],
+)
+def test_chunking_does_not_change_the_output(make, chunk, whole):
+    data = np.random.default_rng(0).integers(0, 256, whole, dtype=np.uint8).tobytes()
+    one_shot = make().convert(data)
+    streaming = make()
+    pieces = b"".join(
+        streaming.convert(data[off : off + chunk]) for off in range(0, whole, chunk)
+    )
+    assert pieces == one_shot
+
+
+def test_reset_forgets_filter_history():
+    chunk = _tone(440, 24000, 0.1).tobytes()
+    converter = DownlinkConverter()
+    first = converter.convert(chunk)
+    converter.convert(chunk)
+    converter.reset()
+    assert converter.convert(chunk) == first
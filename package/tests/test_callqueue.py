@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from callqueue import BLOCK, DROP_OLDEST, CallQueue
+
+END = object()
+
+
+def drain_all(q):
+    items = []
+    while not q.empty():
+        items.append(q.get_nowait())
+    return items
+
+
+def test_drop_oldest_evicts_audio_only():
+    async def main():
+        q = CallQueue(2, policy=DROP_OLDEST)
+        q.put_nowait(b"a")
+        q.put_nowait(END)
+        q.put_nowait(b"b")
+        q.put_nowait(b"c")  # full: drops b"a", never END
+        return drain_all(q), q.dropped
+
+    assert asyncio.run(main()) == ([END, b"b", b"c"], 1)
+
+
+def test_control_items_fit_a_full_queue():
+    async def main():
+        q = CallQueue(1, policy=BLOCK)
+        q.put_nowait(b"a")
+        with pytest.raises(asyncio.QueueFull):
+            q.put_nowait(b"b")
+        q.put_nowait(END)
+        return drain_all(q)
+
+    assert asyncio.run(main()) == [b"a", END]
+
+
+def test_block_waits_for_room():
+    async def main():
+        q = CallQueue(1, policy=BLOCK)
+        await q.put(b"a")
+        blocked = asyncio.create_task(q.put(b"b"))
+        await asyncio.sleep(0.01)
+        waited = not blocked.done()
+        assert await q.get() == b"a"
+        await asyncio.wait_for(blocked, 1)
+        return waited, drain_all(q)
+
+    assert asyncio.run(main()) == (True, [b"b"])
+
+
+def test_zero_maxsize_never_refuses_audio():
+    async def main():
+        q = CallQueue(0, policy=BLOCK)
+        for i in range(100):
+            q.put_nowait(bytes([i]))
+        await asyncio.wait_for(q.put(b"x"), 1)
+        return q.qsize(), q.dropped
+
+    assert asyncio.run(main()) == (101, 0)
+
+
+def test_drain_keeps_control_items_in_order():
+    async def main():
+        q = CallQueue(4, policy=BLOCK)
+        for item in (b"a", END, b"b"):
+            q.put_nowait(item)
+        stale = q.drain()
+        q.put_nowait(b"c")
+        return stale, drain_all(q)
+
+    assert asyncio.run(main()) == ([b"a", b"b"], [END, b"c"])
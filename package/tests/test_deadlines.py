@@ -0,0 +1,94 @@
+import asyncio
+import logging
+
+from deadlines import DeadlineScheduler
+
+
+def run(scenario):
+    async def main():
+        wheel = DeadlineScheduler(resolution=0.01, slots=8)
+        try:
+            return await scenario(wheel)
+        finally:
+            await wheel.close()
+
+    return asyncio.run(main())
+
+
+def test_fires_once_after_delay():
+    async def scenario(wheel):
+        fired = []
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        wheel.call_later(0.05, lambda: fired.append(loop.time() - start))
+        await asyncio.sleep(0.15)
+        return fired, len(wheel), wheel.fired
+
+    fired, pending, count = run(scenario)
+    assert len(fired) == 1
+    assert 0.05 <= fired[0] < 0.1
+    assert (pending, count) == (0, 1)
+
+
+def test_delay_longer_than_one_turn_of_the_wheel():
+    async def scenario(wheel):
+        fired = []
+        wheel.call_later(0.2, fired.append, "late")  # 20 ticks on 8 slots
+        await asyncio.sleep(0.1)
+        early = list(fired)
+        await asyncio.sleep(0.2)
+        return early, fired
+
+    early, fired = run(scenario)
+    assert early == []
+    assert fired == ["late"]
+
+
+def test_cancel_by_key_and_handle():
+    async def scenario(wheel):
+        fired = []
+        wheel.schedule("ring", 0.03, fired.append, "ring")
+        handle = wheel.call_later(0.03, fired.append, "handle")
+        wheel.cancel("ring")
+        handle.cancel()
+        handle.cancel()  # already cancelled: no-op
+        await asyncio.sleep(0.1)
+        return fired, len(wheel)
+
+    assert run(scenario) == ([], 0)
+
+
+def test_schedule_replaces_the_pending_deadline():
+    async def scenario(wheel):
+        fired = []
+        wheel.schedule("batch", 0.03, fired.append, "first")
+        wheel.schedule("batch", 0.06, fired.append, "second")
+        await asyncio.sleep(0.15)
+        return fired
+
+    assert run(scenario) == ["second"]
+
+
+def test_coroutine_callbacks_run_and_failures_are_logged(caplog):
+    async def scenario(wheel):
+        done = []
+
+        async def ok():
+            done.append("ok")
+
+        async def broken():
+            raise ValueError("boom")
+
+        wheel.call_later(0.02, ok)
+        wheel.call_later(0.02, broken)
+        wheel.call_later(0.02, lambda: 1 / 0)
+        await asyncio.sleep(0.1)
+        return done
+
+    with caplog.at_level(logging.ERROR, logger="emergency-ai.deadlines"):
+        assert run(scenario) == ["ok"]
+    messages = [
+        r.getMessage() for r in caplog.records if r.name == "emergency-ai.deadlines"
+    ]
+    assert any("broken" in m and "boom" in m for m in messages)
+    assert any("division by zero" in m for m in messages)
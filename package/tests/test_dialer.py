@@ -0,0 +1,119 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from dialer import DialCancelled, TokenBucket, TwilioDialer
+
+
+class RateLimited(Exception):
+    status = 429
+
+
+class FakeCalls:
+    """calls.create that records each number dialed, failing as told."""
+
+    def __init__(self, failures=()):
+        self.dialed = []
+        self.failures = list(failures)
+
+    def create(self, to, **kwargs):
+        self.dialed.append(to)
+        if to in self.failures:
+            self.failures.remove(to)
+            raise RateLimited() if to.startswith("+429") else RuntimeError(to)
+        return SimpleNamespace(sid=f"CA{len(self.dialed)}")
+
+
+def run(scenario, failures=(), calls_per_second=50.0):
+    calls = FakeCalls(failures)
+    client = SimpleNamespace(calls=calls)
+
+    async def main():
+        dialer = TwilioDialer(client, max_workers=2, calls_per_second=calls_per_second)
+        return await scenario(dialer)
+
+    return asyncio.run(main()), calls.dialed
+
+
+def test_token_bucket_spaces_takes_at_the_rate():
+    async def main():
+        bucket = TokenBucket(rate=20)
+        start = time.monotonic()
+        for _ in range(5):
+            await bucket.take()
+        return time.monotonic() - start
+
+    # The first token is there at once, the next four 50ms apart
+    assert 0.18 <= asyncio.run(main()) < 0.4
+
+
+def test_most_urgent_dial_goes_first():
+    async def scenario(dialer):
+        dials = [
+            dialer.dial((grade, n), to=f"+{grade}{n}")
+            for grade, n in ((3, 0), (1, 1), (2, 0), (1, 0))
+        ]
+        return await asyncio.gather(*dials)
+
+    sids, dialed = run(scenario)
+    assert dialed == ["+10", "+11", "+20", "+30"]
+    assert sorted(sids) == ["CA1", "CA2", "CA3", "CA4"]
+
+
+def test_rate_limited_dial_is_retried_in_its_place():
+    async def scenario(dialer):
+        return await asyncio.gather(
+            dialer.dial((1,), to="+429"), dialer.dial((2,), to="+2")
+        )
+
+    sids, dialed = run(scenario, failures=["+429"])
+    assert dialed == ["+429", "+429", "+2"]
+    assert sids == ["CA2", "CA3"]
+
+
+def test_other_errors_reach_the_caller():
+    async def scenario(dialer):
+        with pytest.raises(RuntimeError):
+            await dialer.dial(to="+1")
+        return dialer.queued
+
+    assert run(scenario, failures=["+1"]) == (0, ["+1"])
+
+
+def test_cancelled_dial_is_never_placed():
+    async def scenario(dialer):
+        async def decided():
+            return True
+
+        async def unsure():
+            raise ConnectionError("store down")
+
+        results = await asyncio.gather(
+            dialer.dial((1,), cancelled=decided, to="+1"),
+            dialer.dial((2,), cancelled=unsure, to="+2"),
+            return_exceptions=True,
+        )
+        return [type(r) if isinstance(r, Exception) else r for r in results]
+
+    # A failing check places the call rather than drop it
+    assert run(scenario) == ([DialCancelled, "CA1"], ["+2"])
+
+
+def test_cancelled_dial_takes_no_token():
+    async def scenario(dialer):
+        async def decided():
+            return True
+
+        await dialer.dial(to="+1")  # spends the first token
+        start = time.monotonic()
+        with pytest.raises(DialCancelled):
+            await dialer.dial(cancelled=decided, to="+2")
+        await dialer.dial(to="+3")
+        return time.monotonic() - start
+
+    # 200ms per call: +3 waits one interval, not two
+    elapsed, dialed = run(scenario, calls_per_second=5.0)
+    assert 0.15 <= elapsed < 0.35
+    assert dialed == ["+1", "+3"]
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+
+from journal import Journal
+
+DATA = {"patientId": 1}
+
+
+def records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+async def reopen(base, **kwargs):
+    journal = Journal(base, **kwargs)
+    batches = await journal.open()
+    await journal.close()
+    return batches
+
+
+def test_replay_rebuilds_open_batches(tmp_path):
+    base = str(tmp_path / "j.log")
+
+    async def main():
+        journal = Journal(base)
+        await journal.open()
+        journal.append(
+            "created", "e1", data=DATA, hospital_ids=[1, 2], created_at=100.0
+        )
+        journal.append("call", "e1", h=1, sid="CA1")
+        journal.append("result", "e1", h=2, result={"status": "rejected"})
+        journal.append("created", "e2", data=DATA, hospital_ids=[3])
+        journal.append("finalized", "e2")
+        await journal.close()
+        return await reopen(base)
+
+    assert asyncio.run(main()) == {
+        "e1": {
+            "data": DATA,
+            "hospital_ids": [1, 2],
+            "created_at": 100.0,
+            "results": {2: {"status": "rejected"}},
+            "calls": {"CA1": 1},
+        }
+    }
+
+
+def test_open_compacts_away_finalized_batches(tmp_path):
+    base = str(tmp_path / "j.log")
+
+    async def main():
+        journal = Journal(base)
+        await journal.open()
+        for n in range(10):
+            journal.append("created", f"e{n}", data=DATA, hospital_ids=[1])
+            if n:
+                journal.append("finalized", f"e{n}")
+        await journal.close()
+        await reopen(base)
+
+    asyncio.run(main())
+    assert [(r["t"], r["eid"]) for r in records(base + ".0")] == [("created", "e0")]
+
+
+def test_compacts_while_running(tmp_path):
+    base = str(tmp_path / "j.log")
+
+    async def main():
+        journal = Journal(base, flush_interval=0.01, compact_every=4)
+        await journal.open()
+        journal.append("created", "e1", data=DATA, hospital_ids=[1])
+        journal.append("finalized", "e1")
+        journal.append("created", "e2", data=DATA, hospital_ids=[1])
+        journal.append("call", "e2", h=1, sid="CA2")
+        await asyncio.sleep(0.1)
+        on_disk = records(base + ".0")
+        await journal.close()
+        return on_disk
+
+    assert [r["t"] for r in asyncio.run(main())] == ["created", "call"]
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    base = str(tmp_path / "j.log")
+    good = {"t": "created", "eid": "e1", "data": DATA, "hospital_ids": [1]}
+    with open(base + ".0", "w", encoding="utf-8") as f:
+        f.write(json.dumps(good) + "\n" + '{"t": "call", "eid": "e1", "h"')
+
+    batches = asyncio.run(reopen(base))
+    assert list(batches) == ["e1"]
+    assert batches["e1"]["calls"] == {}
+
+
+def test_failed_write_is_retried(tmp_path):
+    base = str(tmp_path / "j.log")
+
+    async def main():
+        journal = Journal(base, flush_interval=0.01, retry_delay=0.01)
+        await journal.open()
+        write, failures = journal._write, []
+
+        def flaky(lines):
+            if not failures:
+                failures.append(lines)
+                raise OSError("disk full")
+            write(lines)
+
+        journal._write = flaky
+        journal.append("created", "e1", data=DATA, hospital_ids=[1])
+        await asyncio.sleep(0.1)
+        await journal.close()
+        return failures, await reopen(base)
+
+    failures, batches = asyncio.run(main())
+    assert len(failures) == 1
+    assert list(batches) == ["e1"]
+
+
+def test_processes_get_their_own_slot_and_survivors_adopt(tmp_path):
+    base = str(tmp_path / "j.log")
+
+    async def main():
+        first, second = Journal(base), Journal(base)
+        await first.open()
+        await second.open()
+        slots = first._slot, second._slot
+        first.append("created", "e1", data=DATA, hospital_ids=[1])
+        second.append("created", "e2", data=DATA, hospital_ids=[2])
+        await first.close()
+        await second.close()
+        return slots, await reopen(base)
+
+    slots, batches = asyncio.run(main())
+    assert slots == (base + ".0", base + ".1")
+    assert sorted(batches) == ["e1", "e2"]
+    assert sorted(os.listdir(tmp_path)) == ["j.log.0", "j.log.0.lock"]
+
+
+def test_adopts_a_log_from_before_slots(tmp_path):
+    base = str(tmp_path / "j.log")
+    legacy = {"t": "created", "eid": "old", "data": DATA, "hospital_ids": [1]}
+    with open(base, "w", encoding="utf-8") as f:
+        f.write(json.dumps(legacy) + "\n")
+
+    assert list(asyncio.run(reopen(base))) == ["old"]
+    assert not os.path.exists(base)
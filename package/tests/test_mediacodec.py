@@ -0,0 +1,63 @@
+import base64
+import json
+
+from mediacodec import MediaEncoder, decode_inbound
+
+FRAME = bytes(range(160))
+
+
+def twilio_media(payload: bytes) -> str:
+    # Field order as Twilio sends it
+    return json.dumps(
+        {
+            "event": "media",
+            "sequenceNumber": "3",
+            "media": {
+                "track": "inbound",
+                "chunk": "1",
+                "timestamp": "5",
+                "payload": base64.b64encode(payload).decode(),
+            },
+            "streamSid": "MZ1",
+        },
+        separators=(",", ":"),
+    )
+
+
+def test_media_fast_path():
+    assert decode_inbound(twilio_media(FRAME)) == ("media", FRAME)
+
+
+def test_media_in_another_layout_falls_back_to_json():
+    message = json.dumps(
+        {"streamSid": "MZ1", "event": "media", "media": {"payload": "AAE="}}
+    )
+    assert decode_inbound(message) == ("media", b"\x00\x01")
+
+
+def test_other_events_are_parsed_in_full():
+    message = json.dumps({"event": "mark", "mark": {"name": "closing"}})
+    assert decode_inbound(message) == (
+        "mark",
+        {"event": "mark", "mark": {"name": "closing"}},
+    )
+
+
+def test_encoder_messages_are_valid_json():
+    encoder = MediaEncoder('MZ"1')
+    assert json.loads(encoder.media(FRAME)) == {
+        "event": "media",
+        "streamSid": 'MZ"1',
+        "media": {"payload": base64.b64encode(FRAME).decode()},
+    }
+    assert json.loads(encoder.mark("closing")) == {
+        "event": "mark",
+        "streamSid": 'MZ"1',
+        "mark": {"name": "closing"},
+    }
+    assert json.loads(encoder.clear()) == {"event": "clear", "streamSid": 'MZ"1'}
+
+
+def test_round_trip_through_the_fast_path():
+    encoded = MediaEncoder("MZ1").media(FRAME)
+    assert decode_inbound(encoded) == ("media", FRAME)
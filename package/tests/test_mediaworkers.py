@@ -0,0 +1,144 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from mediaworkers import DOWNLINK, UPLINK, InlineChannel, MediaWorkerPool, SharedRing
+
+
+def test_ring_records_wrap_around_the_end():
+    ring = SharedRing(256)
+    try:
+        got = []
+        # 16-byte header + 100 bytes pads to 128: the third record wraps
+        for i in range(6):
+            assert ring.put(UPLINK, i, i * 10, bytes([i]) * 100)
+            got += [(k, c, a, bytes(p)) for k, c, a, p in ring.drain()]
+        assert got == [(UPLINK, i, i * 10, bytes([i]) * 100) for i in range(6)]
+    finally:
+        ring.close()
+
+
+def test_ring_refuses_records_until_the_consumer_catches_up():
+    ring = SharedRing(256)
+    try:
+        assert ring.put(DOWNLINK, 1, 0, b"a" * 100)
+        assert ring.put(DOWNLINK, 2, 0, b"b" * 100)
+        assert not ring.put(DOWNLINK, 3, 0, b"c")  # 2 x 128 bytes: full
+        assert [bytes(p) for *_, p in ring.drain()] == [b"a" * 100, b"b" * 100]
+        assert ring.put(DOWNLINK, 3, 0, b"c")
+        assert [bytes(p) for *_, p in ring.drain()] == [b"c"]
+    finally:
+        ring.close()
+
+
+def test_ring_is_shared_between_handles():
+    ring = SharedRing(1024)
+    peer = SharedRing(1024, ring.name)
+    try:
+        ring.put(UPLINK, 7, 3, b"frame")
+        assert [(k, c, a, bytes(p)) for k, c, a, p in peer.drain()] == [
+            (UPLINK, 7, 3, b"frame")
+        ]
+        assert list(ring.drain()) == []  # the read index is shared too
+    finally:
+        peer.close()
+        ring.close()
+
+
+def test_ring_capacity_must_be_a_power_of_two():
+    with pytest.raises(ValueError):
+        SharedRing(1000)
+
+
+def test_worker_converts_like_the_event_loop():
+    ulaw = bytes(range(0, 256, 2)) + bytes(32)  # one 20ms frame
+    t = np.arange(960) / 24000.0  # one 40ms Gemini chunk
+    pcm = (8000 * np.sin(2 * np.pi * 440 * t)).astype("<i2").tobytes()
+
+    def record(log, tag):
+        return lambda *args: log.append((tag, bytes(args[0])) if args else tag)
+
+    inline = []
+    channel = InlineChannel(
+        record(inline, "up"), record(inline, "down"), record(inline, "mark")
+    )
+
+    async def main():
+        pool = MediaWorkerPool(1, ring_bytes=1 << 16)
+        await pool.start()
+        try:
+            got = []
+            done = asyncio.Event()
+            on_mark = record(got, "mark")
+            worker_channel = pool.channel(
+                record(got, "up"),
+                record(got, "down"),
+                lambda: (on_mark(), done.set()),
+            )
+            for ch in (channel, worker_channel):
+                ch.uplink(ulaw)
+                await ch.downlink(pcm)
+                ch.mark()
+            await asyncio.wait_for(done.wait(), 5)
+            worker_channel.close()
+            return got
+        finally:
+            await pool.close()
+
+    assert asyncio.run(main()) == inline
+    assert [entry if entry == "mark" else entry[0] for entry in inline] == [
+        "up",
+        "down",
+        "mark",
+    ]
+
+
+def test_audio_converted_before_a_reset_is_dropped():
+    t = np.arange(960) / 24000.0
+    pcm = (8000 * np.sin(2 * np.pi * 440 * t)).astype("<i2").tobytes()
+
+    async def main():
+        pool = MediaWorkerPool(1, ring_bytes=1 << 16)
+        await pool.start()
+        try:
+            got = []
+            done = asyncio.Event()
+            channel = pool.channel(
+                lambda *_: None,
+                lambda payload, _: got.append(len(payload)),
+                done.set,
+            )
+            await channel.downlink(pcm)
+            channel.reset_downlink()  # barge-in: the chunk above is stale
+            await channel.downlink(pcm)
+            channel.mark()
+            await asyncio.wait_for(done.wait(), 5)
+            return got
+        finally:
+            await pool.close()
+
+    assert asyncio.run(main()) == [320]
+
+
+def test_dead_worker_is_restarted():
+    async def main():
+        pool = MediaWorkerPool(1, ring_bytes=1 << 16, restart_delay=0.05)
+        await pool.start()
+        try:
+            worker = pool._workers[0]
+            worker.process.kill()
+            for _ in range(200):
+                await asyncio.sleep(0.05)
+                if pool.restarts and worker.running:
+                    await worker.ready.wait()
+                    break
+            done = asyncio.Event()
+            channel = pool.channel(lambda *_: done.set(), lambda *_: None, None)
+            channel.uplink(bytes(160))
+            await asyncio.wait_for(done.wait(), 5)
+            return pool.restarts, type(channel).__name__
+        finally:
+            await pool.close()
+
+    assert asyncio.run(main()) == (1, "WorkerChannel")
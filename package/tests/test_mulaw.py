@@ -0,0 +1,76 @@
+import struct
+
+import numpy as np
+import pytest
+
+from mulaw import DECODE_LUT, ENCODE_LUT, ulaw_decode, ulaw_encode
+
+
+def g711_encode(sample: int) -> int:
+    """Scalar G.711 μ-law encoder (Sun's g711.c linear2ulaw), the reference."""
+    pcm = sample >> 2
+    if pcm < 0:
+        pcm, mask = -pcm, 0x7F
+    else:
+        mask = 0xFF
+    pcm = min(pcm, 8159) + (0x84 >> 2)
+    seg_ends = (0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF)
+    for seg, end in enumerate(seg_ends):
+        if pcm <= end:
+            return ((seg << 4) | ((pcm >> (seg + 1)) & 0x0F)) ^ mask
+    return 0x7F ^ mask
+
+
+def g711_decode(code: int) -> int:
+    """Scalar G.711 μ-law decoder (g711.c ulaw2linear)."""
+    u = ~code & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    return 0x84 - t if u & 0x80 else t - 0x84
+
+
+@pytest.mark.parametrize(
+    "code, sample",
+    [(0xFF, 0), (0x7F, 0), (0x80, 32124), (0x00, -32124), (0xF0, 120)],
+)
+def test_decode_reference_vectors(code, sample):
+    assert DECODE_LUT[code] == sample
+
+
+@pytest.mark.parametrize(
+    "sample, code",
+    [
+        (0, 0xFF),
+        (-1, 0x7E),
+        (32767, 0x80),
+        (-32768, 0x00),
+        (1000, 0xCE),
+        (-1000, 0x4E),
+    ],
+)
+def test_encode_reference_vectors(sample, code):
+    assert ENCODE_LUT[np.uint16(np.int16(sample).view(np.uint16))] == code
+
+
+def test_tables_match_scalar_reference():
+    assert DECODE_LUT.tolist() == [g711_decode(c) for c in range(256)]
+    samples = np.arange(-32768, 32768)
+    expected = [g711_encode(int(s)) for s in samples]
+    assert ENCODE_LUT[samples.astype(np.int16).view(np.uint16)].tolist() == expected
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+def test_tables_match_audioop():
+    audioop = pytest.importorskip("audioop")  # removed in Python 3.13
+    codes = bytes(range(256))
+    assert ulaw_decode(codes).tobytes() == audioop.ulaw2lin(codes, 2)
+    pcm = struct.pack("<65536h", *range(-32768, 32768))
+    assert ENCODE_LUT[np.frombuffer(pcm, dtype=np.uint16)].tobytes() == (
+        audioop.lin2ulaw(pcm, 2)
+    )
+
+
+def test_decode_then_encode_is_identity_except_negative_zero():
+    codes = np.arange(256, dtype=np.uint8).tobytes()
+    again = ulaw_encode(ulaw_decode(codes))
+    # 0x7F decodes to 0, which encodes as the positive zero 0xFF
+    assert again == codes.replace(b"\x7f", b"\xff")
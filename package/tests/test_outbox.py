@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+import httpx
+
+from outbox import CallbackOutbox
+
+URL = "http://nest.local:3000/emergency/callback"
+
+
+class FakeClient:
+    """Answers each post with the next status (or raises it), then with 200."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.posts = []
+
+    async def post(self, url, json, headers):
+        self.posts.append((url, json, headers["Idempotency-Key"]))
+        outcome = self.outcomes.pop(0) if self.outcomes else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(status_code=outcome)
+
+    async def aclose(self):
+        pass
+
+
+def make_outbox(spool_dir, client, max_attempts=4):
+    outbox = CallbackOutbox(str(spool_dir), max_attempts=max_attempts, base_delay=0.01)
+    outbox._client = client
+    return outbox
+
+
+def spooled(spool_dir):
+    return sorted(
+        os.path.relpath(os.path.join(root, name), spool_dir)
+        for root, _, names in os.walk(spool_dir)
+        for name in names
+        if name.endswith(".json")
+    )
+
+
+def test_retries_until_delivered(tmp_path):
+    client = FakeClient(503, httpx.ConnectError("refused"), 429)
+
+    async def main():
+        outbox = make_outbox(tmp_path, client)
+        await outbox.replay()
+        delivered = await outbox.submit(URL, {"patientId": 5}, key="e1")
+        await outbox.close()
+        return delivered
+
+    assert asyncio.run(main()) is True
+    assert client.posts == [(URL, {"patientId": 5}, "e1")] * 4
+    assert spooled(tmp_path) == []
+
+
+def test_rejected_callback_is_not_retried(tmp_path):
+    client = FakeClient(400)
+
+    async def main():
+        outbox = make_outbox(tmp_path, client)
+        delivered = await outbox.submit(URL, {}, key="e1")
+        await outbox.close()
+        return delivered
+
+    assert asyncio.run(main()) is True
+    assert len(client.posts) == 1
+    assert spooled(tmp_path) == []
+
+
+def test_undelivered_callback_is_replayed_by_the_next_process(tmp_path):
+    async def first():
+        outbox = make_outbox(tmp_path, FakeClient(500, 500), max_attempts=2)
+        delivered = await outbox.submit(URL, {"patientId": 5}, key="e1")
+        await outbox.close()
+        return delivered
+
+    assert asyncio.run(first()) is False
+    assert spooled(tmp_path) == ["0/e1.json"]
+
+    client = FakeClient()
+
+    async def second():
+        outbox = make_outbox(tmp_path, client)
+        count = await outbox.replay()
+        await asyncio.gather(*outbox._tasks)
+        await outbox.close()
+        return count
+
+    assert asyncio.run(second()) == 1
+    assert client.posts == [(URL, {"patientId": 5}, "e1")]
+    assert spooled(tmp_path) == []
+
+
+def test_replay_leaves_a_live_process_its_entries(tmp_path):
+    async def main():
+        busy = make_outbox(tmp_path, FakeClient(*[500] * 100), max_attempts=100)
+        await busy.replay()
+        busy.submit(URL, {}, key="e1")
+        await asyncio.sleep(0.05)
+
+        # A worker starting meanwhile takes its own slot and leaves e1 alone
+        other = make_outbox(tmp_path, FakeClient())
+        count = await other.replay()
+        slots = spooled(tmp_path)
+        await other.close()
+
+        # Once the busy process is gone, its entries are adopted
+        await busy.close()
+        client = FakeClient()
+        heir = make_outbox(tmp_path, client)
+        adopted = await heir.replay()
+        await asyncio.gather(*heir._tasks)
+        await heir.close()
+        return count, slots, adopted, client.posts
+
+    count, slots, adopted, posts = asyncio.run(main())
+    assert (count, slots) == (0, ["0/e1.json"])
+    assert adopted == 1
+    assert [key for _, _, key in posts] == ["e1"]
+    assert spooled(tmp_path) == []
+
+
+def test_entries_spooled_before_slots_are_adopted(tmp_path):
+    entry = {"url": URL, "payload": {"patientId": 5}, "key": "e1"}
+    (tmp_path / "e1.json").write_text(json.dumps(entry))
+    client = FakeClient()
+
+    async def main():
+        outbox = make_outbox(tmp_path, client)
+        count = await outbox.replay()
+        await asyncio.gather(*outbox._tasks)
+        await outbox.close()
+        return count
+
+    assert asyncio.run(main()) == 1
+    assert client.posts == [(URL, {"patientId": 5}, "e1")]
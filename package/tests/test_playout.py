@@ -0,0 +1,90 @@
+import asyncio
+
+from playout import FRAME_BYTES, FramePacer
+
+
+def run(scenario, **options):
+    async def main():
+        pacer = FramePacer(**options)
+        sent = []
+
+        async def send(frame):
+            sent.append(frame)
+
+        async def send_mark(name):
+            sent.append(name)
+
+        task = asyncio.create_task(pacer.run(send, send_mark))
+        try:
+            return await scenario(pacer, sent)
+        finally:
+            task.cancel()
+
+    return asyncio.run(main())
+
+
+def frames(n: int, fill: int = 0x10) -> bytes:
+    return bytes([fill]) * (FRAME_BYTES * n)
+
+
+def test_sends_only_lead_ahead_of_playback():
+    async def scenario(pacer, sent):
+        pacer.feed(frames(20))
+        await asyncio.sleep(0.01)
+        burst = len(sent)
+        await asyncio.sleep(0.1)
+        return burst, len(sent), pacer.queued_ms
+
+    burst, later, queued_ms = run(scenario, lead_ms=60)
+    # Up to 60ms ahead of playback at once (the last frame takes it past),
+    # then one frame per 20ms
+    assert burst == 4
+    assert 8 <= later <= 11
+    assert queued_ms == (20 - later) * 20
+
+
+def test_partial_tail_is_padded_and_marks_follow_their_audio():
+    async def scenario(pacer, sent):
+        pacer.feed(frames(1) + b"\x20" * 40)
+        pacer.mark("goodbye")
+        pacer.feed(frames(1, fill=0x30))
+        await asyncio.sleep(0.1)
+        return sent
+
+    sent = run(scenario, lead_ms=100)
+    assert len(sent) == 4
+    assert sent[1] == b"\x20" * 40 + b"\xff" * (FRAME_BYTES - 40)
+    assert sent[2] == "goodbye"
+    assert sent[3] == frames(1, fill=0x30)
+
+
+def test_clear_drops_unsent_audio_and_marks():
+    async def scenario(pacer, sent):
+        pacer.feed(frames(10))
+        pacer.mark("goodbye")
+        await asyncio.sleep(0.01)
+        unplayed = pacer.unplayed_ms
+        dropped = pacer.clear()
+        await asyncio.sleep(0.05)
+        return unplayed, dropped, len(sent), pacer.queued_ms, pacer.unplayed_ms
+
+    unplayed, dropped, count, queued_ms, after = run(scenario, lead_ms=40)
+    assert count == 3 and dropped == 7
+    assert 180 <= unplayed <= 200  # 140ms queued plus ~50ms sent ahead
+    assert (queued_ms, after) == (0, 0)
+
+
+def test_wait_for_room_holds_the_feeder_until_frames_go_out():
+    async def scenario(pacer, sent):
+        pacer.feed(frames(5))
+        waiter = asyncio.create_task(pacer.wait_for_room())
+        await asyncio.sleep(0.005)
+        held = not waiter.done()
+        await asyncio.wait_for(waiter, 1)
+        pacer.feed(frames(5))
+        cleared = asyncio.create_task(pacer.wait_for_room())
+        pacer.clear()
+        await asyncio.wait_for(cleared, 1)
+        return held
+
+    assert run(scenario, lead_ms=0, max_queued_ms=60) is True
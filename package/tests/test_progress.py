@@ -0,0 +1,123 @@
+import asyncio
+import json
+import logging
+from types import SimpleNamespace
+
+import httpx
+
+from progress import ProgressStream
+
+CALLBACK = "http://nest.local:3000/emergency/callback"
+
+
+class FakeClient:
+    """Fails the first posts as told, then streams each body to `received`."""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.posts = []
+        self.received = []
+
+    async def post(self, url, content, headers):
+        self.posts.append(url)
+        if self.failures:
+            raise self.failures.pop(0)
+        async for line in content:
+            self.received.append(json.loads(line))
+        return SimpleNamespace(status_code=200)
+
+    async def aclose(self):
+        pass
+
+
+def run(scenario, failures=(), **options):
+    client = FakeClient(failures)
+
+    async def main():
+        stream = ProgressStream(
+            idle_close=0.05, retry_delay=0.02, max_retry_delay=0.05, **options
+        )
+        stream._client = client
+        try:
+            return await scenario(stream)
+        finally:
+            await stream.close()
+
+    result = asyncio.run(main())
+    return result, client
+
+
+def statuses(client):
+    return [(e["hospitalId"], e["status"]) for e in client.received]
+
+
+def test_events_stream_in_order_to_the_origin():
+    async def scenario(stream):
+        stream.publish(CALLBACK, "e1", 7, 1, "ringing")
+        stream.publish(CALLBACK, "e1", 7, 2, "ringing")
+        stream.publish(CALLBACK, "e1", 7, 1, "in-progress")
+        await asyncio.sleep(0.1)
+
+    _, client = run(scenario)
+    assert client.posts == ["http://nest.local:3000/emergency/events"]
+    assert statuses(client) == [(1, "ringing"), (2, "ringing"), (1, "in-progress")]
+    assert [e["seq"] for e in client.received] == [1, 2, 3]
+
+
+def test_repeated_status_is_sent_once():
+    async def scenario(stream):
+        first = stream.publish(CALLBACK, "e1", 7, 1, "ringing")
+        again = stream.publish(CALLBACK, "e1", 7, 1, "ringing")
+        stream.forget("e1")
+        after_forget = stream.publish(CALLBACK, "e1", 7, 1, "ringing")
+        await asyncio.sleep(0.1)
+        return first, again, after_forget
+
+    (first, again, after_forget), client = run(scenario)
+    assert (first, again, after_forget) == (True, False, True)
+    assert statuses(client) == [(1, "ringing"), (1, "ringing")]
+
+
+def test_events_wait_for_the_reconnect():
+    async def scenario(stream):
+        stream.publish(CALLBACK, "e1", 7, 1, "ringing")
+        stream.publish(CALLBACK, "e1", 7, 2, "ringing")
+        await asyncio.sleep(0.01)
+        queued = stream.queued
+        await asyncio.sleep(0.2)
+        return queued, stream.queued
+
+    failures = [httpx.ConnectError("refused"), httpx.ConnectError("refused")]
+    queued, client = run(scenario, failures=failures)
+    assert queued == (2, 0)
+    assert len(client.posts) == 3
+    assert statuses(client) == [(1, "ringing"), (2, "ringing")]
+
+
+def test_oldest_events_are_dropped_while_unreachable():
+    async def scenario(stream):
+        for h_id in range(1, 5):
+            stream.publish(CALLBACK, "e1", 7, h_id, "ringing")
+        dropped = stream.dropped
+        await asyncio.sleep(0.2)
+        return dropped
+
+    failures = [httpx.ConnectError("refused")]
+    dropped, client = run(scenario, failures=failures, max_queued=2)
+    assert dropped == 2
+    assert statuses(client) == [(3, "ringing"), (4, "ringing")]
+
+
+def test_unexpected_error_is_logged_and_retried(caplog):
+    async def scenario(stream):
+        stream.publish(CALLBACK, "e1", 7, 1, "ringing")
+        await asyncio.sleep(0.15)
+
+    with caplog.at_level(logging.ERROR, logger="emergency-ai.progress"):
+        _, client = run(scenario, failures=[ValueError("bad body")])
+    assert statuses(client) == [(1, "ringing")]
+    assert any(
+        "Unexpected error" in r.getMessage()
+        for r in caplog.records
+        if r.name == "emergency-ai.progress"
+    )
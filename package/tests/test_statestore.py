@@ -0,0 +1,182 @@
+import asyncio
+
+import pytest
+
+from statestore import (
+    PENDING,
+    MemoryStateStore,
+    RedisStateStore,
+    StateStore,
+)
+
+ACCEPTED = {"status": "accepted", "reason": ""}
+REJECTED = {"status": "rejected", "reason": "no beds"}
+
+
+def _redis_store():
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisStateStore(client=fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+@pytest.fixture(params=["memory", "redis"])
+def make_store(request):
+    """Runs each test against a fresh store of both backends."""
+
+    def make():
+        if request.param == "memory":
+            return MemoryStateStore()
+        return _redis_store()
+
+    return make
+
+
+def run(make_store, scenario):
+    async def main():
+        store = make_store()
+        await store.create_batch("e1", {"patientId": 1}, [1, 2, 3])
+        try:
+            return await scenario(store)
+        finally:
+            await store.close()
+
+    return asyncio.run(main())
+
+
+def test_duplicate_result_is_not_recorded(make_store):
+    async def scenario(store):
+        first = await store.record_result("e1", 1, REJECTED)
+        second = await store.record_result("e1", 1, {"status": "no_answer"})
+        return first, second, await store.get_batch("e1")
+
+    first, second, batch = run(make_store, scenario)
+    assert first == (True, False)
+    assert second == (False, False)
+    assert batch["results"] == {1: REJECTED, 2: PENDING, 3: PENDING}
+
+
+def test_last_result_reports_all_responded(make_store):
+    async def scenario(store):
+        return await asyncio.gather(
+            *(store.record_result("e1", h, REJECTED) for h in (1, 2, 3))
+        )
+
+    results = run(make_store, scenario)
+    assert all(recorded for recorded, _ in results)
+    assert [done for _, done in results].count(True) == 1
+
+
+def test_concurrent_accepts_have_one_winner(make_store):
+    async def scenario(store):
+        won = await asyncio.gather(
+            *(store.accept("e1", h, ACCEPTED) for h in (1, 2, 3))
+        )
+        return won, await store.get_batch("e1")
+
+    won, batch = run(make_store, scenario)
+    winners = [w for w in won if w is not None]
+    assert len(winners) == 1
+    assert winners[0]["is_finalized"]
+    assert batch["is_finalized"]
+    assert [r for r in batch["results"].values() if r == ACCEPTED] == [ACCEPTED]
+
+
+def test_finalize_succeeds_once(make_store):
+    async def scenario(store):
+        return await asyncio.gather(store.finalize("e1"), store.finalize("e1"))
+
+    first, second = run(make_store, scenario)
+    assert (first is None) != (second is None)
+
+
+def test_no_decision_after_finalize(make_store):
+    async def scenario(store):
+        await store.record_result("e1", 1, REJECTED)
+        await store.finalize("e1")
+        late = await store.record_result("e1", 2, REJECTED)
+        accepted = await store.accept("e1", 3, ACCEPTED)
+        return late, accepted, await store.get_batch("e1")
+
+    late, accepted, batch = run(make_store, scenario)
+    assert late == (False, False)
+    assert accepted is None
+    assert batch["results"] == {1: REJECTED, 2: PENDING, 3: PENDING}
+
+
+def test_unknown_batch(make_store):
+    async def scenario(store):
+        return (
+            await store.record_result("nope", 1, REJECTED),
+            await store.accept("nope", 1, ACCEPTED),
+            await store.finalize("nope"),
+            await store.get_batch("nope"),
+        )
+
+    assert run(make_store, scenario) == ((False, False), None, None, None)
+
+
+def test_calls_are_indexed_by_emergency(make_store):
+    async def scenario(store):
+        await store.register_call("CA1", "e1", 1)
+        await store.register_call("CA2", "e1", 2)
+        await store.register_call("CA3", "e2", 1)
+        await store.unregister_call("CA1")
+        return await store.calls_for("e1")
+
+    assert run(make_store, scenario) == {
+        "CA2": {"hospital_id": 2, "emergency_id": "e1"}
+    }
+
+
+def test_redis_result_racing_finalize_is_dropped():
+    store = _redis_store()
+    pipeline = store.r.pipeline
+
+    def racing_pipeline():
+        # Another process finalizes right after the flag was checked
+        pipe = pipeline()
+        exists = pipe.exists
+
+        async def checked(key):
+            found = await exists(key)
+            pipe.exists = exists
+            await store.r.set(key, "1")
+            return found
+
+        pipe.exists = checked
+        return pipe
+
+    async def main():
+        await store.create_batch("e1", {"patientId": 1}, [1, 2])
+        store.r.pipeline = racing_pipeline
+        recorded = await store.record_result("e1", 1, REJECTED)
+        store.r.pipeline = pipeline
+        return recorded, await store.get_batch("e1")
+
+    recorded, batch = asyncio.run(main())
+    assert recorded == (False, False)
+    assert batch["results"] == {1: PENDING, 2: PENDING}
+
+
+def test_result_for_a_hospital_outside_the_batch_is_refused(make_store):
+    async def scenario(store):
+        stray = await store.record_result("e1", 99, REJECTED)
+        stray_accept = await store.accept("e1", 98, ACCEPTED)
+        decided = [await store.record_result("e1", h, REJECTED) for h in (1, 2)]
+        return stray, stray_accept, decided, await store.get_batch("e1")
+
+    stray, stray_accept, decided, batch = run(make_store, scenario)
+    assert stray == (False, False)
+    assert stray_accept is None
+    assert decided == [(True, False), (True, False)]
+    # Hospital 3 is still ringing: the stray result must not complete the batch
+    assert batch["results"][3] == PENDING
+    assert not batch["is_finalized"]
+
+
+def test_incomplete_backend_cannot_be_created():
+    class Partial(StateStore):
+        async def get_batch(self, emergency_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,70 @@
+import numpy as np
+
+from mulaw import ulaw_encode
+from vad import VoiceActivityDetector
+
+N = 160  # 20ms at 8kHz
+
+
+def tone(dbfs: float, hz: float = 300.0) -> bytes:
+    t = np.arange(N) / 8000.0
+    amp = 32768.0 * 10 ** (dbfs / 20) * np.sqrt(2)
+    return ulaw_encode((amp * np.sin(2 * np.pi * hz * t)).astype(np.int16))
+
+
+def noise(dbfs: float, seed: int = 0) -> bytes:
+    x = np.random.default_rng(seed).standard_normal(N) * 32768.0 * 10 ** (dbfs / 20)
+    return ulaw_encode(x.astype(np.int16))
+
+
+SILENCE = ulaw_encode(np.zeros(N, dtype=np.int16))
+SPEECH = tone(-20)
+
+
+def test_classifies_frames():
+    vad = VoiceActivityDetector(threshold_dbfs=-40)
+    assert vad.is_speech(SPEECH)
+    assert not vad.is_speech(SILENCE)
+    assert not vad.is_speech(tone(-50))  # below the threshold
+    assert not vad.is_speech(noise(-35))  # hiss: too many zero crossings
+    assert vad.is_speech(noise(-20))  # loud enough to pass whatever the rate
+    assert not vad.is_speech(b"")
+
+
+def test_silence_is_held_back_until_speech_with_its_preroll():
+    vad = VoiceActivityDetector(preroll_ms=40)
+    quiet = [tone(-50, hz) for hz in (200, 250, 300)]
+    assert [vad.push(f) for f in quiet] == [([], False)] * 3
+    frames, ended = vad.push(SPEECH)
+    assert frames == [quiet[1], quiet[2], SPEECH]  # the last 40ms before the onset
+    assert not ended
+    assert vad.active and vad.speech_started_at is not None
+    assert (vad.frames_in, vad.frames_passed) == (4, 3)
+
+
+def test_hangover_bridges_pauses_then_ends_the_stretch():
+    vad = VoiceActivityDetector(hangover_ms=60)
+    vad.push(SPEECH)
+    # A 60ms pause passes through, and speech resumes in the same stretch
+    assert [vad.push(SILENCE) for _ in range(3)] == [([SILENCE], False)] * 3
+    assert vad.speech_ended_at is not None
+    assert vad.push(SPEECH) == ([SPEECH], False)
+    assert [vad.push(SILENCE) for _ in range(3)] == [([SILENCE], False)] * 3
+    # The hangover is over: one end-of-stretch, then silence is held back
+    assert vad.push(SILENCE) == ([], True)
+    assert vad.push(SILENCE) == ([], False)
+    assert not vad.active
+
+
+def test_ungated_forwards_everything_and_never_ends():
+    vad = VoiceActivityDetector(hangover_ms=20, gate=False)
+    pushed = [vad.push(f) for f in (SILENCE, SPEECH, SILENCE, SILENCE, SILENCE)]
+    assert [frames for frames, _ in pushed] == [
+        [SILENCE],
+        [SPEECH],
+        [SILENCE],
+        [SILENCE],
+        [SILENCE],
+    ]
+    assert not any(ended for _, ended in pushed)
+    assert vad.speech_ended_at is not None
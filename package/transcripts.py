@@ -0,0 +1,160 @@
+"""
+Call transcripts for QA, written off the event loop.
+
+Gemini streams what the hospital said (input transcription) and what the AI
+said (output transcription) in fragments. CallTranscript joins each side's
+fragments into one line per turn; TranscriptSink collects the lines of every
+call and writes them as JSON lines:
+  {"ts", "eid", "h", "call_sid", "role": "hospital" | "ai" | "decision", "text"}
+with "placeholder": true on a line whose text stands in for speech that was
+not transcribed.
+
+append() only buffers the line. A writer task hands whole batches to a
+thread every `flush_interval`, so a slow disk delays transcripts but never
+the audio. The file is rotated like logging's RotatingFileHandler: past
+`max_bytes` it becomes path.1 (path.1 → path.2, ...), keeping `backups`
+old files. If the writer falls behind by more than `max_buffered` lines,
+the oldest are dropped and counted.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("emergency-ai.transcripts")
+
+
+class TranscriptSink:
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 50 << 20,
+        backups: int = 10,
+        flush_interval: float = 1.0,
+        max_buffered: int = 10000,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.dropped = 0
+        self._buffer: deque[str] = deque(maxlen=max_buffered)
+        self._wake = asyncio.Event()
+        self._file = None
+        # One write at a time: a flush cancelled by close() still runs to the end
+        self._lock = threading.Lock()
+        self._writer: asyncio.Task | None = None
+
+    # --- Disk (writer thread only) ---
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self._file.close()
+        for n in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{n}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{n + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _write(self, lines: list[str]):
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.writelines(lines)
+            self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def _close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # --- Public API ---
+    def start(self):
+        self._writer = asyncio.create_task(self._run())
+
+    def append(self, record: dict):
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1  # the append pushes out the oldest line
+        self._buffer.append(json.dumps(record, ensure_ascii=False) + "\n")
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._wake.clear()
+            await self._flush()
+
+    async def _flush(self):
+        lines = list(self._buffer)
+        self._buffer.clear()
+        if not lines:
+            return
+        try:
+            await asyncio.to_thread(self._write, lines)
+        except OSError as e:
+            self.dropped += len(lines)
+            logger.error(f"[Transcript] Write failed, {len(lines)} lines lost: {e}")
+
+    async def close(self):
+        """Write what is buffered and close the file."""
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        await self._flush()
+        await asyncio.to_thread(self._close)
+
+
+class CallTranscript:
+    """One call's transcript, one line per speaker turn."""
+
+    def __init__(
+        self,
+        sink: TranscriptSink,
+        emergency_id: str,
+        hospital_id: int,
+        call_sid: str | None,
+    ):
+        self.sink = sink
+        self._ids = {"eid": emergency_id, "h": hospital_id, "call_sid": call_sid}
+        self._heard: list[str] = []
+        self._said: list[str] = []
+
+    def heard(self, text: str | None):
+        if text:
+            self._heard.append(text)
+
+    def said(self, text: str | None):
+        if text:
+            self._said.append(text)
+
+    def note(self, role: str, text: str, placeholder: bool = False):
+        self.end_turn()
+        self._line(role, text, placeholder)
+
+    def end_turn(self):
+        """The hospital spoke first in every turn, then the AI answered."""
+        for role, parts in (("hospital", self._heard), ("ai", self._said)):
+            if text := "".join(parts).strip():
+                self._line(role, text)
+            parts.clear()
+
+    def _line(self, role: str, text: str, placeholder: bool = False):
+        record = {"ts": time.time(), **self._ids, "role": role, "text": text}
+        if placeholder:
+            record["placeholder"] = True
+        self.sink.append(record)
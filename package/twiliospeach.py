@@ -1,13 +1,15 @@
 import asyncio
 import os
 import uuid
-import traceback
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Form, Response
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from twilio.rest import Client
 from twilio.twiml.voice_response import VoiceResponse
-import httpx
+
+from deadlines import DeadlineScheduler
+from outbox import CallbackOutbox
 
 load_dotenv()
 
@@ -18,7 +20,19 @@ TWILIO_NUMBER = os.getenv("TWILIO_NUMBER")
 BASE_URL = os.getenv("BASE_URL")
 
 twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-app = FastAPI()
+# 결과 콜백은 공용 outbox로 전송 (keep-alive, 재시도, 디스크 스풀)
+outbox = CallbackOutbox(os.getenv("CALLBACK_SPOOL_DIR", "callback_spool"))
+# 배치 타임아웃은 배치마다 sleep 태스크를 두지 않고 공용 타이머 휠로 관리
+deadlines = DeadlineScheduler()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await outbox.replay()
+    yield
+    await deadlines.close()
+    await outbox.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # --- 데이터 관리 구조 ---
 # emergency_batches: { emergency_id: { "data": req_data, "results": { hospital_id: status }, "is_finalized": bool } }
@@ -50,12 +64,10 @@ async def send_single_result(emergency_id: str, hospital_id: int, status: str):
         "patientId": batch["data"]["patientId"],
         "results": [{"hospitalId": hospital_id, "status": status}]
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            await client.post(batch["data"]["callback_url"], json=payload, timeout=5.0)
-            print(f"📡 [개별 보고] 병원 {hospital_id}: {status}")
-        except Exception as e:
-            print(f"❌ [보고 실패] {e}")
+    outbox.submit(
+        batch["data"]["callback_url"], payload, key=f"{emergency_id}:{hospital_id}:{status}"
+    )
+    print(f"📡 [개별 보고] 병원 {hospital_id}: {status}")
 
 
 async def send_batch_result(emergency_id: str):
@@ -64,6 +76,7 @@ async def send_batch_result(emergency_id: str):
         return
 
     batch["is_finalized"] = True
+    deadlines.cancel(emergency_id)
     payload = {
         "emergency_id": emergency_id,
         "patientId": batch["data"]["patientId"],
@@ -73,17 +86,11 @@ async def send_batch_result(emergency_id: str):
         ]
     }
     
-    async with httpx.AsyncClient() as client:
-        try:
-            await client.post(batch["data"]["callback_url"], json=payload, timeout=5.0)
-            print(f"📡 [최종 보고 완료] ID: {emergency_id}")
-        except Exception as e:
-            print(f"❌ [보고 실패] {e}")
+    outbox.submit(batch["data"]["callback_url"], payload, key=emergency_id)
+    print(f"📡 [최종 보고] ID: {emergency_id}")
 
-async def auto_finalize_batch(emergency_id: str, timeout_seconds: int = 90):
+async def auto_finalize_batch(emergency_id: str):
     """안전장치: 타임아웃 후에도 calling 상태인 병원을 no_answer 처리 후 최종 보고"""
-    await asyncio.sleep(timeout_seconds)
-
     batch = emergency_batches.get(emergency_id)
     if not batch or batch["is_finalized"]:
         return
@@ -127,7 +134,7 @@ async def start_broadcast(req: EmergencyRequest):
             emergency_batches[emergency_id]["results"][hospital.hospitalId] = "failed"
             print(f"❌ ID {hospital.hospitalId} 발신 실패: {e}")
 
-    asyncio.create_task(auto_finalize_batch(emergency_id))
+    deadlines.schedule(emergency_id, 90, auto_finalize_batch, emergency_id)
     return {"status": "processing", "emergency_id": emergency_id}
 
 # --- 3. [TwiML] 전화 응답 ---
@@ -0,0 +1,45 @@
+"""
+Uplink (hospital → Gemini) audio batching.
+
+Twilio delivers a 20ms frame every 20ms. Sending each one as its own
+send_realtime_input message costs ~50 websocket messages per second per call,
+so UplinkCoalescer groups the 16kHz PCM into larger blocks. A block is
+released when it reaches `block_ms`, or by the caller after `flush_after_ms`
+without new frames or when the voice-activity gate (vad.py) ends a spoken
+stretch, so end-of-speech reaches Gemini without waiting for a full block.
+"""
+
+BYTES_PER_MS = 32  # PCM 16-bit mono @ 16kHz
+
+
+class UplinkCoalescer:
+    """Per-call accumulator for uplink PCM blocks."""
+
+    def __init__(self, block_ms: int = 60, flush_after_ms: int = 30):
+        self.block_ms = block_ms
+        self.flush_after = flush_after_ms / 1000.0
+        self._block_bytes = block_ms * BYTES_PER_MS
+        self._buf = bytearray()
+        self.blocks_sent = 0
+        self.frames_in = 0
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._buf)
+
+    def push(self, pcm_16k: bytes) -> bytes | None:
+        """Add one frame. Returns a block to send now, or None to keep batching."""
+        self.frames_in += 1
+        self._buf += pcm_16k
+        if len(self._buf) >= self._block_bytes:
+            return self.flush()
+        return None
+
+    def flush(self) -> bytes | None:
+        """Release whatever is buffered (timeout or end of speech)."""
+        if not self._buf:
+            return None
+        block = bytes(self._buf)
+        self._buf.clear()
+        self.blocks_sent += 1
+        return block
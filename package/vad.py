@@ -0,0 +1,105 @@
+"""
+Voice-activity gate for the hospital's uplink audio.
+
+Most of a call's uplink is not speech: silence while the briefing plays,
+pauses while staff check for a bed, line noise. Forwarding it costs a
+resampler pass and a websocket message per frame plus Gemini input tokens,
+and the model's own VAD has to sit through it to find the end of a turn.
+VoiceActivityDetector classifies each 20ms μ-law frame on its decoded 8kHz
+samples:
+  speech    energy ≥ threshold with a voice-like zero-crossing rate, or
+            energy ≥ threshold + LOUD_DB whatever the rate
+  hangover  frames within `hangover_ms` of the last speech frame still pass,
+            so gaps between words and trailing consonants are not cut
+A short pre-roll of the frames before an onset is released with it, and
+when the hangover runs out the caller sends one end-of-stream marker instead
+of the silence that follows.
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+
+from mulaw import DECODE_LUT_F32
+
+FRAME_MS = 20
+LOUD_DB = 12.0
+
+
+class VoiceActivityDetector:
+    """Per-call speech/silence gate over 20ms μ-law frames."""
+
+    def __init__(
+        self,
+        threshold_dbfs: float = -40.0,
+        max_zcr: float = 0.3,
+        hangover_ms: int = 400,
+        preroll_ms: int = 60,
+        gate: bool = True,
+    ):
+        # Mean-square thresholds, in int16 units
+        self._min_ms = (32768.0 * 10 ** (threshold_dbfs / 20)) ** 2
+        self._loud_ms = self._min_ms * 10 ** (LOUD_DB / 10)
+        self.max_zcr = max_zcr
+        self.gate = gate
+        self._hangover = hangover_ms // FRAME_MS
+        self._preroll: deque[bytes] = deque(maxlen=preroll_ms // FRAME_MS)
+        self._quiet = 0
+        self.active = False
+        # time.monotonic() of the last onset and speech→silence transition,
+        # for latency metrics
+        self.speech_started_at: float | None = None
+        self.speech_ended_at: float | None = None
+        self.frames_in = 0
+        self.frames_passed = 0
+
+    def is_speech(self, ulaw: bytes) -> bool:
+        x = DECODE_LUT_F32[np.frombuffer(ulaw, dtype=np.uint8)]
+        if not len(x):
+            return False
+        energy = np.dot(x, x) / len(x)
+        if energy < self._min_ms:
+            return False
+        if energy >= self._loud_ms:
+            return True
+        sign = np.signbit(x)
+        zcr = np.count_nonzero(sign[1:] != sign[:-1]) / len(x)
+        return zcr <= self.max_zcr
+
+    def push(self, ulaw: bytes) -> tuple[list[bytes], bool]:
+        """Classify one frame.
+
+        Returns the frames to forward now (pre-roll included) and whether a
+        spoken stretch just ended. With gate=False every frame is forwarded
+        and no stretch ever ends; only the onset/end timestamps are tracked.
+        """
+        self.frames_in += 1
+        if self.is_speech(ulaw):
+            if not self.active or self._quiet > self._hangover:
+                self.speech_started_at = time.monotonic()
+            self._quiet = 0
+            frames = [ulaw]
+            if not self.active:
+                self.active = True
+                frames = [*self._preroll, ulaw]
+                self._preroll.clear()
+            self.frames_passed += len(frames)
+            return frames, False
+
+        if self.active:
+            self._quiet += 1
+            if self._quiet == 1:
+                self.speech_ended_at = time.monotonic()
+            if self._quiet > self._hangover and self.gate:
+                self.active = False
+                self._preroll.append(ulaw)
+                return [], True
+            self.frames_passed += 1
+            return [ulaw], False
+
+        if not self.gate:
+            self.frames_passed += 1
+            return [ulaw], False
+        self._preroll.append(ulaw)
+        return [], False
@@ -6,7 +6,9 @@ import {
   Sse,
   MessageEvent,
   Param,
+  Req,
 } from '@nestjs/common';
+import type { Request } from 'express';
 import { ApiTags, ApiOperation, ApiResponse, ApiParam } from '@nestjs/swagger';
 import { AppService } from './app.service';
 import { EmergencySseService } from './emergency-sse.service';
@@ -94,4 +96,23 @@ results 배열에 각 병원의 결과가 담겨옵니다.
     console.log('[Controller] 콜백 수신:', JSON.stringify(dto, null, 2));
     return this.appService.handleCallback(dto.patientId, dto.results);
   }
+
+  // 4. 병원별 진행 상황 스트림 (AI 서버가 호출)
+  @Post('emergency/events')
+  @ApiTags('콜백')
+  @ApiOperation({
+    summary: '병원별 진행 상황 스트림',
+    description: `AI 서버가 병원별 진행 상황을 하나의 긴 요청으로 실시간 전송합니다.
+Content-Type: application/x-ndjson, 한 줄에 이벤트 하나
+({"seq", "emergency_id", "patientId", "hospitalId", "status"}).
+- ringing / in-progress: 응급대원에게 SSE로 진행 상황 알림
+- rejected / no_answer: 배치 콜백과 동일하게 처리 (배치 콜백에서 중복 처리되지 않음)`,
+  })
+  @ApiResponse({
+    status: 200,
+    description: '스트림 종료 시 처리한 이벤트 수 반환',
+  })
+  async progressEvents(@Req() req: Request) {
+    return this.appService.handleProgressStream(req);
+  }
 }
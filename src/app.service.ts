@@ -1,4 +1,6 @@
 import { Injectable, Logger } from '@nestjs/common';
+import { createInterface } from 'node:readline';
+import type { Readable } from 'node:stream';
 import { ConfigService } from '@nestjs/config';
 import { prisma } from './prisma';
 import { EmergencySseService } from './emergency-sse.service';
@@ -183,6 +185,37 @@ export class AppService {
     return { success: true, processed };
   }
 
+  // 2-1. AI 서버가 병원별 진행 상황(ringing/in-progress/rejected/no_answer)을
+  // 하나의 긴 요청(NDJSON, 한 줄에 이벤트 하나)으로 실시간 전송할 때 호출
+  async handleProgressStream(stream: Readable) {
+    const lines = createInterface({ input: stream, crlfDelay: Infinity });
+    let processed = 0;
+
+    // 도착 순서대로 하나씩 처리해야 응급 건별 이벤트 순서가 유지됨
+    for await (const line of lines) {
+      if (!line.trim()) continue;
+      try {
+        const event = JSON.parse(line);
+        this.logger.log(
+          `[handleProgressStream] 환자 ${event.patientId}, 병원 ${event.hospitalId}: ${event.status} (seq ${event.seq})`,
+        );
+        await this.processResult(
+          event.hospitalId,
+          event.patientId,
+          event.status,
+        );
+        processed++;
+      } catch (err) {
+        this.logger.error(
+          `[handleProgressStream] 이벤트 처리 실패: ${err.message} (${line})`,
+        );
+      }
+    }
+
+    this.logger.log(`[handleProgressStream] 스트림 종료: ${processed}개 처리`);
+    return { success: true, processed };
+  }
+
   // 개별 병원 결과 처리
   private async processResult(
     hospitalId: number,
@@ -211,11 +244,16 @@ export class AppService {
 
     if (status === 'no_answer' || status === 'calling') {
       // 무응답 → 거절과 동일하게 DB 반영 (pending 잔존 방지)
-      await prisma.hospitalRequest.updateMany({
+      const request = await prisma.hospitalRequest.updateMany({
         where: { hospitalId, patientId, accepted: null },
         data: { accepted: false },
       });
 
+      // 진행 상황 스트림으로 이미 받은 무응답이 배치 결과로 다시 오면 알림 생략
+      if (request.count === 0) {
+        return { status: 'already_processed' };
+      }
+
       const hospital = await prisma.hospital.findUnique({
         where: { id: hospitalId },
       });